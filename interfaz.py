@@ -10,6 +10,10 @@ from ortools.constraint_solver import pywrapcp
 
 # Importas tus clases de conexión
 from access_db import ConfiguracionConexion, AccessDB
+import vrp_TFM
+
+# Cada cuántos segundos, como mucho, se refresca el mapa con el mejor plan encontrado
+INTERVALO_MAPA = 5
 
 class AppLogistica(ctk.CTk):
     def __init__(self):
@@ -97,19 +101,17 @@ class AppLogistica(ctk.CTk):
 
         return d_mat.astype(int).tolist(), t_mat.astype(int).tolist(), coords_dict, visits_list
 
-    def generate_map(self, data, manager, routing, solution):
+    def generate_map(self, data, rutas):
         m = folium.Map(location=[42.9, -8.4], zoom_start=9, tiles="cartodbpositron")
         TIENDAS_OBJETIVO = ["C30053", "C08901", "C31301"]
         colors = ['#e6194b', '#3cb44b', '#4363d8', '#f58231', '#911eb4']
 
-        for v_id in range(data["num_vehicles"]):
-            index = routing.Start(v_id)
-            if routing.IsEnd(solution.Value(routing.NextVar(index))): continue
+        for v_id, ruta in enumerate(rutas):
+            if not ruta: continue
             
             col = colors[v_id % len(colors)]
             pts = []
-            while not routing.IsEnd(index):
-                node = manager.IndexToNode(index)
+            for node in [data["depot"]] + ruta:
                 loc_id = data['idx_to_node'][node]
                 coord = data['node_coords'].get(node, (42.9, -8.4))
                 pts.append(coord)
@@ -118,9 +120,8 @@ class AppLogistica(ctk.CTk):
                 es_obj = any(t in loc_id for t in TIENDAS_OBJETIVO)
                 icon = folium.Icon(color='red' if es_obj else 'white', icon_color='white' if es_obj else col, icon='star' if es_obj else 'shopping-cart', prefix='fa')
                 folium.Marker(coord, icon=icon, tooltip=f"ID: {loc_id}").add_to(m)
-                index = solution.Value(routing.NextVar(index))
             
-            pts.append(data['node_coords'][manager.IndexToNode(index)])
+            pts.append(data['node_coords'][data["depot"]])
             folium.PolyLine(pts, color=col, weight=3).add_to(m)
         
         m.save("mapa_rutas.html")
@@ -157,10 +158,20 @@ class AppLogistica(ctk.CTk):
             search_params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_MOST_CONSTRAINED_ARC
             search_params.time_limit.seconds = 15
             
-            solution = routing.SolveWithParameters(search_params)
-
-            if solution:
-                self.generate_map(data, manager, routing, solution)
+            # El mapa se rehace con cada mejora: hay un plan utilizable antes de que acabe la búsqueda
+            rutas = None
+            for mejora in vrp_TFM.resolver_progresivo(data, manager, routing, search_params, intervalo=INTERVALO_MAPA):
+                if mejora['rutas'] is None:
+                    break
+                rutas = mejora['rutas']
+                self.generate_map(data, rutas)
+                if not mejora['final']:
+                    usadas = sum(1 for ruta in rutas if ruta)
+                    self.status_text.configure(
+                        text=f"🧠 Optimizando... mapa con el mejor plan a los {mejora['segundo']:.0f}s ({usadas} rutas)",
+                        text_color="cyan")
+
+            if rutas:
                 self.status_text.configure(text="✅ ¡Finalizado! Mapa guardado.", text_color="green")
                 messagebox.showinfo("TFM", "Mapa 'mapa_rutas.html' generado correctamente.")
             else:
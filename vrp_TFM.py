@@ -2,6 +2,8 @@
 
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
+from ortools.util import optional_boolean_pb2
+from ortools.graph.python import linear_sum_assignment
 import pandas as pd
 from access_db import ConfiguracionConexion, AccessDB
 import folium
@@ -9,11 +11,60 @@ import random
 import numpy as np
 import requests
 import time
+import math
+import argparse
+import os
+import json
+import pickle
+import queue
+import threading
+from datetime import datetime
+import vrp_arranque
+import vrp_cache
+import vrp_constructivas
+import vrp_pulido
+import vrp_monitores
+import vrp_recogidas
+from vrp_evaluacion import validar_solucion
+
+# Día de planificación (formato de la consulta de necesidades)
+DIA_PLANIFICACION = "15/09/2023"
+
+# Parámetros del modelo de tiempos (minutos)
+HOLGURA_TIEMPO = 60   # Espera máxima permitida antes de cada visita
+JORNADA_MAX = 720     # Duración máxima de la ruta de un camión
+HORIZONTE = 1440      # Fin del día
+
+# Penalización por dejar sin servir una tienda o una recogida
+PENALIZACION_DESCARTE = 10000000
+
+# Origen (depósito) por defecto; su número es el LOC_ORIGEN_ID de los tiempos de descarga
+NODO_BASE = "A00010"
+
+# Flota
+NUM_VEHICULOS = 150
+CAPACIDAD_VEHICULO = 33   # MCE
+
+# Instancias guardadas (para reproducir días) y operadores de búsqueda recomendados
+CARPETA_INSTANCIAS = "instancias"
+FICHERO_OPERADORES = "operadores_recomendados.json"
+
+# Perfiles de parámetros ajustados por vrp_ajuste.py, por tamaño del día (número de visitas)
+FICHERO_PERFILES = "perfiles_parametros.json"
+TRAMOS_TAMANO = [("pequeno", 150), ("mediano", 400), ("grande", None)]
+
+# Modo de recogidas (monolítico o en dos fases) elegido por vrp_dos_fases.py para cada tramo de tamaño
+FICHERO_MODOS_RECOGIDA = "modo_recogidas.json"
+MODOS_RECOGIDA = ("auto", "monolitico", "dos_fases")
 
 # FUNCIONES DE OBTENCIÓN DE DATOS
 
-def get_data_from_sql():
-    """Lee matrices desde Oracle y las prepara para OR-Tools."""
+def get_data_from_sql(origen=NODO_BASE, excluir=(), proceso=None):
+    """Lee matrices desde Oracle y las prepara para OR-Tools.
+
+    `origen` es el depósito de salida (los tiempos de descarga son los de ese origen) y `excluir` otros
+    orígenes que no deben tratarse como recogidas. Con `proceso` (p. ej. 'SECO') solo se leen la carga y
+    las ventanas de ese proceso logístico; sin él, toda la carga con las ventanas PMG."""
     
     conn_config = ConfiguracionConexion(config_id="DWRAC", ruta='config_acceso.yaml')
     db = AccessDB(conn_config)
@@ -40,12 +91,13 @@ def get_data_from_sql():
     # Diccionario auxiliar de coordenadas por ID físico
     coords_dict = {row['LOC_ID']: (row['LATITUD'], row['LONGITUD']) for _, row in df_coords.iterrows()}
    
-    # Sumamos los MCE por tienda independientemente del proceso
+    # Sumamos los MCE por tienda independientemente del proceso (o solo los del proceso pedido)
     TABLA_NECESIDADES = "DWVEG_ORT.TEMP_NECESIDADES"
+    filtro_proceso = f"AND PROCESO_ID = '{proceso}'" if proceso else ""
     query_mce = f"""
         SELECT CLIENTE_ID, SUM(MCE) as TOTAL_MCE
         FROM {TABLA_NECESIDADES}
-        WHERE DIA_ID = TO_DATE('15/09/2023', 'DD/MM/YYYY')
+        WHERE DIA_ID = TO_DATE('{DIA_PLANIFICACION}', 'DD/MM/YYYY') {filtro_proceso}
         GROUP BY CLIENTE_ID
     """
     df_mce = db.get_dataframe(query_mce)
@@ -72,7 +124,7 @@ def get_data_from_sql():
     query_tiempos = f"""
         SELECT CLIENTE_ID, MIN_CLIENTE_AVG
         FROM {TABLA_TIEMPOS}
-        WHERE TIPO_RUTA = 'ESTANDAR' AND LOC_ORIGEN_ID = 10
+        WHERE TIPO_RUTA = 'ESTANDAR' AND LOC_ORIGEN_ID = {int(origen[1:])}
     """
     df_tiempos = db.get_dataframe(query_tiempos)
 
@@ -86,7 +138,7 @@ def get_data_from_sql():
     query_v = f"""
         SELECT CLIENTE_ID, MINIMO, MAXIMO, PROCESO_ID
         FROM {TABLA_VENTANAS}
-        WHERE PROCESO_ID = 'PMG' 
+        WHERE PROCESO_ID = '{proceso or 'PMG'}' 
     """
     df_v = db.get_dataframe(query_v)
     
@@ -104,8 +156,7 @@ def get_data_from_sql():
     visits_list = []
     
     # Definimos el depósito como la primera visita (Indice 0)
-    NODO_BASE = "A00010"
-    visits_list.append({'loc_id': NODO_BASE, 'start': 0, 'end': 1440, 'type': 'depot', 'proceso': 'BASE', 'mce': 0, 'service_time': 0})
+    visits_list.append({'loc_id': origen, 'start': 0, 'end': 1440, 'type': 'depot', 'proceso': 'BASE', 'mce': 0, 'service_time': 0})
 
     # Agrupamos por cliente para gestionar ventanas múltiples
 
@@ -150,7 +201,7 @@ def get_data_from_sql():
                 'start': 0, 
                 'end': 1440, # Ventana COMODÍN de 24 horas
                 'type': 'client',
-                'proceso': 'ASUMIDO_COMO_PMG', # Esta etiqueta te ayudará a verlo en el mapa
+                'proceso': proceso or 'ASUMIDO_COMO_PMG', # Esta etiqueta te ayudará a verlo en el mapa
                 'mce': carga_real, 
                 'service_time': tiempo_descarga_real 
             })
@@ -158,7 +209,7 @@ def get_data_from_sql():
     # Añadimos los almacenes de recogida (Axxx)
     pickup_locs = df_dist[df_dist['LOC_DESTINO'].str.startswith('A')]['LOC_DESTINO'].unique()
     for loc in pickup_locs:
-        if loc != NODO_BASE:
+        if loc != origen and loc not in excluir:
             visits_list.append({'loc_id': loc, 'start': 0, 'end': 1440, 'type': 'pickup', 'proceso': 'RECOGIDA', 'mce': 0, 'service_time': 0})
 
     # CONSTRUCCIÓN DE MATRICES BASADAS EN VISITAS ---
@@ -196,9 +247,9 @@ def get_data_from_sql():
     
     return dist_matrix.round().astype(int).tolist(), time_matrix.round().astype(int).tolist(), node_coords, idx_to_node, windows_final, visits_list
 
-def create_data_model():
+def create_data_model(num_vehicles=NUM_VEHICULOS, origen=NODO_BASE, excluir=(), proceso=None):
     """Define los datos del problem."""
-    dist_matrix, time_matrix, node_coords, idx_to_node, windows_final, visits_list = get_data_from_sql()
+    dist_matrix, time_matrix, node_coords, idx_to_node, windows_final, visits_list = get_data_from_sql(origen, excluir, proceso)
     
     data = {}
     data['idx_to_node'] = idx_to_node
@@ -230,14 +281,209 @@ def create_data_model():
     data["delivery_nodes"] = delivery_nodes
     data["pickup_nodes"] = pickup_nodes
 
-    data["num_vehicles"] = 150
-    data["vehicle_capacities"] = [33] * data["num_vehicles"] 
+    data["num_vehicles"] = num_vehicles
+    data["vehicle_capacities"] = [CAPACIDAD_VEHICULO] * data["num_vehicles"] 
     
     data["time_windows"] = windows_final
     data["visits_list"] = visits_list 
+    data["dia"] = DIA_PLANIFICACION
+    data["proceso"] = proceso
+
+    data["holgura_tiempo"] = HOLGURA_TIEMPO
+    data["jornada_max"] = JORNADA_MAX
+    data["horizonte"] = HORIZONTE
+    data["penalizacion_tienda"] = PENALIZACION_DESCARTE
+    data["penalizacion_recogida"] = PENALIZACION_DESCARTE
     
     return data
 
+def guardar_instancia(data, carpeta=CARPETA_INSTANCIAS):
+    """Guarda el `data` del día para poder reproducirlo sin Oracle (perfilado, ajuste de parámetros...)."""
+    os.makedirs(carpeta, exist_ok=True)
+    fecha = datetime.strptime(data["dia"], "%d/%m/%Y").strftime("%Y-%m-%d")
+    fichero = os.path.join(carpeta, f"instancia_{fecha}.pkl")
+    with open(fichero, "wb") as f:
+        pickle.dump(data, f)
+    return fichero
+
+def cargar_instancia(fichero):
+    """Carga un `data` guardado con `guardar_instancia`."""
+    with open(fichero, "rb") as f:
+        return pickle.load(f)
+
+def con_flota(data, num_vehicles):
+    """Copia de `data` con otro número de vehículos (flota homogénea)."""
+    nuevo = dict(data)
+    nuevo["num_vehicles"] = num_vehicles
+    nuevo["vehicle_capacities"] = [data["vehicle_capacities"][0]] * num_vehicles
+    return nuevo
+
+def cota_empaquetado(pesos, capacidad):
+    """Cota L2 de Martello y Toth para el empaquetado en contenedores (cada tienda va entera en un camión).
+
+    Para cada umbral `a` <= capacidad/2: los pesos mayores que capacidad - a van solos; los mayores que la
+    mitad no pueden compartir camión entre sí; y lo que pesan los de [a, capacidad/2] y no cabe en el hueco
+    que dejan los anteriores necesita camiones nuevos. Nunca es menor que ceil(suma / capacidad)."""
+    pesos = np.asarray(pesos, dtype=float)
+    if len(pesos) == 0:
+        return 0
+    cota = math.ceil(pesos.sum() / capacidad)
+    for a in np.unique(np.r_[0, pesos[pesos <= capacidad / 2]]):
+        solos = pesos > capacidad - a
+        grandes = (pesos > capacidad / 2) & ~solos
+        medianos = (pesos >= a) & (pesos <= capacidad / 2)
+        hueco = grandes.sum() * capacidad - pesos[grandes].sum()
+        extra = max(0, math.ceil((pesos[medianos].sum() - hueco) / capacidad))
+        cota = max(cota, int(solos.sum() + grandes.sum() + extra))
+    return cota
+
+def cota_inferior_vehiculos(data):
+    """Cota inferior del número de camiones: por carga (empaquetado de los MCE de cada tienda) y por jornada.
+
+    La cota por jornada suma, para cada tienda, su descarga más el viaje más corto para llegar a ella.
+    Las tiendas que piden más de lo que cabe en un camión no se cuentan (no se pueden servir)."""
+    capacidad = max(data["vehicle_capacities"])
+    tiempos = np.asarray(data["time_matrix"], dtype=float)
+    locs = np.array([v['loc_id'] for v in data["visits_list"]])
+    tiempos[locs[:, None] == locs[None, :]] = np.inf
+    llegada_minima = tiempos.min(axis=0)
+
+    mce_por_tienda = {}
+    tiempo_por_tienda = {}
+    for i in data["delivery_nodes"]:
+        mce = abs(data["demands"][i])
+        if mce > capacidad:
+            continue
+        loc_id = data["visits_list"][i]['loc_id']
+        mce_por_tienda[loc_id] = mce
+        tiempo = data["service_times"][i] + llegada_minima[i]
+        tiempo_por_tienda[loc_id] = min(tiempo, tiempo_por_tienda.get(loc_id, tiempo))
+
+    cota_carga = cota_empaquetado(list(mce_por_tienda.values()), capacidad)
+    cota_jornada = math.ceil(sum(tiempo_por_tienda.values()) / data["jornada_max"])
+    return max(cota_carga, cota_jornada, 1)
+
+def _optimo_asignacion(costes, permitido):
+    """Coste óptimo de la asignación con los arcos permitidos, o None si no tiene solución."""
+    origen, destino = np.nonzero(permitido)
+    asignacion = linear_sum_assignment.SimpleLinearSumAssignment()
+    asignacion.add_arcs_with_cost(origen, destino, costes[origen, destino])
+    if asignacion.solve() != asignacion.OPTIMAL:
+        return None
+    return asignacion.optimal_cost()
+
+def cotas_inferiores(data, sin_recogidas=False):
+    """Cotas inferiores por relajación de asignación. Devuelve un diccionario con:
+
+    - 'objetivo': cota del objetivo (distancia más penalizaciones). Cada tienda o recogida (una por loc_id,
+      sin importar la ventana) elige un sucesor: otra visita, el depósito de un camión o ella misma, que
+      equivale a dejarla sin servir y cuesta su penalización. Cada camión es una copia de su depósito, que
+      puede apuntarse a sí misma (camión sin usar). Toda solución es una asignación de este tipo, así que el
+      óptimo de la asignación (sin capacidad, ventanas ni jornada, y admitiendo subciclos) no supera al objetivo.
+    - 'imposibles' e 'inevitable': visitas que no se pueden servir de ninguna manera (no caben en un camión o
+      su ventana cierra antes de poder llegar) y la suma de sus penalizaciones, que paga cualquier solución
+      (y que ya incluye 'objetivo').
+    - 'distancia': cota de la distancia si se sirven todas las demás visitas (la misma asignación sin
+      quedarse sin servir), o None si la flota no llega para servirlas.
+
+    Con `sin_recogidas` las recogidas cuentan como imposibles: son las cotas del modelo con las recogidas
+    desactivadas (fase 1 de `resolver_dos_fases`)."""
+    origenes = sorted(set(data.get("starts") or [data["depot"]]))
+    llegada = np.asarray(data["time_matrix"], dtype=np.int64)[origenes].min(axis=0)
+    capacidad = max(data["vehicle_capacities"])
+    pickup_set = set(data["pickup_nodes"])
+    primer_nodo, servible = {}, {}
+    for i, v in enumerate(data["visits_list"]):
+        if v["type"] == "depot":
+            continue
+        primer_nodo.setdefault(v["loc_id"], i)
+        # Como en analizar_causa_descarte: no cabe, ventana cerrada o inalcanzable desde el depósito
+        fin = data["time_windows"][i][1]
+        posible = abs(data["demands"][i]) <= capacidad and fin > 0 and llegada[i] <= fin
+        posible = posible and not (sin_recogidas and i in pickup_set)
+        servible[v["loc_id"]] = servible.get(v["loc_id"], False) or posible
+    visitas = [i for loc_id, i in primer_nodo.items() if servible[loc_id]]
+    imposibles = [i for loc_id, i in primer_nodo.items() if not servible[loc_id]]
+    inevitable = sum(data.get("penalizacion_recogida", PENALIZACION_DESCARTE) if i in pickup_set
+                     else data.get("penalizacion_tienda", PENALIZACION_DESCARTE) for i in imposibles)
+    penalizacion = np.array([data.get("penalizacion_recogida", PENALIZACION_DESCARTE) if i in pickup_set
+                             else data.get("penalizacion_tienda", PENALIZACION_DESCARTE) for i in visitas], dtype=np.int64)
+    cotas = {'objetivo': inevitable, 'imposibles': len(imposibles), 'inevitable': inevitable, 'distancia': 0}
+    if not visitas:
+        return cotas
+
+    # Con un solo depósito basta una copia por visita como mucho (más camiones nunca se usan)
+    depositos = list(data.get("starts") or [data["depot"]] * min(data["num_vehicles"], len(visitas)))
+    nodos = np.array(depositos + visitas)
+    n, k = len(nodos), len(depositos)
+    costes = np.asarray(data["distance_matrix"], dtype=np.int64)[np.ix_(nodos, nodos)]
+    costes[np.arange(k, n), np.arange(k, n)] = penalizacion
+    costes[np.arange(k), np.arange(k)] = 0
+    permitido = np.ones((n, n), dtype=bool)
+    permitido[:k, :k] = np.eye(k, dtype=bool)  # De un depósito a otro no se va
+
+    # Con un solo depósito los camiones son intercambiables: si servir todas las tiendas servibles necesita
+    # al menos m camiones (empaquetado de sus MCE), o salen m camiones o se deja alguna tienda servible sin
+    # servir, lo que cuesta al menos su penalización. Si la flota no llega a m camiones, lo segundo es seguro.
+    alternativa, flota_corta = None, False
+    if not data.get("starts"):
+        tiendas = [i for i in visitas if i in set(data["delivery_nodes"])]
+        m = cota_empaquetado([abs(data["demands"][i]) for i in tiendas], capacidad)
+        flota_corta = m > data["num_vehicles"]
+        if not flota_corta:
+            permitido[np.arange(min(m, k)), np.arange(min(m, k))] = False
+        if tiendas:
+            alternativa = data.get("penalizacion_tienda", PENALIZACION_DESCARTE)
+
+    relajada = _optimo_asignacion(costes, permitido) or 0
+    if alternativa is not None:
+        relajada = max(relajada, alternativa) if flota_corta else min(relajada, alternativa)
+    cotas['objetivo'] = inevitable + relajada
+
+    # Sirviendo todas las visitas servibles: ninguna puede apuntarse a sí misma
+    permitido[np.arange(k, n), np.arange(k, n)] = False
+    cotas['distancia'] = None if flota_corta else _optimo_asignacion(costes, permitido)
+    return cotas
+
+def crear_subproblema(data, nodos, num_vehicles):
+    """Crea un `data` reducido con el depósito y los nodos indicados (índices del problema completo).
+
+    Los nodos se renumeran (depósito = 0) y `data['nodos_globales']` guarda la correspondencia
+    índice local -> índice global. Supone flota homogénea (las capacidades se reparten en orden)."""
+    globales = [data["depot"]] + [n for n in nodos if n != data["depot"]]
+    ix = np.ix_(globales, globales)
+
+    sub = {k: v for k, v in data.items() if not isinstance(v, (list, dict))}
+    sub["depot"] = 0
+    sub["nodos_globales"] = globales
+    sub["idx_to_node"] = {i: data["idx_to_node"][g] for i, g in enumerate(globales)}
+    sub["node_to_idx"] = {v: k for k, v in sub["idx_to_node"].items()}
+    sub["node_coords"] = {i: data["node_coords"][g] for i, g in enumerate(globales)}
+    sub["distance_matrix"] = np.asarray(data["distance_matrix"])[ix].tolist()
+    sub["time_matrix"] = np.asarray(data["time_matrix"])[ix].tolist()
+    sub["demands"] = [data["demands"][g] for g in globales]
+    sub["service_times"] = [data["service_times"][g] for g in globales]
+    sub["time_windows"] = [data["time_windows"][g] for g in globales]
+    sub["visits_list"] = [data["visits_list"][g] for g in globales]
+
+    local = {g: i for i, g in enumerate(globales)}
+    sub["delivery_nodes"] = [local[g] for g in data["delivery_nodes"] if g in local]
+    sub["pickup_nodes"] = [local[g] for g in data["pickup_nodes"] if g in local]
+
+    sub["num_vehicles"] = num_vehicles
+    capacidades = data["vehicle_capacities"]
+    sub["vehicle_capacities"] = [capacidades[v % len(capacidades)] for v in range(num_vehicles)]
+    return sub
+
+def rutas_a_globales(sub, rutas):
+    """Traduce rutas de un subproblema a índices del problema completo."""
+    return [[sub["nodos_globales"][n] for n in ruta] for ruta in rutas]
+
+def rutas_a_locales(sub, rutas):
+    """Traduce rutas del problema completo a índices del subproblema (ignora nodos ajenos)."""
+    local = {g: i for i, g in enumerate(sub["nodos_globales"])}
+    return [[local[n] for n in ruta if n in local] for ruta in rutas]
+
 # FUNCIONES DE SALIDA Y VISUALIZACIÓN
 
 def print_solution(data, manager, routing, solution):
@@ -321,23 +567,39 @@ def print_solution(data, manager, routing, solution):
         print("\n✅ ¡Éxito! Todos los nodos han sido incluidos en las rutas.")
 #####################################
 
+    # Distancia a las cotas inferiores: cuánto podría mejorar todavía la solución
+    objetivo = solution.ObjectiveValue()
+    cotas = cotas_inferiores(data)
+    visitas = [n for n, v in enumerate(data['visits_list']) if v['type'] != 'depot']
+    servidas = {data['idx_to_node'][n] for n in visitas if solution.Value(routing.ActiveVar(manager.NodeToIndex(n)))}
+    descartadas = len({data['idx_to_node'][n] for n in visitas} - servidas)
+    gap, gap_distancia = vrp_monitores.calcular_gaps(cotas, objetivo, total_distance, descartadas)
+    if gap_distancia is not None:
+        texto_distancia = f"cota inferior {cotas['distancia']}km, gap {gap_distancia:.1%}"
+    else:
+        texto_distancia = "sin gap: quedan visitas servibles sin servir" if cotas['distancia'] is not None else \
+            "sin gap: la flota no llega para todas las visitas"
+
     print("="*30)
     print(f"RESUMEN FINAL:")
-    print(f"Vehículos utilizados: {vehicles_used}")
+    print(f"Objetivo: {objetivo} (cota inferior {cotas['objetivo']}, gap {gap:.1%} sin la penalización "
+          f"inevitable; visitas imposibles: {cotas['imposibles']})")
+    print(f"Vehículos utilizados: {vehicles_used} (cota inferior {cota_inferior_vehiculos(data)})")
     print(f"Carga total entregada: {total_load_delivered} MCE") # Mostrar carga total 
-    print(f"Distancia total: {total_distance}km")
+    print(f"Distancia total: {total_distance}km ({texto_distancia})")
     print(f"Tiempo total en ruta: {total_time // 60}h {total_time % 60}min")
     print("="*30)
 
 def generate_map(data, manager, routing, solution):
     """Genera un mapa interactivo con popups enriquecidos, control de capas, leyenda y iconos de recogida,
     incluyendo ahora la visualización de nodos no visitados."""
-    start_map_time = time.time()
-    depot_coords = data['node_coords'][data['depot']]
-    m = folium.Map(location=depot_coords, zoom_start=10, tiles="cartodbpositron")
+    m = crear_mapa(data['node_coords'][data['depot']])
+    legend_html = dibujar_rutas(m, data, manager, routing, solution)
+    cerrar_mapa(m, legend_html, "mapa_rutas.html")
 
-    time_dimension = routing.GetDimensionOrDie("Time")
-    capacity_dimension = routing.GetDimensionOrDie("Capacity")
+def crear_mapa(depot_coords):
+    """Mapa base con la pantalla de carga."""
+    m = folium.Map(location=depot_coords, zoom_start=10, tiles="cartodbpositron")
 
     loading_screen = """
     <div id="loading-overlay" style="position: fixed; top: 0; left: 0; width: 100%; height: 100%; 
@@ -360,16 +622,22 @@ def generate_map(data, manager, routing, solution):
     </script>
     """
     m.get_root().html.add_child(folium.Element(loading_screen))
+    return m
+
+def dibujar_rutas(m, data, manager, routing, solution, capa=None):
+    """Dibuja las rutas y los nodos no visitados de una solución y devuelve su parte de la leyenda.
+
+    Sin `capa` cada camión es una capa propia; con `capa` (p. ej. el proceso) todas las rutas van en una
+    sola capa con ese nombre, para poder superponer varios planes en el mismo mapa."""
+    time_dimension = routing.GetDimensionOrDie("Time")
+    capacity_dimension = routing.GetDimensionOrDie("Capacity")
 
     colors = ['#e6194b', '#3cb44b', '#ffe119', '#4363d8', '#f58231', '#911eb4', '#46f0f0', '#f032e6', '#bcf60c', '#fabebe', '#008080', '#e6beff', '#9a6324', '#800000']
     
-    legend_html = '''
-     <div style="position: fixed; bottom: 50px; left: 50px; width: 180px; max-height: 250px; 
-                  border:2px solid grey; z-index:9999; font-size:12px;
-                  background-color:white; opacity: 0.9; padding: 10px; border-radius:5px;
-                  overflow-y: auto;">
-     <p style="margin-top:0; border-bottom: 1px solid #ccc;"><b>Leyenda Vehículos</b></p>
-    '''
+    legend_html = ''
+    if capa:
+        capa_group = folium.FeatureGroup(name=capa).add_to(m)
+        legend_html += f'<p style="margin:4px 0 2px 0;"><b>{capa}</b></p>'
 
     TIENDAS_ESPECIALES = []
 
@@ -380,7 +648,7 @@ def generate_map(data, manager, routing, solution):
             continue 
             
         color = colors[vehicle_id % len(colors)]
-        vehicle_group = folium.FeatureGroup(name=f"Camión {vehicle_id}").add_to(m)
+        vehicle_group = capa_group if capa else folium.FeatureGroup(name=f"Camión {vehicle_id}").add_to(m)
         legend_html += f'<p style="margin:2px;"><i class="fa fa-truck" style="color:{color}"></i> Vehículo {vehicle_id}</p>'
         
         route_coords = []
@@ -463,7 +731,7 @@ def generate_map(data, manager, routing, solution):
         folium.PolyLine(route_coords, color=color, weight=4, opacity=0.7).add_to(vehicle_group)
 
     #NUEVA SECCIÓN: NODOS NO VISITADOS 
-    unvisited_group = folium.FeatureGroup(name="❌ NODOS NO VISITADOS").add_to(m)
+    unvisited_group = folium.FeatureGroup(name=f"❌ {capa} NO VISITADOS" if capa else "❌ NODOS NO VISITADOS").add_to(m)
     legend_html += '<hr style="margin:5px 0;"><p style="margin:2px; color:red;"><b>⚠️ No Visitados</b></p>'
     
     for node_index in range(1, len(data['demands'])):
@@ -493,8 +761,18 @@ def generate_map(data, manager, routing, solution):
                 icon=folium.Icon(color='lightgray', icon_color='red', icon='exclamation-triangle', prefix='fa')
             ).add_to(unvisited_group)
 
+    return legend_html
+
+def cerrar_mapa(m, legend_html, fichero):
+    """Añade la leyenda, el control de capas y el botón de mostrar/ocultar, y guarda el mapa."""
     # CIERRE DE LEYENDA Y SCRIPTS 
-    legend_html += '</div>'
+    legend_html = '''
+     <div style="position: fixed; bottom: 50px; left: 50px; width: 180px; max-height: 250px; 
+                  border:2px solid grey; z-index:9999; font-size:12px;
+                  background-color:white; opacity: 0.9; padding: 10px; border-radius:5px;
+                  overflow-y: auto;">
+     <p style="margin-top:0; border-bottom: 1px solid #ccc;"><b>Leyenda Vehículos</b></p>
+    ''' + legend_html + '</div>'
     m.get_root().html.add_child(folium.Element(legend_html))
     folium.LayerControl(collapsed=False).add_to(m)
     
@@ -517,7 +795,7 @@ def generate_map(data, manager, routing, solution):
     </div>
     """
     m.get_root().html.add_child(folium.Element(toggle_script))
-    m.save("mapa_rutas.html")
+    m.save(fichero)
 # BLOQUE PRINCIPAL DE EJECUCIÓN 
 
 def exportar_auditoria_excel(data, manager, routing, solution):
@@ -578,16 +856,21 @@ def exportar_auditoria_excel(data, manager, routing, solution):
     except Exception as e:
         print(f"❌ Ocurrió un error inesperado al guardar el Excel: {e}")
 
-def main():
-    print("\n" + "="*20)
-    print("CARGANDO...")
-    print("="*20)
-    
-    start_time_total = time.time()
-    data = create_data_model()
-    
-    manager = pywrapcp.RoutingIndexManager(len(data["distance_matrix"]), data["num_vehicles"], data["depot"])
-    routing = pywrapcp.RoutingModel(manager)
+def crear_modelo(data, parametros_modelo=None):
+    """Construye el modelo de rutas (capacidad, tiempo, secuencia de recogidas y disyunciones).
+
+    `parametros_modelo` (RoutingModelParameters) permite, p. ej., activar el perfilado del solver.
+    Con varios orígenes, `data['starts']`/`data['ends']` dan el depósito de cada vehículo y
+    `data['perfiles_servicio']` (tiempos de servicio de cada origen) con `data['perfil_vehiculo']`
+    el perfil de descarga que usa cada vehículo."""
+    if data.get("starts"):
+        manager = pywrapcp.RoutingIndexManager(len(data["distance_matrix"]), data["num_vehicles"],
+                                               data["starts"], data["ends"])
+    else:
+        manager = pywrapcp.RoutingIndexManager(len(data["distance_matrix"]), data["num_vehicles"], data["depot"])
+    if parametros_modelo is None:
+        parametros_modelo = pywrapcp.DefaultRoutingModelParameters()
+    routing = pywrapcp.RoutingModel(manager, parametros_modelo)
     
     def distance_callback(from_index, to_index):
         return data["distance_matrix"][manager.IndexToNode(from_index)][manager.IndexToNode(to_index)]
@@ -607,36 +890,46 @@ def main():
         capacity_dimension.CumulVar(start_index).SetValue(data["vehicle_capacities"][vehicle_id])
 
     # Actualizamos el callback de tiempo para incluir tiempo de descarga 
-    def time_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        
-        tiempo_viaje = data["time_matrix"][from_node][to_node]
-        tiempo_servicio = data["service_times"][from_node]
-        
-        return tiempo_viaje + tiempo_servicio
-    
-    time_callback_index = routing.RegisterTransitCallback(time_callback)
+    def crear_time_callback(service_times):
+        def time_callback(from_index, to_index):
+            from_node = manager.IndexToNode(from_index)
+            to_node = manager.IndexToNode(to_index)
+            
+            tiempo_viaje = data["time_matrix"][from_node][to_node]
+            tiempo_servicio = service_times[from_node]
+            
+            return tiempo_viaje + tiempo_servicio
+        return time_callback
     
-    routing.AddDimension(time_callback_index, 60, 1440, False, "Time")
+    if data.get("perfiles_servicio"):
+        # Cada vehículo descarga con el perfil de tiempos de su origen
+        indices_perfil = [routing.RegisterTransitCallback(crear_time_callback(perfil))
+                          for perfil in data["perfiles_servicio"]]
+        routing.AddDimensionWithVehicleTransits([indices_perfil[k] for k in data["perfil_vehiculo"]],
+                                                data["holgura_tiempo"], data["horizonte"], False, "Time")
+    else:
+        time_callback_index = routing.RegisterTransitCallback(crear_time_callback(data["service_times"]))
+        routing.AddDimension(time_callback_index, data["holgura_tiempo"], data["horizonte"], False, "Time")
     time_dimension = routing.GetDimensionOrDie("Time")
 
     #Jornada laboral
     for vehicle_id in range(data["num_vehicles"]):
-        time_dimension.SetSpanUpperBoundForVehicle(720, vehicle_id)
+        time_dimension.SetSpanUpperBoundForVehicle(data["jornada_max"], vehicle_id)
 
     # Configuración de Ventanas Temporales
     for node_index, (start, end) in enumerate(data["time_windows"]):
         index = manager.NodeToIndex(node_index)
         if start <= end:
             if node_index == data['depot']:
-                time_dimension.CumulVar(index).SetRange(0, 1440)
+                time_dimension.CumulVar(index).SetRange(0, data["horizonte"])
             else:
                 time_dimension.CumulVar(index).SetRange(start, end)
 
+    pickup_set = set(data["pickup_nodes"])
+
     def pickup_count_callback(from_index):
         node = manager.IndexToNode(from_index)
-        return 1 if node in data["pickup_nodes"] else 0
+        return 1 if node in pickup_set else 0
 
     pickup_count_index = routing.RegisterUnaryTransitCallback(pickup_count_callback)
     routing.AddDimension(pickup_count_index, 0, len(data["pickup_nodes"]) + 1, True, "PickupSequence")
@@ -647,7 +940,9 @@ def main():
         sequence_dimension.CumulVar(d_index).SetMax(0)
 
     # --- BLOQUE CORREGIDO: DISYUNCIONES AGRUPADAS POR TIENDA ---
-    penalty = 10000000
+    # (las instancias guardadas antes de parametrizar las penalizaciones no traen estas claves)
+    penalty = data.get("penalizacion_tienda", PENALIZACION_DESCARTE)
+    penalty_recogida = data.get("penalizacion_recogida", PENALIZACION_DESCARTE)
     nodos_por_tienda = {}
 
     # Clasificamos los índices de los nodos por su ID de tienda físico
@@ -662,28 +957,439 @@ def main():
         
         elif v['type'] == 'pickup':
             # Las recogidas (Axxx) se gestionan de forma individual
-            routing.AddDisjunction([manager.NodeToIndex(i)], penalty)
+            routing.AddDisjunction([manager.NodeToIndex(i)], penalty_recogida)
 
      
     # solo elija UNA (el '1' al final es la clave).
     for tienda_id, indices in nodos_por_tienda.items():
         routing.AddDisjunction(indices, penalty, 1)
-    
+
+    return manager, routing
+
+def crear_parametros_busqueda(tiempo_limite=75,
+                              primera_solucion=routing_enums_pb2.FirstSolutionStrategy.PATH_MOST_CONSTRAINED_ARC,
+                              metaheuristica=routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+                              operadores=None, coef_gls=None):
+    """Parámetros de búsqueda por defecto del TFM (PATH_MOST_CONSTRAINED_ARC + GLS, 75s).
+
+    `operadores` es un diccionario {'use_relocate': True, 'use_cross': False, ...} con los operadores
+    de búsqueda local que se activan o desactivan (el resto queda con el valor por defecto).
+    `coef_gls` es el coeficiente lambda de la búsqueda local guiada (None: el de OR-Tools)."""
     search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (routing_enums_pb2.FirstSolutionStrategy.PATH_MOST_CONSTRAINED_ARC)
-    search_parameters.local_search_metaheuristic = (routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
-    search_parameters.time_limit.seconds = 75
+    search_parameters.first_solution_strategy = primera_solucion
+    search_parameters.local_search_metaheuristic = metaheuristica
+    search_parameters.time_limit.seconds = int(tiempo_limite)
+    if coef_gls is not None:
+        search_parameters.guided_local_search_lambda_coefficient = coef_gls
+    for operador, activo in (operadores or {}).items():
+        valor = optional_boolean_pb2.BOOL_TRUE if activo else optional_boolean_pb2.BOOL_FALSE
+        setattr(search_parameters.local_search_operators, operador, valor)
+    return search_parameters
+
+def cargar_operadores(fichero=FICHERO_OPERADORES):
+    """Lee el conjunto de operadores recomendado por `vrp_operadores.py`, o None si no existe."""
+    if not fichero or not os.path.exists(fichero):
+        return None
+    with open(fichero, encoding="utf-8") as f:
+        operadores = json.load(f)["operadores"]
+    desactivados = sum(1 for activo in operadores.values() if not activo)
+    print(f"🧩 Operadores de búsqueda cargados de {fichero} ({desactivados} desactivados)")
+    return operadores
+
+def tramo_tamano(data):
+    """Tramo de tamaño del día según su número de visitas (ver TRAMOS_TAMANO)."""
+    visitas = len(data["visits_list"]) - 1
+    for tramo, limite in TRAMOS_TAMANO:
+        if limite is None or visitas <= limite:
+            return tramo
+
+def cargar_perfil(data, fichero=FICHERO_PERFILES):
+    """Perfil de parámetros ajustado para el tramo de tamaño del día, o None si no hay."""
+    if not fichero or not os.path.exists(fichero):
+        return None
+    with open(fichero, encoding="utf-8") as f:
+        perfil = json.load(f)["perfiles"].get(tramo_tamano(data))
+    if perfil:
+        print(f"🎛️ Perfil de parámetros '{tramo_tamano(data)}' cargado de {fichero}")
+    return perfil
+
+def aplicar_perfil(data, perfil):
+    """Copia de `data` con la holgura y las penalizaciones del perfil (las claves ausentes no cambian)."""
+    nuevo = dict(data)
+    for clave in ("holgura_tiempo", "penalizacion_tienda", "penalizacion_recogida"):
+        if clave in perfil:
+            nuevo[clave] = perfil[clave]
+    return nuevo
+
+def cargar_modo_recogidas(data, fichero=FICHERO_MODOS_RECOGIDA):
+    """Modo de recogidas medido por `vrp_dos_fases.py` para el tramo de tamaño del día ('monolitico' si no hay)."""
+    if not fichero or not os.path.exists(fichero):
+        return "monolitico"
+    with open(fichero, encoding="utf-8") as f:
+        medicion = json.load(f)["modos"].get(tramo_tamano(data))
+    if not medicion:
+        return "monolitico"
+    print(f"🔀 Modo de recogidas '{medicion['modo']}' para el tramo '{tramo_tamano(data)}' (según {fichero})")
+    return medicion['modo']
+
+def parametros_desde_perfil(perfil, tiempo_limite=None, operadores=None):
+    """Parámetros de búsqueda a partir de un perfil (estrategia y metaheurística por nombre).
+
+    `tiempo_limite` tiene prioridad sobre el del perfil."""
+    return crear_parametros_busqueda(
+        tiempo_limite or perfil.get("tiempo_limite", 75),
+        getattr(routing_enums_pb2.FirstSolutionStrategy, perfil.get("primera_solucion", "PATH_MOST_CONSTRAINED_ARC")),
+        getattr(routing_enums_pb2.LocalSearchMetaheuristic, perfil.get("metaheuristica", "GUIDED_LOCAL_SEARCH")),
+        operadores, perfil.get("coef_gls"))
+
+def extraer_rutas(data, manager, routing, solution=None):
+    """Devuelve, por vehículo, la lista de nodos visitados (sin el depósito de salida ni el de llegada).
+
+    Sin `solution` lee los valores ligados en ese momento, lo que permite usarla
+    dentro de un callback de solución (AddAtSolutionCallback)."""
+    valor = solution.Value if solution is not None else (lambda var: var.Value())
+    rutas = []
+    for vehicle_id in range(data["num_vehicles"]):
+        ruta = []
+        index = valor(routing.NextVar(routing.Start(vehicle_id)))
+        while not routing.IsEnd(index):
+            ruta.append(manager.IndexToNode(index))
+            index = valor(routing.NextVar(index))
+        rutas.append(ruta)
+    return rutas
+
+def cerrar_modelo(routing, search_parameters):
+    """Cierra el modelo con los parámetros dados si todavía no se ha resuelto nunca."""
+    if routing.status() == routing_enums_pb2.RoutingSearchStatus.ROUTING_NOT_SOLVED:
+        routing.CloseModelWithParameters(search_parameters)
+
+def solucion_desde_rutas(manager, routing, rutas, search_parameters=None):
+    """Convierte rutas (listas de nodos por vehículo) en una solución completa del modelo (con cumuls).
+
+    Devuelve None si las rutas no son factibles para el modelo."""
+    if search_parameters is not None:
+        cerrar_modelo(routing, search_parameters)
+    rutas_indices = [[manager.NodeToIndex(n) for n in ruta] for ruta in rutas]
+    return routing.ReadAssignmentFromRoutes(rutas_indices, True)
+
+def resolver(data, manager, routing, search_parameters, rutas_iniciales=None, monitores=()):
+    """Resuelve el modelo, partiendo de unas rutas iniciales si se proporcionan y son factibles.
+
+    `monitores` son objetos de `vrp_monitores` que se inician antes de resolver y se detienen al acabar."""
+    for monitor in monitores:
+        monitor.iniciar(routing, manager)
+    try:
+        if rutas_iniciales is not None:
+            cerrar_modelo(routing, search_parameters)
+            inicial = routing.solver().Assignment()
+            rutas_indices = [[manager.NodeToIndex(n) for n in ruta] for ruta in rutas_iniciales]
+            if routing.RoutesToAssignment(rutas_indices, True, True, inicial):
+                solution = routing.SolveFromAssignmentWithParameters(inicial, search_parameters)
+                if solution is not None:
+                    return solution
+            print("⚠️ Las rutas iniciales no son factibles, se resuelve desde cero.")
+        return routing.SolveWithParameters(search_parameters)
+    finally:
+        for monitor in monitores:
+            monitor.detener()
+
+def resolver_progresivo(data, manager, routing, search_parameters, rutas_iniciales=None, intervalo=1.0, monitores=()):
+    """Resuelve en segundo plano y va devolviendo la mejor solución encontrada hasta el momento.
+
+    Generador: cada elemento es un diccionario con 'segundo', 'objetivo', 'rutas' y 'final' (como mucho uno
+    cada `intervalo` segundos, ver `vrp_monitores.MonitorMejoras`). El último tiene 'final' a True y además
+    'solution' con la solución final del modelo (None si no se encontró). Si se deja de iterar antes de
+    tiempo, la búsqueda se cancela."""
+    cola = queue.Queue()
+    resultado = {}
+
+    def _resolver():
+        try:
+            resultado['solution'] = resolver(data, manager, routing, search_parameters, rutas_iniciales,
+                                             list(monitores) + [vrp_monitores.MonitorMejoras(cola.put, intervalo)])
+        finally:
+            cola.put(None)
+
+    inicio = time.time()
+    hilo = threading.Thread(target=_resolver, daemon=True)
+    hilo.start()
+    terminado = False
+    try:
+        mejora = cola.get()
+        while mejora is not None:
+            yield dict(mejora, final=False)
+            mejora = cola.get()
+        terminado = True
+    finally:
+        if not terminado:
+            routing.CancelSearch()
+        hilo.join()
+
+    solution = resultado.get('solution')
+    yield {'segundo': round(time.time() - inicio, 3),
+           'objetivo': solution.ObjectiveValue() if solution else None,
+           'rutas': extraer_rutas(data, manager, routing, solution) if solution else None,
+           'final': True, 'solution': solution}
+
+def tiendas_sin_servir(data, rutas):
+    """Tiendas (loc_id de clientes) que no aparecen en ninguna ruta."""
+    servidas = {data["visits_list"][n]['loc_id'] for ruta in rutas for n in ruta}
+    return {v['loc_id'] for v in data["visits_list"] if v['type'] == 'client'} - servidas
+
+def desglose_coste(data, rutas, penalizacion=None):
+    """Distancia, tiendas y recogidas sin servir y coste total (distancia más sus penalizaciones) de unas rutas.
+
+    Las penalizaciones son las del modelo (`data`) salvo que se fije una común con `penalizacion`."""
+    distancia = 0
+    for ruta in rutas:
+        if ruta:
+            camino = [data["depot"]] + ruta + [data["depot"]]
+            distancia += sum(data["distance_matrix"][i][j] for i, j in zip(camino[:-1], camino[1:]))
+    servidos = {n for ruta in rutas for n in ruta}
+    recogidas = sum(1 for n in data["pickup_nodes"] if n not in servidos)
+    tiendas = len(tiendas_sin_servir(data, rutas))
+    penalizacion_tienda = penalizacion or data.get("penalizacion_tienda", PENALIZACION_DESCARTE)
+    penalizacion_recogida = penalizacion or data.get("penalizacion_recogida", PENALIZACION_DESCARTE)
+    return {'coste': distancia + tiendas * penalizacion_tienda + recogidas * penalizacion_recogida,
+            'distancia': distancia, 'tiendas_sin_servir': tiendas, 'recogidas_sin_servir': recogidas}
+
+def coste_rutas(data, rutas):
+    """Objetivo del modelo para unas rutas: distancia más la penalización de cada tienda o recogida sin servir."""
+    return desglose_coste(data, rutas)['coste']
+
+def resolver_flota_adaptativa(data, search_parameters, rutas_iniciales=None, margen=0.1, monitores=()):
+    """Resuelve con una flota ajustada a la cota inferior y la amplía solo si quedan tiendas sin servir.
+
+    Empieza con la cota inferior más un `margen` y, mientras todos los camiones disponibles se usen y
+    queden tiendas sin servir, añade vehículos (hasta `data['num_vehicles']`) y vuelve a resolver
+    partiendo de las rutas anteriores. Devuelve (data, manager, routing, solution) de la última iteración."""
+    max_vehiculos = data["num_vehicles"]
+    cota = cota_inferior_vehiculos(data)
+    num_vehicles = min(max_vehiculos, max(cota + 1, math.ceil(cota * (1 + margen))))
+    print(f"🚛 Flota adaptativa: cota inferior {cota} camiones, se empieza con {num_vehicles}")
+
+    iteracion = 0
+    while True:
+        iteracion += 1
+        datos_flota = con_flota(data, num_vehicles)
+        manager, routing = crear_modelo(datos_flota)
+        if rutas_iniciales is not None:
+            rutas_iniciales = [r for r in rutas_iniciales if r][:num_vehicles]
+            rutas_iniciales += [[] for _ in range(num_vehicles - len(rutas_iniciales))]
+
+        inicio = time.time()
+        solution = resolver(datos_flota, manager, routing, search_parameters, rutas_iniciales, monitores)
+        duracion = time.time() - inicio
+
+        if solution is None:
+            print(f"   Iteración {iteracion}: {num_vehicles} vehículos, sin solución ({duracion:.1f}s)")
+            usados, sin_servir = num_vehicles, None
+        else:
+            rutas_iniciales = extraer_rutas(datos_flota, manager, routing, solution)
+            usados = sum(1 for ruta in rutas_iniciales if ruta)
+            sin_servir = tiendas_sin_servir(datos_flota, rutas_iniciales)
+            print(f"   Iteración {iteracion}: {num_vehicles} vehículos, {usados} usados, "
+                  f"{len(sin_servir)} tiendas sin servir ({duracion:.1f}s)")
+
+        # Si sobran camiones, las tiendas pendientes no se deben a la flota
+        if sin_servir == set() or usados < num_vehicles or num_vehicles >= max_vehiculos:
+            return datos_flota, manager, routing, solution
+        num_vehicles = min(max_vehiculos, num_vehicles + max(1, math.ceil(num_vehicles * margen)))
+
+def resolver_dos_fases(data, search_parameters, rutas_iniciales=None, monitores=()):
+    """Modo en dos fases: primero el reparto solo, después las recogidas en la cola de cada ruta.
+
+    La fase 1 es el modelo completo con las recogidas desactivadas (mismos índices de nodo, así que los
+    monitores y las rutas iniciales valen tal cual; las trazas con cotas miden sus gaps contra las del modelo
+    sin recogidas); la fase 2 es `vrp_recogidas.anadir_recogidas`. Si las rutas de la fase 2 no son
+    factibles en el modelo completo, se devuelve el plan de la fase 1 (recogidas sin hacer). Devuelve (manager, routing, solution) del modelo completo, o solution None si no hay solución."""
+    pickup_set = set(data["pickup_nodes"])
+    if rutas_iniciales is not None:
+        rutas_iniciales = [[n for n in ruta if n not in pickup_set] for ruta in rutas_iniciales]
+
+    inicio = time.time()
+    manager, routing = crear_modelo(data)
+    for n in data["pickup_nodes"]:
+        routing.ActiveVar(manager.NodeToIndex(n)).SetValue(0)
+    trazas = [monitor for monitor in monitores if getattr(monitor, "cotas", None)]
+    cotas_completas = [traza.cotas for traza in trazas]
+    if trazas:
+        cotas_fase1 = cotas_inferiores(data, sin_recogidas=True)
+        for traza in trazas:
+            traza.cotas = cotas_fase1
+    try:
+        solution = resolver(data, manager, routing, search_parameters, rutas_iniciales, monitores)
+    finally:
+        for traza, cotas in zip(trazas, cotas_completas):
+            traza.cotas = cotas
+    if solution is None:
+        return manager, routing, None
+    rutas = extraer_rutas(data, manager, routing, solution)
+    print(f"🚚 Fase 1 (solo reparto): {sum(1 for ruta in rutas if ruta)} rutas en {time.time() - inicio:.1f}s")
+
+    inicio = time.time()
+    rutas, sin_hueco = vrp_recogidas.anadir_recogidas(data, rutas)
+    print(f"📦 Fase 2 (recogidas en cola): {len(data['pickup_nodes']) - len(sin_hueco)} de "
+          f"{len(data['pickup_nodes'])} recogidas en {time.time() - inicio:.2f}s")
+    manager_completo, routing_completo = crear_modelo(data)
+    completa = solucion_desde_rutas(manager_completo, routing_completo, rutas, search_parameters)
+    if completa is None:
+        print("⚠️ Las rutas con recogidas no son factibles en el modelo completo: se mantiene el plan de la fase 1")
+        return manager, routing, solution
+    return manager_completo, routing_completo, completa
+
+def reportar_solucion(data, manager, routing, solution):
+    """Imprime las rutas, genera el mapa y exporta el Excel de auditoría."""
+    print_solution(data, manager, routing, solution)
+    generate_map(data, manager, routing, solution) 
+    exportar_auditoria_excel(data, manager, routing, solution)
+
+def main(tiempo_limite=None, arranque_caliente=True, tiempo_limite_caliente=25, flota_adaptativa=False,
+         sin_mejora=None, ganancia_minima=None, traza=False, grafica=False, fichero_operadores=FICHERO_OPERADORES,
+         fichero_perfiles=FICHERO_PERFILES, constructiva=None, plan_rapido=None, pulir=False, al_mejorar=None,
+         intervalo_mejoras=1.0, usar_cache=True, intervalo_punto_control=10, reanudar=False, modo_recogidas="auto",
+         fichero_modos=FICHERO_MODOS_RECOGIDA):
+    """Planificación completa del día.
+
+    `al_mejorar(mejora)`, si se indica, recibe las rutas de cada solución que mejora durante la búsqueda
+    (como mucho una vez cada `intervalo_mejoras` segundos, ver `vrp_monitores.MonitorMejoras`).
+    Con `usar_cache`, un día ya resuelto con los mismos datos y parámetros se reutiliza de `vrp_cache`.
+    La mejor solución se guarda cada `intervalo_punto_control` segundos (None o 0 para no guardarla) y
+    `reanudar` continúa la búsqueda desde el último punto de control del día. `modo_recogidas` elige entre
+    el modelo monolítico y el modo en dos fases (reparto y después recogidas); con 'auto' se usa el que
+    `vrp_dos_fases.py` midió como más rápido para días de este tamaño."""
+    print("\n" + "="*20)
+    print("CARGANDO...")
+    print("="*20)
+    
+    start_time_total = time.time()
+    data = create_data_model()
+    guardar_instancia(data)
+
+    # Parámetros ajustados para días de este tamaño; sin perfil, los valores por defecto del TFM
+    perfil = cargar_perfil(data, fichero_perfiles) or {}
+    data = aplicar_perfil(data, perfil)
+    tiempo_limite = tiempo_limite or perfil.get("tiempo_limite", 75)
+    if modo_recogidas == "auto":
+        modo_recogidas = cargar_modo_recogidas(data, fichero_modos)
+
+    # Plan rápido: solo la heurística constructiva, sin solver
+    if plan_rapido:
+        inicio = time.time()
+        rutas = vrp_constructivas.METODOS_CONSTRUCTIVOS[plan_rapido](data)
+        print(f"⚡ Plan rápido ({plan_rapido}) en {time.time() - inicio:.2f}s")
+        manager, routing = crear_modelo(data)
+        solution = solucion_desde_rutas(manager, routing, rutas, crear_parametros_busqueda())
+        if solution:
+            print("SOLUCIÓN ENCONTRADA")
+            print(f" Tiempo Total Proceso: {time.time() - start_time_total:.2f}s")
+            reportar_solucion(data, manager, routing, solution)
+        else:
+            print("\n Las rutas del plan rápido no son válidas para el modelo.")
+        return
+
+    # Caché: el mismo día con los mismos datos, parámetros y opciones no se vuelve a resolver
+    operadores = cargar_operadores(fichero_operadores)
+    clave_cache = None
+    if usar_cache and not reanudar:
+        clave_cache = vrp_cache.clave_instancia(data, parametros_desde_perfil(perfil, tiempo_limite, operadores), {
+            'arranque_caliente': arranque_caliente, 'tiempo_limite_caliente': tiempo_limite_caliente,
+            'flota_adaptativa': flota_adaptativa, 'sin_mejora': sin_mejora, 'ganancia_minima': ganancia_minima,
+            'constructiva': constructiva, 'pulir': pulir, 'modo_recogidas': modo_recogidas})
+        entrada = vrp_cache.cargar(clave_cache)
+        if entrada is not None:
+            datos_cache = con_flota(data, entrada['num_vehicles'])
+            # Los informes leen horas y cargas del modelo: se reconstruye la solución sin buscar
+            manager, routing = crear_modelo(datos_cache)
+            solution = solucion_desde_rutas(manager, routing, entrada['rutas'], crear_parametros_busqueda())
+            if solution:
+                print("SOLUCIÓN ENCONTRADA")
+                print(f" Tiempo Total Proceso: {time.time() - start_time_total:.2f}s")
+                reportar_solucion(datos_cache, manager, routing, solution)
+                return
+            print("⚠️ Las rutas de la caché no son válidas para el modelo, se resuelve de nuevo.")
+
+    # Reanudación desde el último punto de control del día
+    fichero_control = vrp_arranque.fichero_punto_control(data["dia"])
+    rutas_iniciales = None
+    if reanudar:
+        rutas_iniciales = vrp_arranque.cargar_punto_control(data, fichero_control)
+        if rutas_iniciales is None:
+            print("⚠️ No hay punto de control de este día: se empieza desde cero.")
+
+    # Arranque en caliente con las rutas del último día guardado
+    if rutas_iniciales is None and arranque_caliente:
+        rutas_previas = vrp_arranque.cargar_rutas_previas(data["dia"])
+        if rutas_previas:
+            rutas_iniciales = vrp_arranque.mapear_rutas(data, rutas_previas)
+            asignadas = sum(len(ruta) for ruta in rutas_iniciales)
+            print(f"♻️ Arranque en caliente: {asignadas} visitas asignadas de partida, límite {tiempo_limite_caliente}s")
+            tiempo_limite = min(tiempo_limite, tiempo_limite_caliente)
+
+    # Sin rutas previas, solución inicial con una heurística constructiva
+    if rutas_iniciales is None and constructiva:
+        inicio = time.time()
+        rutas_iniciales = vrp_constructivas.METODOS_CONSTRUCTIVOS[constructiva](data)
+        print(f"🏗️ Solución inicial ({constructiva}): {sum(1 for ruta in rutas_iniciales if ruta)} rutas, "
+              f"coste {coste_rutas(data, rutas_iniciales)}, en {time.time() - inicio:.2f}s")
+
+    search_parameters = parametros_desde_perfil(perfil, tiempo_limite, operadores)
+
+    # Parada anticipada cuando el objetivo se estanca
+    monitores = []
+    if sin_mejora is not None or ganancia_minima is not None:
+        monitores.append(vrp_monitores.MonitorMeseta(sin_mejora, ganancia_minima))
+
+    # Telemetría: objetivo frente a tiempo de cada solución que mejora
+    traza_busqueda = vrp_monitores.TrazaBusqueda(cotas=cotas_inferiores(data)) if traza or grafica else None
+    if traza_busqueda:
+        monitores.append(traza_busqueda)
+
+    # Punto de control periódico para poder reanudar si el proceso muere
+    if intervalo_punto_control:
+        monitores.append(vrp_monitores.PuntoControl(data, fichero_control, intervalo_punto_control))
+
+    # Mejor plan hasta el momento mientras el solver sigue buscando
+    if al_mejorar is not None:
+        monitores.append(vrp_monitores.MonitorMejoras(al_mejorar, intervalo_mejoras))
     
    #############################
-    solution = routing.SolveWithParameters(search_parameters)
+    if flota_adaptativa:
+        data, manager, routing, solution = resolver_flota_adaptativa(data, search_parameters, rutas_iniciales,
+                                                                     monitores=monitores)
+    elif modo_recogidas == "dos_fases":
+        manager, routing, solution = resolver_dos_fases(data, search_parameters, rutas_iniciales, monitores)
+    else:
+        manager, routing = crear_modelo(data)
+        solution = resolver(data, manager, routing, search_parameters, rutas_iniciales, monitores)
+
+    # Pulido: cada ruta se reordena por separado (las paradas no cambian de camión)
+    if solution and pulir:
+        rutas_pulidas, ganancia = vrp_pulido.pulir_rutas(data, extraer_rutas(data, manager, routing, solution))
+        if ganancia > 0:
+            manager_pulido, routing_pulido = crear_modelo(data)
+            solucion_pulida = solucion_desde_rutas(manager_pulido, routing_pulido, rutas_pulidas, search_parameters)
+            if solucion_pulida:
+                manager, routing, solution = manager_pulido, routing_pulido, solucion_pulida
     end_time_total = time.time()
+
+    if traza_busqueda:
+        traza_busqueda.guardar()
+        if grafica:
+            traza_busqueda.graficar()
     
     if solution:
         print("SOLUCIÓN ENCONTRADA")
         print(f" Tiempo Total Proceso: {end_time_total - start_time_total:.2f}s")
-        print_solution(data, manager, routing, solution)
-        generate_map(data, manager, routing, solution) 
-        exportar_auditoria_excel(data, manager, routing, solution)
+        rutas = extraer_rutas(data, manager, routing, solution)
+        # Comprobación independiente de los cumuls del solver
+        for problema in validar_solucion(data, rutas):
+            print(f"⚠️ Validación: {problema}")
+        vrp_arranque.guardar_rutas_dia(data, rutas)
+        # Antes de los informes, para no perder la solución si falla el mapa o el Excel
+        if clave_cache:
+            vrp_cache.guardar(clave_cache, data, rutas, solution.ObjectiveValue())
+        reportar_solucion(data, manager, routing, solution)
     else:
         print("\n No se encontró una solución viable en el tiempo establecido.")
 
@@ -719,5 +1425,42 @@ def analizar_causa_descarte(node_id, data, manager):
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="VRP TFM con recogidas y entregas.")
+    parser.add_argument("--tiempo", type=int, default=None,
+                        help="Límite de tiempo del solver en segundos (por defecto el del perfil, o 75).")
+    parser.add_argument("--sin-arranque-caliente", action="store_true", help="No reutilizar las rutas del día anterior.")
+    parser.add_argument("--tiempo-caliente", type=int, default=25, help="Límite de tiempo cuando hay arranque en caliente.")
+    parser.add_argument("--flota-adaptativa", action="store_true", help="Ajustar el número de camiones a la cota inferior.")
+    parser.add_argument("--sin-mejora", type=float, default=None, help="Parar tras estos segundos sin mejorar el objetivo.")
+    parser.add_argument("--ganancia-minima", type=float, default=None,
+                        help="Parar si la mejora relativa en la ventana de --sin-mejora (o 15s) es menor (p.ej. 0.005).")
+    parser.add_argument("--traza", action="store_true", help="Guardar la traza objetivo-tiempo en traza_busqueda.json/.csv.")
+    parser.add_argument("--grafica", action="store_true", help="Guardar además la gráfica de convergencia (matplotlib).")
+    parser.add_argument("--operadores", default=FICHERO_OPERADORES,
+                        help="Fichero de operadores recomendados por vrp_operadores.py (si existe).")
+    parser.add_argument("--perfiles", default=FICHERO_PERFILES,
+                        help="Fichero de perfiles de parámetros de vrp_ajuste.py (si existe).")
+    parser.add_argument("--constructiva", choices=sorted(vrp_constructivas.METODOS_CONSTRUCTIVOS), default=None,
+                        help="Heurística para la solución inicial cuando no hay arranque en caliente.")
+    parser.add_argument("--plan-rapido", choices=sorted(vrp_constructivas.METODOS_CONSTRUCTIVOS), default=None,
+                        help="Generar solo el plan de la heurística constructiva, sin solver.")
+    parser.add_argument("--pulir", action="store_true", help="Reordenar cada ruta por separado tras el solver.")
+    parser.add_argument("--progreso", type=float, default=None,
+                        help="Mostrar el mejor plan encontrado como mucho cada estos segundos durante la búsqueda.")
+    parser.add_argument("--sin-cache", action="store_true", help="Resolver aunque el día ya esté en la caché de soluciones.")
+    parser.add_argument("--punto-control", type=float, default=10,
+                        help="Guardar la mejor solución cada estos segundos (0 para no guardarla).")
+    parser.add_argument("--resume", action="store_true", help="Continuar la búsqueda desde el último punto de control del día.")
+    parser.add_argument("--modo-recogidas", choices=MODOS_RECOGIDA, default="auto",
+                        help="Modelo monolítico, dos fases (reparto y después recogidas) o el más rápido según vrp_dos_fases.py.")
+    args = parser.parse_args()
+
+    def mostrar_progreso(mejora):
+        usadas = sum(1 for ruta in mejora['rutas'] if ruta)
+        print(f"⏱️ {mejora['segundo']:.1f}s: objetivo {mejora['objetivo']}, {usadas} rutas")
+
+    main(args.tiempo, not args.sin_arranque_caliente, args.tiempo_caliente, args.flota_adaptativa,
+         args.sin_mejora, args.ganancia_minima, args.traza, args.grafica, args.operadores, args.perfiles,
+         args.constructiva, args.plan_rapido, args.pulir, mostrar_progreso if args.progreso is not None else None,
+         args.progreso or 1.0, not args.sin_cache, args.punto_control, args.resume, args.modo_recogidas)
 
@@ -0,0 +1,187 @@
+"""Ajuste automático de los parámetros del solver sobre días de producción guardados.
+
+Busca (aleatoriamente o por mitades sucesivas) la estrategia de primera solución, la metaheurística,
+el límite de tiempo, la holgura de espera, las penalizaciones por descarte y el coeficiente de GLS,
+resolviendo en paralelo las instancias de `instancias/`. El mejor perfil de cada tramo de tamaño
+se escribe en `perfiles_parametros.json`, que lee `vrp_TFM.main`."""
+
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import vrp_TFM
+
+# Valores candidatos de cada parámetro
+ESPACIO_BUSQUEDA = {
+    "primera_solucion": ["PATH_MOST_CONSTRAINED_ARC", "PATH_CHEAPEST_ARC", "PARALLEL_CHEAPEST_INSERTION",
+                         "LOCAL_CHEAPEST_INSERTION", "SAVINGS", "CHRISTOFIDES"],
+    "metaheuristica": ["GUIDED_LOCAL_SEARCH", "SIMULATED_ANNEALING", "TABU_SEARCH"],
+    "tiempo_limite": [30, 45, 60, 75, 90],
+    "holgura_tiempo": [30, 45, 60, 90, 120],
+    "penalizacion_tienda": [1000000, 10000000, 100000000],
+    "penalizacion_recogida": [100000, 1000000, 10000000],
+    "coef_gls": [0.05, 0.1, 0.2, 0.3, 0.5],
+}
+
+# Configuración actual de producción: siempre entra como candidata de referencia
+PERFIL_POR_DEFECTO = {
+    "primera_solucion": "PATH_MOST_CONSTRAINED_ARC",
+    "metaheuristica": "GUIDED_LOCAL_SEARCH",
+    "tiempo_limite": 75,
+    "holgura_tiempo": vrp_TFM.HOLGURA_TIEMPO,
+    "penalizacion_tienda": vrp_TFM.PENALIZACION_DESCARTE,
+    "penalizacion_recogida": vrp_TFM.PENALIZACION_DESCARTE,
+    "coef_gls": 0.1,
+}
+
+# Instancias cargadas en cada proceso trabajador
+_INSTANCIAS = {}
+
+
+def puntuar_rutas(data, rutas):
+    """Coste comparable entre configuraciones: distancia total más una penalización fija
+    (PENALIZACION_DESCARTE) por cada tienda o recogida sin servir.
+
+    No se usa el objetivo del solver porque depende de las penalizaciones que se están ajustando."""
+    desglose = vrp_TFM.desglose_coste(data, rutas, vrp_TFM.PENALIZACION_DESCARTE)
+    return {'puntuacion': desglose.pop('coste'), **desglose}
+
+
+def _evaluar(fichero, configuracion, segundos):
+    """Resuelve una instancia guardada con una configuración y devuelve su puntuación."""
+    if fichero not in _INSTANCIAS:
+        _INSTANCIAS[fichero] = vrp_TFM.cargar_instancia(fichero)
+    data = vrp_TFM.aplicar_perfil(_INSTANCIAS[fichero], configuracion)
+
+    manager, routing = vrp_TFM.crear_modelo(data)
+    search_parameters = vrp_TFM.parametros_desde_perfil(configuracion, segundos)
+    solution = vrp_TFM.resolver(data, manager, routing, search_parameters)
+    if solution is None:
+        return {'puntuacion': math.inf, 'distancia': None, 'tiendas_sin_servir': None, 'recogidas_sin_servir': None}
+    return puntuar_rutas(data, vrp_TFM.extraer_rutas(data, manager, routing, solution))
+
+
+def _muestrear(num_candidatos, semilla):
+    """Configuraciones aleatorias distintas del espacio de búsqueda, con la de producción la primera."""
+    rng = random.Random(semilla)
+    candidatos = [dict(PERFIL_POR_DEFECTO)]
+    intentos = 0
+    while len(candidatos) < num_candidatos and intentos < 100 * num_candidatos:
+        intentos += 1
+        configuracion = {clave: rng.choice(valores) for clave, valores in ESPACIO_BUSQUEDA.items()}
+        if configuracion not in candidatos:
+            candidatos.append(configuracion)
+    return candidatos
+
+
+def _ronda(pool, ficheros, candidatos, fraccion, ronda):
+    """Evalúa todos los candidatos en todas las instancias con `fraccion` de su límite de tiempo.
+
+    La puntuación de un candidato es la media, por instancia, de su coste relativo al mejor de la ronda,
+    para que los días grandes no pesen más que los pequeños. Las instancias en las que ningún candidato
+    encuentra solución no entran en la media (si no queda ninguna, el coste relativo es infinito)."""
+    futuros = {(c, f): pool.submit(_evaluar, f, configuracion,
+                                   max(1, round(configuracion["tiempo_limite"] * fraccion)))
+               for c, configuracion in enumerate(candidatos) for f in ficheros}
+    resultados = {clave: futuro.result() for clave, futuro in futuros.items()}
+
+    mejor = {f: min(resultados[(c, f)]['puntuacion'] for c in range(len(candidatos))) for f in ficheros}
+    resueltas = [f for f in ficheros if math.isfinite(mejor[f])]
+    if len(resueltas) < len(ficheros):
+        print(f"⚠️ Ronda {ronda}: {len(ficheros) - len(resueltas)} instancias sin solución con ningún candidato, "
+              f"no cuentan en el coste relativo")
+    filas = []
+    for c, configuracion in enumerate(candidatos):
+        relativas = [resultados[(c, f)]['puntuacion'] / max(mejor[f], 1) for f in resueltas]
+        filas.append({'ronda': ronda, 'fraccion_tiempo': fraccion, **configuracion,
+                      'coste_relativo': sum(relativas) / len(relativas) if relativas else math.inf,
+                      'tiendas_sin_servir': sum(resultados[(c, f)]['tiendas_sin_servir'] or 0 for f in ficheros),
+                      'distancia': sum(resultados[(c, f)]['distancia'] or 0 for f in ficheros)})
+    return filas
+
+
+def ajustar_parametros(ficheros, metodo="mitades", num_candidatos=27, eta=3, rondas=3, tolerancia=0.01,
+                       semilla=0, procesos=None):
+    """Busca la mejor configuración para un conjunto de instancias.
+
+    - "aleatoria": todos los candidatos con su límite de tiempo completo.
+    - "mitades": mitades sucesivas; en cada ronda se conserva 1/`eta` de los candidatos y se multiplica
+      por `eta` la fracción de tiempo, de modo que la última ronda usa el límite completo.
+    Entre los candidatos de la última ronda con coste a menos de `tolerancia` del mejor se elige el de menor
+    límite de tiempo (así el ajuste no premia sin más los límites largos).
+    Devuelve (mejor configuración, DataFrame con todas las evaluaciones)."""
+    candidatos = _muestrear(num_candidatos, semilla)
+    if metodo == "aleatoria":
+        rondas = 1
+
+    filas = []
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        for r in range(rondas):
+            inicio = time.time()
+            fraccion = eta ** -(rondas - 1 - r)
+            resultados = sorted(_ronda(pool, ficheros, candidatos, fraccion, r), key=lambda f: f['coste_relativo'])
+            filas += resultados
+            print(f"🎛️ Ronda {r}: {len(candidatos)} candidatos al {fraccion:.0%} del tiempo "
+                  f"({time.time() - inicio:.1f}s), mejor coste relativo {resultados[0]['coste_relativo']:.4f}")
+            if r < rondas - 1:
+                candidatos = [{clave: fila[clave] for clave in ESPACIO_BUSQUEDA}
+                              for fila in resultados[:max(1, len(candidatos) // eta)]]
+
+    finales = [fila for fila in resultados if fila['coste_relativo'] <= resultados[0]['coste_relativo'] * (1 + tolerancia)]
+    elegida = min(finales, key=lambda fila: (fila['tiempo_limite'], fila['coste_relativo']))
+    return {clave: elegida[clave] for clave in ESPACIO_BUSQUEDA}, pd.DataFrame(filas)
+
+
+def guardar_perfiles(perfiles, fichero=vrp_TFM.FICHERO_PERFILES):
+    """Añade o sustituye los perfiles de los tramos ajustados, conservando los demás."""
+    existentes = {}
+    if os.path.exists(fichero):
+        with open(fichero, encoding="utf-8") as f:
+            existentes = json.load(f)["perfiles"]
+    existentes.update(perfiles)
+    with open(fichero, "w", encoding="utf-8") as f:
+        json.dump({'generado': time.strftime("%Y-%m-%d %H:%M:%S"), 'perfiles': existentes}, f, indent=1)
+    print(f"✅ Perfiles de parámetros guardados en {fichero} ({', '.join(sorted(perfiles))})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ajuste de parámetros del solver sobre días guardados.")
+    parser.add_argument("instancias", nargs="*", help="Ficheros de instancia (por defecto, todos los de instancias/).")
+    parser.add_argument("--metodo", choices=["mitades", "aleatoria"], default="mitades", help="Método de búsqueda.")
+    parser.add_argument("--candidatos", type=int, default=27, help="Configuraciones iniciales.")
+    parser.add_argument("--eta", type=int, default=3, help="Factor de reducción de las mitades sucesivas.")
+    parser.add_argument("--rondas", type=int, default=3, help="Rondas de las mitades sucesivas.")
+    parser.add_argument("--tolerancia", type=float, default=0.01,
+                        help="Margen de coste para preferir un límite de tiempo menor.")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla del muestreo.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores.")
+    parser.add_argument("--salida", default=vrp_TFM.FICHERO_PERFILES, help="Fichero de perfiles.")
+    args = parser.parse_args()
+
+    ficheros = args.instancias or sorted(glob.glob(f"{vrp_TFM.CARPETA_INSTANCIAS}/instancia_*.pkl"))
+    if not ficheros:
+        raise SystemExit(f"No hay instancias guardadas en {vrp_TFM.CARPETA_INSTANCIAS}/ (ejecuta antes vrp_TFM.py).")
+
+    # Un perfil por tramo de tamaño, ajustado solo con los días de ese tramo
+    tramos = {}
+    for fichero in ficheros:
+        tramos.setdefault(vrp_TFM.tramo_tamano(vrp_TFM.cargar_instancia(fichero)), []).append(fichero)
+
+    perfiles, detalle = {}, []
+    for tramo, ficheros_tramo in tramos.items():
+        print(f"\n📦 Tramo '{tramo}': {len(ficheros_tramo)} días")
+        perfiles[tramo], evaluaciones = ajustar_parametros(ficheros_tramo, args.metodo, args.candidatos, args.eta,
+                                                           args.rondas, args.tolerancia, args.semilla, args.procesos)
+        detalle.append(evaluaciones.assign(tramo=tramo))
+        print(f"   Mejor perfil: {perfiles[tramo]}")
+
+    pd.concat(detalle).to_csv("ajuste_parametros.csv", index=False)
+    print(" Detalle de las evaluaciones en ajuste_parametros.csv")
+    guardar_perfiles(perfiles, args.salida)
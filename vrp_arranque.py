@@ -0,0 +1,126 @@
+"""Arranque en caliente: guarda las rutas finales de cada día y las reutiliza como solución inicial.
+
+También guarda puntos de control de las búsquedas largas para poder reanudarlas (`--resume`)."""
+
+import glob
+import json
+import os
+from datetime import datetime
+
+import vrp_cache
+from vrp_evaluacion import evaluar_ruta
+
+CARPETA_RUTAS = "historico_rutas"
+CARPETA_PUNTOS_CONTROL = "puntos_control"
+
+
+def _fecha(dia):
+    """Convierte 'DD/MM/YYYY' en 'YYYY-MM-DD' (ordenable como texto)."""
+    return datetime.strptime(dia, "%d/%m/%Y").strftime("%Y-%m-%d")
+
+
+def guardar_rutas_dia(data, rutas, carpeta=CARPETA_RUTAS):
+    """Guarda las rutas finales del día como secuencias de loc_id, una por vehículo (también las vacías, para
+    que la posición de cada ruta sea la del camión: los eventos de `vrp_replanificacion` la usan).
+
+    Se guardan además los nodos, válidos mientras los datos tengan la misma huella (ver `cargar_rutas_dia`)."""
+    os.makedirs(carpeta, exist_ok=True)
+    rutas_loc = [[data['idx_to_node'][n] for n in ruta] for ruta in rutas]
+    fichero = os.path.join(carpeta, f"rutas_{_fecha(data['dia'])}.json")
+    with open(fichero, 'w', encoding='utf-8') as f:
+        json.dump({'dia': data['dia'], 'rutas': rutas_loc, 'nodos': [[int(n) for n in ruta] for ruta in rutas],
+                   'huella': vrp_cache.huella_datos(data)}, f, ensure_ascii=False, indent=1)
+    return fichero
+
+
+def cargar_rutas_dia(data, carpeta=CARPETA_RUTAS):
+    """Rutas guardadas del día de `data` (nodos por vehículo, en la misma posición en que se guardaron).
+
+    Si los datos son los mismos que al guardar, se usan los nodos tal cual, sin volver a comprobar la
+    factibilidad (un prefijo ya recorrido puede no cumplir los tiempos nominales y no debe perder paradas).
+    Si no, las rutas se traducen por loc_id con `mapear_rutas`."""
+    with open(os.path.join(carpeta, f"rutas_{_fecha(data['dia'])}.json"), encoding='utf-8') as f:
+        guardado = json.load(f)
+    if guardado.get('huella') != vrp_cache.huella_datos(data) or 'nodos' not in guardado:
+        return mapear_rutas(data, guardado['rutas'])
+    rutas = guardado['nodos'][:data['num_vehicles']]
+    return rutas + [[] for _ in range(data['num_vehicles'] - len(rutas))]
+
+
+def cargar_rutas_previas(dia, carpeta=CARPETA_RUTAS):
+    """Devuelve las rutas (loc_id) del día guardado más reciente que no sea posterior a `dia`, o None."""
+    fecha = _fecha(dia)
+    candidatos = sorted(f for f in glob.glob(os.path.join(carpeta, "rutas_*.json"))
+                        if os.path.basename(f)[len("rutas_"):-len(".json")] <= fecha)
+    if not candidatos:
+        return None
+    with open(candidatos[-1], encoding='utf-8') as f:
+        guardado = json.load(f)
+    print(f"♻️ Rutas previas encontradas: {guardado['dia']} ({sum(1 for ruta in guardado['rutas'] if ruta)} rutas)")
+    return guardado['rutas']
+
+
+def mapear_rutas(data, rutas_loc):
+    """Traduce rutas de loc_id a nodos del `visits_list` actual.
+
+    Los loc_id que ya no existen se descartan y las visitas nuevas quedan sin asignar. Si una tienda
+    tiene varias ventanas se elige la primera que mantiene la ruta factible, y se saltan las paradas
+    que harían la ruta infactible (carga, ventanas o jornada) con los datos del día."""
+    nodos_por_loc = {}
+    for i, v in enumerate(data['visits_list']):
+        if i != data['depot']:
+            nodos_por_loc.setdefault(v['loc_id'], []).append(i)
+
+    asignados = set()
+    rutas = []
+    for vehicle_id, ruta_loc in enumerate(rutas_loc[:data['num_vehicles']]):
+        ruta = []
+        for loc_id in ruta_loc:
+            if loc_id in asignados:
+                continue
+            for nodo in nodos_por_loc.get(loc_id, []):
+                if evaluar_ruta(data, ruta + [nodo], vehicle_id)['factible']:
+                    ruta.append(nodo)
+                    asignados.add(loc_id)
+                    break
+        rutas.append(ruta)
+
+    rutas += [[] for _ in range(data['num_vehicles'] - len(rutas))]
+    return rutas
+
+
+def fichero_punto_control(dia, nombre="vrp", carpeta=CARPETA_PUNTOS_CONTROL):
+    """Ruta del punto de control de un día; `nombre` distingue los distintos procesos (solver, LNS...)."""
+    return os.path.join(carpeta, f"{nombre}_{_fecha(dia)}.json")
+
+
+def guardar_punto_control(fichero, data, rutas, objetivo, huella=None):
+    """Escribe las rutas de la mejor solución hasta el momento (escritura atómica: nunca queda a medias).
+
+    Se guardan los nodos, válidos mientras los datos tengan la misma `huella`, y los loc_id como respaldo."""
+    os.makedirs(os.path.dirname(fichero) or ".", exist_ok=True)
+    punto = {
+        'dia': data['dia'], 'huella': huella or vrp_cache.huella_datos(data), 'objetivo': objetivo,
+        'guardado': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'rutas': rutas,
+        'rutas_loc': [[data['idx_to_node'][n] for n in ruta] for ruta in rutas],
+    }
+    temporal = fichero + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(punto, f, ensure_ascii=False)
+    os.replace(temporal, fichero)
+
+
+def cargar_punto_control(data, fichero):
+    """Rutas (nodos por vehículo, tantas como `data['num_vehicles']`) del punto de control, o None si no hay.
+
+    Si los datos del día han cambiado desde que se guardó, las rutas se traducen por loc_id con `mapear_rutas`."""
+    if not os.path.exists(fichero):
+        return None
+    with open(fichero, encoding='utf-8') as f:
+        punto = json.load(f)
+    print(f"⏯️ Punto de control de {punto['guardado']} (objetivo {punto['objetivo']})")
+    if punto['huella'] != vrp_cache.huella_datos(data):
+        print("⚠️ Los datos han cambiado desde el punto de control: las rutas se traducen por loc_id.")
+        return mapear_rutas(data, [r for r in punto['rutas_loc'] if r])
+    rutas = [r for r in punto['rutas'] if r][:data['num_vehicles']]
+    return rutas + [[] for _ in range(data['num_vehicles'] - len(rutas))]
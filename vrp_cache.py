@@ -0,0 +1,103 @@
+"""Caché en disco de soluciones, indexada por un hash del contenido de la entrada del solver.
+
+Volver a lanzar el mismo día (regenerar el mapa, reintentar tras un fallo al exportar el Excel...) con
+los mismos datos y parámetros reutiliza las rutas guardadas sin volver a resolver. Cada entrada es un JSON
+`<clave>.json`; la fecha de modificación hace de último uso y, al superar el tamaño máximo, se borran
+las entradas usadas hace más tiempo (LRU)."""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+CARPETA_CACHE = "cache_soluciones"
+TAMANO_MAXIMO_CACHE = 50 * 1024 * 1024  # bytes
+
+# Claves de `data` que definen el problema (las matrices se tratan aparte por tamaño)
+CLAVES_MATRICES = ("distance_matrix", "time_matrix")
+CLAVES_DATOS = ("time_windows", "demands", "service_times", "vehicle_capacities", "num_vehicles", "depot",
+                "pickup_nodes", "delivery_nodes", "holgura_tiempo", "jornada_max", "horizonte",
+                "penalizacion_tienda", "penalizacion_recogida")
+
+
+def _hash_datos(data, opciones=None):
+    h = hashlib.sha256()
+    for clave in CLAVES_MATRICES:
+        matriz = np.asarray(data[clave], dtype=np.int64)
+        h.update(clave.encode())
+        h.update(str(matriz.shape).encode())
+        h.update(matriz.tobytes())
+    resto = {clave: data.get(clave) for clave in CLAVES_DATOS}
+    resto["loc_ids"] = [v["loc_id"] for v in data["visits_list"]]
+    resto["opciones"] = opciones or {}
+    h.update(json.dumps(resto, sort_keys=True, default=str).encode())
+    return h
+
+
+def huella_datos(data):
+    """Hash estable (SHA-256) solo de los datos del día: dos `data` con la misma huella tienen los mismos nodos."""
+    return _hash_datos(data).hexdigest()
+
+
+def clave_instancia(data, search_parameters, opciones=None):
+    """Hash estable (SHA-256) de los datos del día, los parámetros de búsqueda y las opciones de resolución.
+
+    `opciones` es un diccionario serializable en JSON con lo que también cambia el resultado (flota
+    adaptativa, pulido, heurística inicial...)."""
+    h = _hash_datos(data, opciones)
+    h.update(search_parameters.SerializeToString(deterministic=True))
+    return h.hexdigest()
+
+
+def _fichero(clave, carpeta):
+    return os.path.join(carpeta, f"{clave}.json")
+
+
+def cargar(clave, carpeta=CARPETA_CACHE):
+    """Entrada guardada para `clave` ({'rutas', 'num_vehicles', 'objetivo', ...}) o None. Marca su último uso."""
+    fichero = _fichero(clave, carpeta)
+    if not os.path.exists(fichero):
+        return None
+    try:
+        with open(fichero, encoding="utf-8") as f:
+            entrada = json.load(f)
+    except (OSError, ValueError):
+        # Entrada a medio escribir o corrupta: se descarta
+        os.remove(fichero)
+        return None
+    os.utime(fichero)
+    print(f"💾 Solución recuperada de la caché ({entrada['dia']}, objetivo {entrada['objetivo']})")
+    return entrada
+
+
+def guardar(clave, data, rutas, objetivo, carpeta=CARPETA_CACHE, tamano_maximo=TAMANO_MAXIMO_CACHE):
+    """Guarda las rutas de una solución y aplica el límite de tamaño de la caché."""
+    os.makedirs(carpeta, exist_ok=True)
+    entrada = {'dia': data.get("dia"), 'num_vehicles': data["num_vehicles"], 'objetivo': objetivo,
+               'rutas': rutas, 'guardado': time.strftime("%Y-%m-%d %H:%M:%S")}
+    temporal = _fichero(clave, carpeta) + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(entrada, f)
+    os.replace(temporal, _fichero(clave, carpeta))
+    purgar(carpeta, tamano_maximo)
+
+
+def purgar(carpeta=CARPETA_CACHE, tamano_maximo=TAMANO_MAXIMO_CACHE):
+    """Borra las entradas usadas hace más tiempo hasta que la caché ocupa como mucho `tamano_maximo` bytes."""
+    entradas = []
+    for nombre in os.listdir(carpeta):
+        if nombre.endswith(".json"):
+            estado = os.stat(os.path.join(carpeta, nombre))
+            entradas.append((estado.st_mtime, estado.st_size, nombre))
+    total = sum(tamano for _, tamano, _ in entradas)
+    borradas = 0
+    for _, tamano, nombre in sorted(entradas):
+        if total <= tamano_maximo:
+            break
+        os.remove(os.path.join(carpeta, nombre))
+        total -= tamano
+        borradas += 1
+    if borradas:
+        print(f"🧹 Caché de soluciones: {borradas} entradas antiguas borradas")
@@ -0,0 +1,144 @@
+"""Heurísticas constructivas rápidas (ahorros de Clarke-Wright con ventanas y barrido) sobre las matrices del día.
+
+Sirven como solución inicial del solver (`python vrp_TFM.py --constructiva ahorros`) o como plan rápido
+sin solver (`python vrp_TFM.py --plan-rapido barrido`). Cada ruta se comprueba con `evaluar_ruta`,
+así que las rutas construidas son factibles para el modelo."""
+
+import math
+
+import numpy as np
+
+from vrp_evaluacion import evaluar_ruta
+
+
+def _representantes(data):
+    """Un nodo por tienda (la primera ventana que se puede servir en una ruta en solitario) y las recogidas.
+
+    Las visitas que no caben ni solas en un camión quedan fuera (el modelo también las descartaría)."""
+    elegidos, vistos = [], set()
+    for i, v in enumerate(data["visits_list"]):
+        if i == data["depot"] or v["loc_id"] in vistos:
+            continue
+        if evaluar_ruta(data, [i])['factible']:
+            elegidos.append(i)
+            vistos.add(v["loc_id"])
+    return elegidos
+
+
+def _insercion_mas_barata(data, distancias, ruta, nodo):
+    """Ruta con `nodo` insertado en la posición factible de menor coste, o None si no cabe en ninguna."""
+    camino = np.array([data["depot"]] + ruta + [data["depot"]])
+    incremento = distancias[camino[:-1], nodo] + distancias[nodo, camino[1:]] - distancias[camino[:-1], camino[1:]]
+    for posicion in np.argsort(incremento, kind="stable"):
+        candidata = ruta[:posicion] + [nodo] + ruta[posicion:]
+        if evaluar_ruta(data, candidata)['factible']:
+            return candidata
+    return None
+
+
+def _completar_flota(data, rutas, rutas_cercanas=5):
+    """Ajusta la lista al número de vehículos.
+
+    Si sobran rutas se quedan las de más carga y se intenta insertar cada visita de las descartadas
+    en alguna de las `rutas_cercanas` rutas conservadas más próximas."""
+    rutas = sorted(rutas, key=lambda r: sum(abs(data["demands"][n]) for n in r), reverse=True)
+    rutas, sobrantes = rutas[:data["num_vehicles"]], [n for r in rutas[data["num_vehicles"]:] for n in r]
+    if sobrantes and rutas:
+        distancias = np.asarray(data["distance_matrix"], dtype=float)
+        for nodo in sobrantes:
+            cercania = [distancias[ruta, nodo].min() for ruta in rutas]
+            for r in np.argsort(cercania)[:rutas_cercanas]:
+                insertada = _insercion_mas_barata(data, distancias, rutas[r], nodo)
+                if insertada is not None:
+                    rutas[r] = insertada
+                    break
+    return rutas + [[] for _ in range(data["num_vehicles"] - len(rutas))]
+
+
+def rutas_ahorros(data, vecinos=30):
+    """Ahorros de Clarke-Wright con ventanas horarias.
+
+    El ahorro de enlazar el final de una ruta en i con el principio de otra en j es
+    d(i,0) + d(0,j) - d(i,j); solo se consideran los `vecinos` mejores j de cada i y los pares
+    en los que j todavía puede estar abierta al llegar desde i lo antes posible. Cada unión se
+    acepta si la ruta resultante es factible (carga, ventanas, jornada y orden entregas/recogidas)."""
+    depot = data["depot"]
+    nodos = _representantes(data)
+    if not nodos:
+        return _completar_flota(data, [])
+    idx = np.array(nodos)
+    distancias = np.asarray(data["distance_matrix"], dtype=float)
+    tiempos = np.asarray(data["time_matrix"], dtype=float)
+    ventanas = np.asarray(data["time_windows"], dtype=float)[idx]
+    servicio = np.asarray(data["service_times"], dtype=float)[idx]
+
+    ahorro = distancias[idx, depot][:, None] + distancias[depot, idx][None, :] - distancias[np.ix_(idx, idx)]
+    compatibles = ventanas[:, 0][:, None] + servicio[:, None] + tiempos[np.ix_(idx, idx)] <= ventanas[:, 1][None, :]
+    ahorro = np.where(compatibles & (ahorro > 0), ahorro, -np.inf)
+    np.fill_diagonal(ahorro, -np.inf)
+
+    # Los `vecinos` mejores sucesores de cada nodo, ordenados de mayor a menor ahorro
+    k = min(vecinos, len(nodos) - 1)
+    if k <= 0:
+        return _completar_flota(data, [[n] for n in nodos])
+    mejores = np.argpartition(-ahorro, k - 1, axis=1)[:, :k]
+    filas = np.repeat(np.arange(len(nodos)), k)
+    columnas = mejores.ravel()
+    valores = ahorro[filas, columnas]
+    validos = np.isfinite(valores)
+    orden = np.argsort(-valores[validos], kind="stable")
+    pares = zip(filas[validos][orden], columnas[validos][orden])
+
+    capacidad = data["vehicle_capacities"][0]
+    rutas = {n: [n] for n in nodos}          # id de ruta (su primer nodo al crearla) -> nodos
+    ruta_de = {n: n for n in nodos}
+    carga = {n: abs(data["demands"][n]) for n in nodos}
+    for a, b in pares:
+        i, j = nodos[a], nodos[b]
+        ri, rj = ruta_de[i], ruta_de[j]
+        if ri == rj or rutas[ri][-1] != i or rutas[rj][0] != j or carga[ri] + carga[rj] > capacidad:
+            continue
+        unida = rutas[ri] + rutas[rj]
+        if not evaluar_ruta(data, unida)['factible']:
+            continue
+        rutas[ri] = unida
+        carga[ri] += carga.pop(rj)
+        for n in rutas.pop(rj):
+            ruta_de[n] = ri
+
+    return _completar_flota(data, list(rutas.values()))
+
+
+def rutas_barrido(data):
+    """Barrido angular alrededor del depósito con inserción más barata factible.
+
+    Las visitas se recorren por ángulo, empezando en el mayor hueco angular; cada una se inserta en la ruta
+    abierta y, si no cabe, se cierra la ruta y se abre otra."""
+    depot = data["depot"]
+    nodos = _representantes(data)
+    if not nodos:
+        return _completar_flota(data, [])
+    distancias = np.asarray(data["distance_matrix"], dtype=float)
+
+    lat0, lon0 = data["node_coords"][depot]
+    escala = math.cos(math.radians(lat0))
+    coords = np.array([data["node_coords"][n] for n in nodos], dtype=float)
+    angulos = np.arctan2(coords[:, 0] - lat0, (coords[:, 1] - lon0) * escala)
+    orden = np.argsort(angulos)
+    huecos = np.diff(np.r_[angulos[orden], angulos[orden][0] + 2 * np.pi])
+    orden = np.roll(orden, -(int(np.argmax(huecos)) + 1))
+
+    rutas, actual = [], []
+    for k in orden:
+        nodo = nodos[k]
+        insertada = _insercion_mas_barata(data, distancias, actual, nodo)
+        if insertada is None:
+            rutas.append(actual)
+            insertada = [nodo]
+        actual = insertada
+    rutas.append(actual)
+
+    return _completar_flota(data, [r for r in rutas if r])
+
+
+METODOS_CONSTRUCTIVOS = {"ahorros": rutas_ahorros, "barrido": rutas_barrido}
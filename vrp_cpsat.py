@@ -0,0 +1,210 @@
+"""Motor exacto con CP-SAT para subproblemas pequeños (unas pocas rutas de una región o una sola ruta larga).
+
+Formula las mismas reglas que `vrp_TFM.crear_modelo`: camión que sale lleno y descarga en cada entrega,
+ventanas horarias con espera máxima `holgura_tiempo`, jornada máxima, entregas antes que recogidas y una
+sola ventana por tienda, con penalización por cada tienda o recogida sin servir. Funciona sobre cualquier
+`data` (normalmente un subproblema de `vrp_TFM.crear_subproblema`) y `resolver_subproblema_cpsat` tiene
+la misma firma que el motor de OR-Tools de `vrp_descomposicion`, para usarlo desde la descomposición o la LNS."""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ortools.sat.python import cp_model
+
+import vrp_TFM
+
+# Distancias a partir de las cuales el arco se considera prohibido (PENALIZACION de la consulta SQL)
+ARCO_PROHIBIDO = 5000000
+
+
+def resolver_cpsat(data, segundos=10, rutas_iniciales=None, trabajadores=8):
+    """Resuelve `data` con CP-SAT. Devuelve (rutas por vehículo, coste, óptimo demostrado) o (None, None, False).
+
+    `rutas_iniciales` (mismo formato que `extraer_rutas`) se pasan como pista al solver."""
+    depot = data["depot"]
+    n = len(data["distance_matrix"])
+    dist = data["distance_matrix"]
+    tiempo = data["time_matrix"]
+    servicio = data["service_times"]
+    horizonte, holgura = data["horizonte"], data["holgura_tiempo"]
+    capacidad = max(data["vehicle_capacities"])
+    ventanas = [(s, e) if s <= e else (0, horizonte) for s, e in data["time_windows"]]
+    ventanas[depot] = (0, horizonte)
+    entrega = [abs(d) for d in data["demands"]]
+    recogidas = set(data["pickup_nodes"])
+    clientes = [i for i in range(n) if i != depot]
+
+    model = cp_model.CpModel()
+
+    # Arcos posibles: se descartan los prohibidos y los que no pueden cumplir la ventana del destino
+    arcos = {}
+    for i in range(n):
+        for j in range(n):
+            if i == j or dist[i][j] >= ARCO_PROHIBIDO:
+                continue
+            if i != depot and j != depot and ventanas[i][0] + servicio[i] + tiempo[i][j] > ventanas[j][1]:
+                continue
+            if i != depot and j != depot and (i in recogidas) and (j not in recogidas):
+                continue  # Ninguna entrega después de una recogida
+            arcos[(i, j)] = model.NewBoolVar(f"x_{i}_{j}")
+
+    # Un lazo en un nodo significa que no se visita
+    visitado = {i: model.NewBoolVar(f"v_{i}") for i in clientes}
+    circuito = [(i, j, lit) for (i, j), lit in arcos.items()]
+    circuito += [(i, i, visitado[i].Not()) for i in clientes]
+    model.AddMultipleCircuit(circuito)
+    model.Add(sum(lit for (i, j), lit in arcos.items() if i == depot) <= data["num_vehicles"])
+
+    # Una sola ventana por tienda
+    grupos = {}
+    for i in clientes:
+        grupos.setdefault(data["visits_list"][i]["loc_id"], []).append(i)
+    servido = {}
+    for loc, nodos in grupos.items():
+        servido[loc] = model.NewBoolVar(f"s_{loc}")
+        model.Add(sum(visitado[i] for i in nodos) == servido[loc])
+
+    # Hora de servicio, hora de salida de la ruta (arrastrada por la ruta) y carga entregada acumulada
+    hora = {i: model.NewIntVar(ventanas[i][0], ventanas[i][1], f"t_{i}") for i in clientes}
+    salida = {i: model.NewIntVar(0, horizonte, f"inicio_{i}") for i in clientes}
+    entregado = {i: model.NewIntVar(0, capacidad, f"q_{i}") for i in clientes}
+
+    for (i, j), lit in arcos.items():
+        if j == depot:
+            # Vuelta al depósito: jornada máxima y fin del día
+            llegada = hora[i] + servicio[i] + tiempo[i][depot]
+            model.Add(llegada - salida[i] <= data["jornada_max"]).OnlyEnforceIf(lit)
+            model.Add(llegada <= horizonte).OnlyEnforceIf(lit)
+        elif i == depot:
+            model.Add(hora[j] >= salida[j] + tiempo[depot][j]).OnlyEnforceIf(lit)
+            model.Add(hora[j] <= salida[j] + tiempo[depot][j] + holgura).OnlyEnforceIf(lit)
+            model.Add(entregado[j] == entrega[j]).OnlyEnforceIf(lit)
+        else:
+            transito = servicio[i] + tiempo[i][j]
+            model.Add(hora[j] >= hora[i] + transito).OnlyEnforceIf(lit)
+            model.Add(hora[j] <= hora[i] + transito + holgura).OnlyEnforceIf(lit)
+            model.Add(salida[j] == salida[i]).OnlyEnforceIf(lit)
+            model.Add(entregado[j] == entregado[i] + entrega[j]).OnlyEnforceIf(lit)
+
+    penalizacion_tienda = data.get("penalizacion_tienda", vrp_TFM.PENALIZACION_DESCARTE)
+    penalizacion_recogida = data.get("penalizacion_recogida", vrp_TFM.PENALIZACION_DESCARTE)
+    model.Minimize(
+        sum(dist[i][j] * lit for (i, j), lit in arcos.items())
+        + sum((penalizacion_recogida if nodos[0] in recogidas else penalizacion_tienda) * (1 - servido[loc])
+              for loc, nodos in grupos.items()))
+
+    if rutas_iniciales:
+        siguientes = {}
+        for ruta in rutas_iniciales:
+            if ruta:
+                camino = [depot] + list(ruta) + [depot]
+                siguientes.update(zip(camino[:-1], camino[1:]))
+        for (i, j), lit in arcos.items():
+            if i != depot:
+                model.AddHint(lit, siguientes.get(i) == j)
+        for i in clientes:
+            model.AddHint(visitado[i], i in siguientes)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = segundos
+    solver.parameters.num_workers = trabajadores
+    estado = solver.Solve(model)
+    if estado not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return None, None, False
+
+    siguiente = {i: j for (i, j), lit in arcos.items() if i != depot and solver.Value(lit)}
+    rutas = []
+    for (i, j), lit in arcos.items():
+        if i == depot and solver.Value(lit):
+            ruta = []
+            while j != depot:
+                ruta.append(j)
+                j = siguiente[j]
+            rutas.append(ruta)
+    rutas += [[] for _ in range(data["num_vehicles"] - len(rutas))]
+    return rutas, int(solver.ObjectiveValue()), estado == cp_model.OPTIMAL
+
+
+def resolver_subproblema_cpsat(sub, segundos, rutas_iniciales=None):
+    """Igual que `vrp_descomposicion._resolver_subproblema` pero con CP-SAT: rutas no vacías en índices globales."""
+    rutas, _, _ = resolver_cpsat(sub, segundos, rutas_iniciales, trabajadores=1)
+    # Sin óptimo demostrado CP-SAT puede acabar peor que las rutas de partida
+    if rutas is None or (rutas_iniciales and vrp_TFM.coste_rutas(sub, rutas_iniciales) < vrp_TFM.coste_rutas(sub, rutas)):
+        rutas = rutas_iniciales or []
+    return [r for r in vrp_TFM.rutas_a_globales(sub, rutas) if r]
+
+
+def optimizar_ruta(data, ruta, segundos=5):
+    """Secuencia óptima de las visitas de una sola ruta (índices globales). Devuelve (ruta, óptimo demostrado)."""
+    sub = vrp_TFM.crear_subproblema(data, ruta, 1)
+    rutas, _, optimo = resolver_cpsat(sub, segundos, vrp_TFM.rutas_a_locales(sub, [ruta]))
+    if rutas is None:
+        return list(ruta), False
+    return vrp_TFM.rutas_a_globales(sub, rutas)[0], optimo
+
+
+def _resolver_subconjunto(sub, segundos, rutas_iniciales):
+    inicio = time.time()
+    rutas, coste, optimo = resolver_cpsat(sub, segundos, rutas_iniciales, trabajadores=1)
+    if rutas is not None:
+        rutas = vrp_TFM.rutas_a_globales(sub, rutas)
+    return rutas, coste, optimo, time.time() - inicio
+
+
+def resolver_subconjuntos(data, subconjuntos, segundos=10, procesos=None):
+    """Resuelve en paralelo varios subconjuntos de visitas, cada uno con CP-SAT.
+
+    `subconjuntos` es una lista de (nodos, num_vehicles) o de (nodos, num_vehicles, rutas_iniciales) en índices
+    del problema completo. Devuelve, por subconjunto, (rutas globales, coste, óptimo demostrado, segundos)."""
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = []
+        for nodos, num_vehicles, *iniciales in subconjuntos:
+            sub = vrp_TFM.crear_subproblema(data, nodos, num_vehicles)
+            rutas_iniciales = vrp_TFM.rutas_a_locales(sub, iniciales[0]) if iniciales else None
+            futuros.append(pool.submit(_resolver_subconjunto, sub, segundos, rutas_iniciales))
+        return [futuro.result() for futuro in futuros]
+
+
+def main(tiempo_inicial=30, segundos_ruta=5, procesos=None):
+    """Resuelve el día con OR-Tools y optimiza después cada ruta por separado con CP-SAT."""
+    print("\n" + "="*20)
+    print("CARGANDO (RUTAS ÓPTIMAS CON CP-SAT)...")
+    print("="*20)
+
+    start_time_total = time.time()
+    data = vrp_TFM.create_data_model()
+    manager, routing = vrp_TFM.crear_modelo(data)
+    solution = vrp_TFM.resolver(data, manager, routing, vrp_TFM.crear_parametros_busqueda(tiempo_inicial))
+    if solution is None:
+        print("\n No se encontró una solución inicial viable.")
+        return
+    rutas = vrp_TFM.extraer_rutas(data, manager, routing, solution)
+
+    usadas = [v for v, ruta in enumerate(rutas) if ruta]
+    resultados = resolver_subconjuntos(data, [(rutas[v], 1, [rutas[v]]) for v in usadas], segundos_ruta, procesos)
+    optimas = 0
+    for v, (nuevas, _, optimo, _) in zip(usadas, resultados):
+        if nuevas and vrp_TFM.coste_rutas(data, [nuevas[0]]) <= vrp_TFM.coste_rutas(data, [rutas[v]]):
+            rutas[v] = nuevas[0]
+        optimas += optimo
+    print(f"🧮 CP-SAT: {optimas}/{len(usadas)} rutas con secuencia óptima demostrada, coste {vrp_TFM.coste_rutas(data, rutas)}")
+
+    manager, routing = vrp_TFM.crear_modelo(data)
+    solution = vrp_TFM.solucion_desde_rutas(manager, routing, rutas, vrp_TFM.crear_parametros_busqueda())
+    end_time_total = time.time()
+    if solution:
+        print("SOLUCIÓN ENCONTRADA")
+        print(f" Tiempo Total Proceso: {end_time_total - start_time_total:.2f}s")
+        vrp_TFM.reportar_solucion(data, manager, routing, solution)
+    else:
+        print("\n No se pudieron reconstruir las rutas de CP-SAT en el modelo completo.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VRP TFM: secuencias óptimas por ruta con CP-SAT.")
+    parser.add_argument("--tiempo-inicial", type=int, default=30, help="Segundos de la resolución global inicial.")
+    parser.add_argument("--tiempo-ruta", type=int, default=5, help="Segundos de CP-SAT por ruta.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores.")
+    args = parser.parse_args()
+    main(args.tiempo_inicial, args.tiempo_ruta, args.procesos)
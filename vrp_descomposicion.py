@@ -0,0 +1,251 @@
+"""Descomposición geográfica: un modelo de rutas por región, resuelto en paralelo, y reparación de fronteras."""
+
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import vrp_TFM
+import vrp_cpsat
+
+
+# PARTICIÓN DE VISITAS EN REGIONES
+
+def _grupos_por_tienda(data):
+    """Agrupa los nodos por loc_id (las ventanas de una misma tienda van siempre juntas).
+
+    Devuelve (grupos, coordenadas planas de cada grupo, MCE de cada grupo)."""
+    grupos = {}
+    for i, v in enumerate(data["visits_list"]):
+        if i != data["depot"]:
+            grupos.setdefault(v["loc_id"], []).append(i)
+    grupos = list(grupos.values())
+
+    lat0 = data["node_coords"][data["depot"]][0]
+    escala = math.cos(math.radians(lat0))
+    coords = np.array([[data["node_coords"][g[0]][1] * escala, data["node_coords"][g[0]][0]] for g in grupos])
+    mce = np.array([abs(data["demands"][g[0]]) for g in grupos], dtype=float)
+    return grupos, coords, mce
+
+
+def _cortes_equilibrados(mce_ordenado, num_clusters):
+    """Etiqueta de región para una secuencia ordenada, cortando cuando se alcanza la carga objetivo."""
+    acumulado = np.cumsum(mce_ordenado) - mce_ordenado / 2
+    objetivo = max(acumulado[-1], 1) / num_clusters if len(acumulado) else 1
+    return np.minimum((acumulado / objetivo).astype(int), num_clusters - 1)
+
+
+def particion_barrido(data, num_clusters):
+    """Barrido angular alrededor del depósito con regiones de MCE equilibrado.
+
+    El barrido empieza en el mayor hueco angular para no partir una zona densa."""
+    grupos, coords, mce = _grupos_por_tienda(data)
+    lat0, lon0 = data["node_coords"][data["depot"]]
+    depot = (lon0 * math.cos(math.radians(lat0)), lat0)
+
+    angulos = np.arctan2(coords[:, 1] - depot[1], coords[:, 0] - depot[0])
+    orden = np.argsort(angulos)
+    huecos = np.diff(np.r_[angulos[orden], angulos[orden][0] + 2 * np.pi])
+    orden = np.roll(orden, -(int(np.argmax(huecos)) + 1))
+
+    etiquetas = np.empty(len(grupos), dtype=int)
+    etiquetas[orden] = _cortes_equilibrados(mce[orden], num_clusters)
+    return grupos, coords, etiquetas
+
+
+def particion_kmedoides(data, num_clusters, holgura_carga=1.1, iteraciones=20):
+    """K-medoides capacitado sobre coordenadas: cada región admite hasta `holgura_carga` veces la carga media."""
+    grupos, coords, mce = _grupos_por_tienda(data)
+    distancias = np.sqrt(((coords[:, None, :] - coords[None, :, :]) ** 2).sum(axis=-1))
+    limite = holgura_carga * mce.sum() / num_clusters
+
+    # Inicialización por el punto más lejano
+    medoides = [int(np.argmax(mce))]
+    while len(medoides) < num_clusters:
+        medoides.append(int(np.argmax(distancias[:, medoides].min(axis=1))))
+
+    etiquetas = np.zeros(len(grupos), dtype=int)
+    for _ in range(iteraciones):
+        # Asignación voraz por cercanía respetando la carga máxima de cada región
+        d_medoides = distancias[:, medoides]
+        carga = np.zeros(num_clusters)
+        nuevas = np.full(len(grupos), -1)
+        for g in np.argsort(d_medoides.min(axis=1)):
+            cercanas = np.argsort(d_medoides[g])
+            con_hueco = [c for c in cercanas if carga[c] + mce[g] <= limite]
+            c = con_hueco[0] if con_hueco else cercanas[0]
+            nuevas[g] = c
+            carga[c] += mce[g]
+
+        # Nuevo medoide: el miembro con menor distancia total al resto de su región
+        nuevos_medoides = []
+        for c in range(num_clusters):
+            miembros = np.flatnonzero(nuevas == c)
+            if len(miembros) == 0:
+                nuevos_medoides.append(medoides[c])
+                continue
+            nuevos_medoides.append(int(miembros[np.argmin(distancias[np.ix_(miembros, miembros)].sum(axis=1))]))
+
+        if np.array_equal(nuevas, etiquetas) and nuevos_medoides == medoides:
+            break
+        etiquetas, medoides = nuevas, nuevos_medoides
+
+    return grupos, coords, etiquetas
+
+
+METODOS_PARTICION = {"barrido": particion_barrido, "kmedoides": particion_kmedoides}
+
+
+def _reparto_vehiculos(cargas, num_vehicles):
+    """Reparte la flota proporcionalmente a la carga de cada región (al menos un vehículo por región).
+
+    Necesita al menos tantos vehículos como regiones (`resolver_descomposicion` limita las regiones)."""
+    if len(cargas) > num_vehicles:
+        raise ValueError(f"No se pueden repartir {num_vehicles} vehículos entre {len(cargas)} regiones.")
+    cargas = np.asarray(cargas, dtype=float) + 1e-9
+    cuota = cargas / cargas.sum() * num_vehicles
+    reparto = np.maximum(np.floor(cuota).astype(int), 1)
+    for c in np.argsort(-(cuota - np.floor(cuota))):
+        if reparto.sum() >= num_vehicles:
+            break
+        reparto[c] += 1
+    while reparto.sum() > num_vehicles:
+        reparto[int(np.argmax(reparto))] -= 1
+    return reparto.tolist()
+
+
+def _emparejar_vecinos(centroides, rondas=2):
+    """Rondas de parejas de regiones vecinas; dentro de una ronda las parejas son disjuntas."""
+    k = len(centroides)
+    distancias = np.sqrt(((centroides[:, None, :] - centroides[None, :, :]) ** 2).sum(axis=-1))
+    candidatas = sorted({tuple(sorted((a, int(b)))) for a in range(k) for b in np.argsort(distancias[a])[1:3]},
+                        key=lambda p: distancias[p])
+    resultado = []
+    for _ in range(rondas):
+        usadas, ronda = set(), []
+        for a, b in candidatas:
+            if a not in usadas and b not in usadas:
+                ronda.append((a, b))
+                usadas.update((a, b))
+        candidatas = [p for p in candidatas if p not in ronda]
+        if ronda:
+            resultado.append(ronda)
+    return resultado
+
+
+# RESOLUCIÓN DE SUBPROBLEMAS
+
+def _resolver_subproblema(sub, segundos, rutas_iniciales=None):
+    """Resuelve un subproblema y devuelve sus rutas no vacías en índices del problema completo."""
+    manager, routing = vrp_TFM.crear_modelo(sub)
+    search_parameters = vrp_TFM.crear_parametros_busqueda(tiempo_limite=segundos)
+    solution = vrp_TFM.resolver(sub, manager, routing, search_parameters, rutas_iniciales)
+    if solution is None:
+        rutas = rutas_iniciales or []
+    else:
+        rutas = vrp_TFM.extraer_rutas(sub, manager, routing, solution)
+    return [r for r in vrp_TFM.rutas_a_globales(sub, rutas) if r]
+
+
+# Motores para los subproblemas: misma firma (sub, segundos, rutas_iniciales) -> rutas globales no vacías
+MOTORES_SUBPROBLEMA = {"ortools": _resolver_subproblema, "cpsat": vrp_cpsat.resolver_subproblema_cpsat}
+
+
+def resolver_descomposicion(data, num_clusters=4, metodo="barrido", segundos_region=30,
+                            segundos_reparacion=10, procesos=None, motor="ortools"):
+    """Resuelve el problema por regiones en paralelo y repara las fronteras entre regiones vecinas.
+
+    `motor` elige cómo se resuelve cada región ("ortools" o "cpsat", este solo para regiones pequeñas).
+    Devuelve las rutas por vehículo (índices globales), con el mismo formato que `extraer_rutas`."""
+    resolver_subproblema = MOTORES_SUBPROBLEMA[motor]
+    if num_clusters > data["num_vehicles"]:
+        # Una región sin vehículos dejaría todas sus tiendas sin servir
+        print(f"⚠️ {num_clusters} regiones para {data['num_vehicles']} vehículos: se usan {data['num_vehicles']} regiones")
+        num_clusters = data["num_vehicles"]
+    grupos, coords, etiquetas = METODOS_PARTICION[metodo](data, num_clusters)
+    etiqueta_nodo = {n: int(etiquetas[g]) for g, nodos in enumerate(grupos) for n in nodos}
+    cargas = [sum(abs(data["demands"][nodos[0]]) for g, nodos in enumerate(grupos) if etiquetas[g] == k)
+              for k in range(num_clusters)]
+    reparto = _reparto_vehiculos(cargas, data["num_vehicles"])
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        # 1. Una región por proceso
+        inicio = time.time()
+        futuros = []
+        for k in range(num_clusters):
+            nodos = [n for n, c in etiqueta_nodo.items() if c == k]
+            print(f"🗺️ Región {k}: {len(nodos)} visitas, {cargas[k]} MCE, {reparto[k]} vehículos")
+            futuros.append(pool.submit(resolver_subproblema, vrp_TFM.crear_subproblema(data, nodos, reparto[k]),
+                                       segundos_region))
+        # Cada ruta queda asignada a la región de la que procede
+        rutas = [(k, ruta) for k, futuro in enumerate(futuros) for ruta in futuro.result()]
+        print(f"✅ Regiones resueltas en {time.time() - inicio:.1f}s ({len(rutas)} rutas)")
+
+        # 2. Reparación de fronteras: cada pareja de regiones vecinas se reoptimiza junta
+        centroides = np.array([coords[etiquetas == k].mean(axis=0) if np.any(etiquetas == k) else coords.mean(axis=0)
+                               for k in range(num_clusters)])
+        for ronda in _emparejar_vecinos(centroides):
+            inicio = time.time()
+            servidas = {data["visits_list"][n]["loc_id"] for _, ruta in rutas for n in ruta}
+            libres = data["num_vehicles"] - len(rutas)
+            futuros = {}
+            for a, b in ronda:
+                rutas_pareja = [ruta for k, ruta in rutas if k in (a, b)]
+                sin_servir = [n for n, c in etiqueta_nodo.items()
+                              if c in (a, b) and data["visits_list"][n]["loc_id"] not in servidas]
+                nodos = [n for ruta in rutas_pareja for n in ruta] + sin_servir
+                num_vehicles = len(rutas_pareja) + libres // len(ronda)
+                if num_vehicles == 0:
+                    continue
+                sub = vrp_TFM.crear_subproblema(data, nodos, num_vehicles)
+                iniciales = vrp_TFM.rutas_a_locales(sub, rutas_pareja)
+                iniciales += [[] for _ in range(sub["num_vehicles"] - len(iniciales))]
+                futuros[(a, b)] = pool.submit(resolver_subproblema, sub, segundos_reparacion, iniciales)
+
+            for (a, b), futuro in futuros.items():
+                rutas = [(k, ruta) for k, ruta in rutas if k not in (a, b)]
+                for ruta in futuro.result():
+                    # La ruta pasa a la región a la que pertenecen la mayoría de sus visitas
+                    votos_a = sum(etiqueta_nodo[n] == a for n in ruta)
+                    votos_b = sum(etiqueta_nodo[n] == b for n in ruta)
+                    rutas.append((a if votos_a >= votos_b else b, ruta))
+            print(f"🔧 Reparación de fronteras {ronda} en {time.time() - inicio:.1f}s")
+
+    rutas = [ruta for _, ruta in rutas]
+    return rutas + [[] for _ in range(data["num_vehicles"] - len(rutas))]
+
+
+def main(num_clusters=4, metodo="barrido", segundos_region=30, segundos_reparacion=10, procesos=None, motor="ortools"):
+    print("\n" + "="*20)
+    print("CARGANDO (DESCOMPOSICIÓN GEOGRÁFICA)...")
+    print("="*20)
+
+    start_time_total = time.time()
+    data = vrp_TFM.create_data_model()
+    rutas = resolver_descomposicion(data, num_clusters, metodo, segundos_region, segundos_reparacion, procesos, motor)
+
+    # Reconstruimos la solución en el modelo completo para reutilizar los informes
+    manager, routing = vrp_TFM.crear_modelo(data)
+    solution = vrp_TFM.solucion_desde_rutas(manager, routing, rutas, vrp_TFM.crear_parametros_busqueda())
+    end_time_total = time.time()
+
+    if solution:
+        print("SOLUCIÓN ENCONTRADA")
+        print(f" Tiempo Total Proceso: {end_time_total - start_time_total:.2f}s")
+        vrp_TFM.reportar_solucion(data, manager, routing, solution)
+    else:
+        print("\n No se pudieron combinar las rutas de las regiones en una solución viable.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VRP TFM por descomposición geográfica.")
+    parser.add_argument("--clusters", type=int, default=4, help="Número de regiones.")
+    parser.add_argument("--metodo", choices=sorted(METODOS_PARTICION), default="barrido", help="Método de partición.")
+    parser.add_argument("--tiempo", type=int, default=30, help="Segundos por región.")
+    parser.add_argument("--tiempo-reparacion", type=int, default=10, help="Segundos por pareja en la reparación.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores.")
+    parser.add_argument("--motor", choices=sorted(MOTORES_SUBPROBLEMA), default="ortools", help="Motor de cada región.")
+    args = parser.parse_args()
+    main(args.clusters, args.metodo, args.tiempo, args.tiempo_reparacion, args.procesos, args.motor)
@@ -0,0 +1,116 @@
+"""Comparativa del modo en dos fases (reparto y después recogidas) frente al modelo monolítico.
+
+Cada día guardado en `instancias/` se resuelve con los dos modos y el mismo límite de tiempo. Se mide la
+calidad con `vrp_ajuste.puntuar_rutas` y la velocidad como el segundo en que cada modo encuentra su mejor
+solución (en dos fases, la última mejora del reparto más la inserción de las recogidas). Para cada tramo
+de tamaño se escribe en `modo_recogidas.json` el modo que `vrp_TFM.main` usa con `--modo-recogidas auto`:
+dos fases solo si es más rápido y su coste no empeora más de la tolerancia."""
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import vrp_TFM
+import vrp_monitores
+from vrp_ajuste import puntuar_rutas
+
+
+class _FinBusqueda:
+    """Monitor que anota cuándo termina la búsqueda (para separar el tiempo de la segunda fase)."""
+
+    def iniciar(self, routing, manager=None):
+        self.fin = None
+
+    def detener(self):
+        self.fin = time.time()
+
+
+def _medir(fichero, modo, segundos):
+    """Resuelve una instancia con un modo y devuelve su puntuación y sus tiempos."""
+    data = vrp_TFM.cargar_instancia(fichero)
+    search_parameters = vrp_TFM.crear_parametros_busqueda(segundos)
+    traza, fin = vrp_monitores.TrazaBusqueda(informar=False), _FinBusqueda()
+    inicio = time.time()
+    if modo == "dos_fases":
+        manager, routing, solution = vrp_TFM.resolver_dos_fases(data, search_parameters, monitores=[traza, fin])
+    else:
+        manager, routing = vrp_TFM.crear_modelo(data)
+        solution = vrp_TFM.resolver(data, manager, routing, search_parameters, monitores=[traza, fin])
+    total = time.time() - inicio
+
+    fila = {'instancia': os.path.basename(fichero), 'tramo': vrp_TFM.tramo_tamano(data), 'modo': modo,
+            'segundos_total': round(total, 2)}
+    if solution is None or not traza.filas:
+        return dict(fila, puntuacion=float("inf"), segundos_mejor=None)
+    # Lo que pasa tras la búsqueda (la segunda fase) cuenta en el tiempo hasta la mejor solución
+    fila['segundos_mejor'] = round(traza.filas[-1]['segundo'] + (inicio + total - fin.fin), 2)
+    return dict(fila, **puntuar_rutas(data, vrp_TFM.extraer_rutas(data, manager, routing, solution)))
+
+
+def comparar_modos(ficheros, segundos=60, procesos=None):
+    """DataFrame con una fila por instancia y modo (puntuación, tiempo hasta la mejor y tiempo total)."""
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = [pool.submit(_medir, fichero, modo, segundos)
+                   for fichero in ficheros for modo in ("monolitico", "dos_fases")]
+        filas = []
+        for futuro in futuros:
+            fila = futuro.result()
+            filas.append(fila)
+            print(f"🔀 {fila['instancia']} [{fila['modo']}]: coste {fila['puntuacion']}, "
+                  f"mejor a los {fila['segundos_mejor']}s")
+    return pd.DataFrame(filas)
+
+
+def elegir_modos(tabla, tolerancia=0.01):
+    """Modo de cada tramo: 'dos_fases' si llega antes a su mejor solución y su coste medio relativo al
+    monolítico no empeora más de `tolerancia`. Devuelve {tramo: {'modo', 'coste_relativo', ...}}."""
+    modos = {}
+    for tramo, filas in tabla.groupby("tramo"):
+        pares = filas.pivot(index="instancia", columns="modo")
+        relativo = (pares["puntuacion"]["dos_fases"] / pares["puntuacion"]["monolitico"].clip(lower=1)).mean()
+        mejor_mono = pares["segundos_mejor"]["monolitico"].mean()
+        mejor_dos = pares["segundos_mejor"]["dos_fases"].mean()
+        rapido = relativo <= 1 + tolerancia and mejor_dos < mejor_mono
+        modos[tramo] = {'modo': "dos_fases" if rapido else "monolitico", 'coste_relativo': round(float(relativo), 4),
+                        'segundos_mejor_monolitico': round(float(mejor_mono), 2),
+                        'segundos_mejor_dos_fases': round(float(mejor_dos), 2), 'dias': int(len(pares))}
+    return modos
+
+
+def guardar_modos(modos, fichero=vrp_TFM.FICHERO_MODOS_RECOGIDA):
+    """Añade o sustituye los modos de los tramos medidos, conservando los demás."""
+    existentes = {}
+    if os.path.exists(fichero):
+        with open(fichero, encoding="utf-8") as f:
+            existentes = json.load(f)["modos"]
+    existentes.update(modos)
+    with open(fichero, "w", encoding="utf-8") as f:
+        json.dump({'generado': time.strftime("%Y-%m-%d %H:%M:%S"), 'modos': existentes}, f, indent=1)
+    print(f"✅ Modos de recogidas guardados en {fichero} ({', '.join(sorted(modos))})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparativa del modo en dos fases frente al modelo monolítico.")
+    parser.add_argument("instancias", nargs="*", help="Ficheros de instancia (por defecto, todos los de instancias/).")
+    parser.add_argument("--tiempo", type=int, default=60, help="Segundos de solver por instancia y modo.")
+    parser.add_argument("--tolerancia", type=float, default=0.01,
+                        help="Empeoramiento de coste admitido para preferir el modo en dos fases.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores.")
+    parser.add_argument("--salida", default=vrp_TFM.FICHERO_MODOS_RECOGIDA, help="Fichero de modos por tramo.")
+    args = parser.parse_args()
+
+    ficheros = args.instancias or sorted(glob.glob(f"{vrp_TFM.CARPETA_INSTANCIAS}/instancia_*.pkl"))
+    if not ficheros:
+        raise SystemExit(f"No hay instancias guardadas en {vrp_TFM.CARPETA_INSTANCIAS}/ (ejecuta antes vrp_TFM.py).")
+
+    tabla = comparar_modos(ficheros, args.tiempo, args.procesos)
+    tabla.to_csv("comparativa_recogidas.csv", index=False)
+    modos = elegir_modos(tabla, args.tolerancia)
+    for tramo, medicion in modos.items():
+        print(f"📦 Tramo '{tramo}': {medicion}")
+    guardar_modos(modos, args.salida)
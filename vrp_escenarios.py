@@ -0,0 +1,182 @@
+"""Barrido de escenarios "qué pasaría si": capacidad de los camiones, jornada, holgura, flota o recogidas quitadas.
+
+Las matrices de distancias y tiempos se copian una sola vez a memoria compartida; cada proceso trabajador
+se engancha a ellas al arrancar, así que a cada escenario solo viaja su diccionario de parámetros. De cada
+escenario se recogen los indicadores del plan (camiones, km, horas y MCE sin servir) en una sola tabla."""
+
+import argparse
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import vrp_TFM
+from vrp_evaluacion import evaluar_ruta
+
+CLAVES_MATRICES = ("distance_matrix", "time_matrix")
+FICHERO_ESCENARIOS = "escenarios.csv"
+
+# `data` del día en cada proceso trabajador, con las matrices leídas de memoria compartida
+_DATOS_ESCENARIOS = None
+
+
+def expandir_rejilla(rejilla):
+    """Todas las combinaciones de una rejilla {parámetro: [valores]} como lista de escenarios.
+
+    Parámetros: 'capacidad', 'jornada_max', 'holgura_tiempo', 'num_vehicles' y 'quitar' (tupla de loc_id
+    que se eliminan del día, p. ej. una recogida)."""
+    claves = list(rejilla)
+    return [dict(zip(claves, valores)) for valores in itertools.product(*(rejilla[c] for c in claves))]
+
+
+# MEMORIA COMPARTIDA
+
+def compartir_matrices(data):
+    """Copia las matrices a bloques de memoria compartida. Devuelve (bloques, descriptor {clave: (nombre, forma)}).
+
+    Quien las comparte debe cerrar y liberar (`unlink`) los bloques al terminar."""
+    bloques, descriptor = [], {}
+    for clave in CLAVES_MATRICES:
+        matriz = np.asarray(data[clave], dtype=np.int64)
+        bloque = shared_memory.SharedMemory(create=True, size=max(matriz.nbytes, 1))
+        np.ndarray(matriz.shape, dtype=np.int64, buffer=bloque.buf)[:] = matriz
+        bloques.append(bloque)
+        descriptor[clave] = (bloque.name, matriz.shape)
+    return bloques, descriptor
+
+
+def enganchar_matrices(data_sin_matrices, descriptor):
+    """`data` completo a partir de las matrices compartidas por `compartir_matrices`."""
+    data = dict(data_sin_matrices)
+    for clave, (nombre, forma) in descriptor.items():
+        bloque = shared_memory.SharedMemory(name=nombre)
+        # Los callbacks del modelo indexan listas (mucho más rápido que un array de NumPy elemento a elemento)
+        data[clave] = np.ndarray(forma, dtype=np.int64, buffer=bloque.buf).tolist()
+        bloque.close()
+    return data
+
+
+def _iniciar_escenarios(data_sin_matrices, descriptor):
+    """Inicializador de cada proceso: se engancha a las matrices compartidas una única vez."""
+    global _DATOS_ESCENARIOS
+    _DATOS_ESCENARIOS = enganchar_matrices(data_sin_matrices, descriptor)
+
+
+# ESCENARIOS
+
+def aplicar_escenario(data, escenario):
+    """Copia de `data` con los cambios del escenario."""
+    num_vehicles = escenario.get("num_vehicles", data["num_vehicles"])
+    quitar = set(escenario.get("quitar") or ())
+    if quitar:
+        nodos = [i for i, v in enumerate(data["visits_list"]) if i != data["depot"] and v["loc_id"] not in quitar]
+        nuevo = vrp_TFM.crear_subproblema(data, nodos, num_vehicles)
+    else:
+        nuevo = vrp_TFM.con_flota(data, num_vehicles)
+    if "capacidad" in escenario:
+        nuevo["vehicle_capacities"] = [escenario["capacidad"]] * num_vehicles
+    for clave in ("jornada_max", "holgura_tiempo"):
+        if clave in escenario:
+            nuevo[clave] = escenario[clave]
+    return nuevo
+
+
+def indicadores(data, rutas):
+    """Camiones usados, km, horas en ruta, tiendas y MCE sin servir y recogidas sin servir de un plan."""
+    usadas = [(v, ruta) for v, ruta in enumerate(rutas) if ruta]
+    evaluaciones = [evaluar_ruta(data, ruta, v) for v, ruta in usadas]
+    sin_servir = vrp_TFM.tiendas_sin_servir(data, rutas)
+    mce_tienda = {}
+    for i in data["delivery_nodes"]:
+        loc_id = data["visits_list"][i]["loc_id"]
+        mce_tienda[loc_id] = max(mce_tienda.get(loc_id, 0), abs(data["demands"][i]))
+    servidos = {n for ruta in rutas for n in ruta}
+    return {
+        'vehiculos': len(usadas),
+        'km': sum(e['distancia'] for e in evaluaciones),
+        'horas': round(sum(e['duracion'] for e in evaluaciones) / 60, 2),
+        'tiendas_sin_servir': len(sin_servir),
+        'mce_sin_servir': sum(mce_tienda.get(loc_id, 0) for loc_id in sin_servir),
+        'recogidas_sin_servir': sum(1 for n in data["pickup_nodes"] if n not in servidos),
+    }
+
+
+def _resolver_escenario(escenario, segundos):
+    inicio = time.time()
+    data = aplicar_escenario(_DATOS_ESCENARIOS, escenario)
+    manager, routing = vrp_TFM.crear_modelo(data)
+    solution = vrp_TFM.resolver(data, manager, routing, vrp_TFM.crear_parametros_busqueda(segundos))
+    fila = dict(escenario)
+    if "quitar" in fila:
+        fila["quitar"] = ",".join(fila["quitar"] or ()) or "-"
+    if solution is None:
+        fila['objetivo'] = None
+    else:
+        fila['objetivo'] = solution.ObjectiveValue()
+        fila.update(indicadores(data, vrp_TFM.extraer_rutas(data, manager, routing, solution)))
+    fila['segundos'] = round(time.time() - inicio, 1)
+    return fila
+
+
+def barrer_escenarios(data, escenarios, segundos=30, procesos=None):
+    """Resuelve todos los escenarios en paralelo y devuelve un DataFrame con una fila de indicadores por escenario."""
+    data_sin_matrices = {clave: valor for clave, valor in data.items() if clave not in CLAVES_MATRICES}
+    bloques, descriptor = compartir_matrices(data)
+    try:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_escenarios,
+                                 initargs=(data_sin_matrices, descriptor)) as pool:
+            futuros = [pool.submit(_resolver_escenario, escenario, segundos) for escenario in escenarios]
+            filas = []
+            for k, futuro in enumerate(futuros, 1):
+                fila = futuro.result()
+                filas.append(fila)
+                print(f"🧪 Escenario {k}/{len(escenarios)}: {escenarios[k - 1]} -> "
+                      f"{fila.get('vehiculos', '-')} camiones, {fila.get('km', '-')} km, "
+                      f"{fila.get('mce_sin_servir', '-')} MCE sin servir ({fila['segundos']}s)")
+    finally:
+        for bloque in bloques:
+            bloque.close()
+            bloque.unlink()
+    return pd.DataFrame(filas)
+
+
+def main(rejilla, segundos=30, procesos=None, instancia=None, salida=FICHERO_ESCENARIOS):
+    print("\n" + "="*20)
+    print("CARGANDO (BARRIDO DE ESCENARIOS)...")
+    print("="*20)
+
+    data = vrp_TFM.cargar_instancia(instancia) if instancia else vrp_TFM.create_data_model()
+    escenarios = expandir_rejilla(rejilla)
+    print(f"🧪 {len(escenarios)} escenarios, {segundos}s cada uno")
+    inicio = time.time()
+    tabla = barrer_escenarios(data, escenarios, segundos, procesos)
+    tabla.to_csv(salida, index=False)
+    print("\n" + tabla.to_string(index=False))
+    print(f"\n✅ Indicadores de {len(tabla)} escenarios guardados en {salida} ({time.time() - inicio:.1f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Barrido de escenarios qué-pasaría-si sobre el día.")
+    parser.add_argument("--capacidad", type=int, nargs="+", help="Capacidades de camión (MCE), p. ej. 30 33 36.")
+    parser.add_argument("--jornada", type=int, nargs="+", help="Jornadas máximas en minutos, p. ej. 600 720.")
+    parser.add_argument("--holgura", type=int, nargs="+", help="Esperas máximas en minutos.")
+    parser.add_argument("--vehiculos", type=int, nargs="+", help="Tamaños de flota.")
+    parser.add_argument("--quitar", nargs="+",
+                        help="Grupos de loc_id a eliminar separados por comas ('-' para no quitar nada), p. ej. - A00020.")
+    parser.add_argument("--tiempo", type=int, default=30, help="Segundos de solver por escenario.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores.")
+    parser.add_argument("--instancia", default=None, help="Instancia guardada (por defecto, el día de Oracle).")
+    parser.add_argument("--salida", default=FICHERO_ESCENARIOS, help="CSV de resultados.")
+    args = parser.parse_args()
+
+    rejilla = {}
+    for clave, valores in (("capacidad", args.capacidad), ("jornada_max", args.jornada),
+                           ("holgura_tiempo", args.holgura), ("num_vehicles", args.vehiculos)):
+        if valores:
+            rejilla[clave] = valores
+    if args.quitar:
+        rejilla["quitar"] = [tuple(l for l in grupo.split(",") if l and l != "-") for grupo in args.quitar]
+    main(rejilla, args.tiempo, args.procesos, args.instancia, args.salida)
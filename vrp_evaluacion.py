@@ -0,0 +1,242 @@
+"""Evaluación independiente de rutas: carga, horarios, jornada y orden entregas/recogidas.
+
+`evaluar_ruta` evalúa una ruta suelta; `EvaluadorVectorizado` aplica las mismas reglas con NumPy a todas
+las rutas de muchas soluciones a la vez (para validar soluciones, puntuar candidatos o medir)."""
+
+import numpy as np
+
+
+def evaluar_ruta(data, ruta, vehicle_id=0):
+    """Evalúa una ruta (lista de nodos sin depósito) con las mismas reglas que el modelo de OR-Tools.
+
+    Devuelve un diccionario con 'factible', 'motivo', 'horas' (hora de servicio en cada nodo,
+    depósito de salida y de llegada incluidos), 'cargas', 'distancia', 'duracion' y 'espera'."""
+    depot = data["depot"]
+    nodos = [depot] + list(ruta) + [depot]
+    capacidad = data["vehicle_capacities"][vehicle_id]
+    holgura = data["holgura_tiempo"]
+    horizonte = data["horizonte"]
+    resultado = {'factible': False, 'motivo': None, 'horas': None, 'cargas': None,
+                 'distancia': 0, 'duracion': 0, 'espera': 0}
+
+    # 1. Capacidad: el camión sale lleno y las entregas restan carga
+    cargas = [capacidad]
+    for nodo in nodos[:-1]:
+        cargas.append(cargas[-1] + data["demands"][nodo])
+    resultado['cargas'] = cargas
+    if min(cargas) < 0 or max(cargas) > capacidad:
+        resultado['motivo'] = "CARGA"
+        return resultado
+
+    # 2. Orden: ninguna entrega después de una recogida
+    pickup_set = set(data["pickup_nodes"])
+    delivery_set = set(data["delivery_nodes"])
+    recogida_vista = False
+    for nodo in ruta:
+        if nodo in pickup_set:
+            recogida_vista = True
+        elif recogida_vista and nodo in delivery_set:
+            resultado['motivo'] = "ORDEN"
+            return resultado
+
+    # 3. Horarios: intervalos de hora factible hacia delante (espera máxima = holgura)
+    transitos = [data["time_matrix"][i][j] + data["service_times"][i] for i, j in zip(nodos[:-1], nodos[1:])]
+    ventanas = [(0, horizonte)] + [data["time_windows"][n] for n in ruta] + [(0, horizonte)]
+    bajos, altos = [ventanas[0][0]], [ventanas[0][1]]
+    for k, transito in enumerate(transitos):
+        inicio, fin = ventanas[k + 1]
+        bajo = max(inicio, bajos[-1] + transito)
+        alto = min(fin, altos[-1] + transito + holgura)
+        if bajo > alto:
+            resultado['motivo'] = "VENTANA"
+            return resultado
+        bajos.append(bajo)
+        altos.append(alto)
+
+    # Salida más tardía posible que mantiene la ruta factible (minimiza la duración)
+    salida = altos[-1]
+    for k in range(len(transitos) - 1, -1, -1):
+        salida = min(altos[k], salida - transitos[k])
+
+    # Horario más temprano desde esa salida y reajuste hacia atrás para que sea consistente
+    horas = [salida]
+    for k, transito in enumerate(transitos):
+        horas.append(max(ventanas[k + 1][0], horas[-1] + transito))
+    for k in range(len(transitos) - 1, -1, -1):
+        horas[k] = max(horas[k], horas[k + 1] - transitos[k] - holgura)
+
+    duracion = horas[-1] - horas[0]
+    resultado.update({
+        'horas': horas,
+        'duracion': duracion,
+        'espera': duracion - sum(transitos),
+        'distancia': sum(data["distance_matrix"][i][j] for i, j in zip(nodos[:-1], nodos[1:])),
+    })
+    if duracion > data["jornada_max"]:
+        resultado['motivo'] = "JORNADA"
+        return resultado
+
+    resultado['factible'] = True
+    return resultado
+
+
+# Motivos de infactibilidad, en el orden en que los comprueba `evaluar_ruta`
+MOTIVOS = ("CARGA", "ORDEN", "VENTANA", "JORNADA")
+
+
+class EvaluadorVectorizado:
+    """Evalúa lotes de rutas con NumPy con las mismas reglas que `evaluar_ruta`.
+
+    Las matrices y vectores del `data` se convierten una sola vez al crear el evaluador. Cada lote se
+    rellena hasta la ruta más larga con el depósito (tramos de tiempo y distancia cero), y el horario se
+    calcula columna a columna para todas las rutas a la vez. Para las rutas factibles los resultados
+    coinciden con `evaluar_ruta`; las infactibles se siguen propagando para poder contar todas sus
+    violaciones."""
+
+    def __init__(self, data):
+        self.depot = data["depot"]
+        self.distancias = np.asarray(data["distance_matrix"], dtype=np.int64)
+        self.tiempos = np.asarray(data["time_matrix"], dtype=np.int64)
+        self.servicio = np.asarray(data["service_times"], dtype=np.int64)
+        self.demandas = np.asarray(data["demands"], dtype=np.int64)
+        self.capacidades = np.asarray(data["vehicle_capacities"], dtype=np.int64)
+        self.holgura, self.horizonte, self.jornada_max = data["holgura_tiempo"], data["horizonte"], data["jornada_max"]
+        n = len(self.demandas)
+        ventanas = np.asarray(data["time_windows"], dtype=np.int64).reshape(n, 2)
+        self.inicio_ventana, self.fin_ventana = ventanas[:, 0].copy(), ventanas[:, 1].copy()
+        # El depósito (también como relleno) admite todo el horizonte
+        self.inicio_ventana[self.depot], self.fin_ventana[self.depot] = 0, self.horizonte
+        self.es_recogida = np.zeros(n, dtype=bool)
+        self.es_recogida[data["pickup_nodes"]] = True
+        self.es_entrega = np.zeros(n, dtype=bool)
+        self.es_entrega[data["delivery_nodes"]] = True
+
+    def caminos(self, rutas):
+        """Matriz (rutas x paradas + 2) con el depósito al principio, al final y como relleno."""
+        largo = max((len(ruta) for ruta in rutas), default=0)
+        caminos = np.full((len(rutas), largo + 2), self.depot, dtype=np.int64)
+        for k, ruta in enumerate(rutas):
+            caminos[k, 1:len(ruta) + 1] = ruta
+        return caminos
+
+    def evaluar(self, rutas, vehiculos=None):
+        """Evalúa rutas (listas o arrays de nodos sin depósito). `vehiculos` es el vehículo de cada ruta
+        (por defecto, la posición en la lista) y solo se usa para la capacidad.
+
+        Devuelve un diccionario de arrays, uno por ruta ('factible', 'distancia', 'duracion', 'espera',
+        'carga_minima' y un booleano por motivo de MOTIVOS) más 'horas' y 'cargas' por parada
+        (rutas x paradas + 2, depósitos incluidos)."""
+        caminos = self.caminos(rutas)
+        origen, destino = caminos[:, :-1], caminos[:, 1:]
+        if vehiculos is None:
+            vehiculos = np.arange(len(rutas)) % len(self.capacidades)
+        capacidad = self.capacidades[np.asarray(vehiculos, dtype=np.int64)]
+
+        # 1. Capacidad: el camión sale lleno y las entregas restan carga
+        cargas = capacidad[:, None] + np.cumsum(self.demandas[caminos], axis=1)
+        cargas = np.concatenate([capacidad[:, None], cargas[:, :-1]], axis=1)
+        carga_minima = cargas.min(axis=1)
+        viola_carga = (carga_minima < 0) | (cargas.max(axis=1) > capacidad)
+
+        # 2. Orden: ninguna entrega después de una recogida
+        recogida_previa = np.maximum.accumulate(self.es_recogida[caminos], axis=1)
+        viola_orden = (recogida_previa[:, :-1] & self.es_entrega[destino]).any(axis=1)
+
+        # 3. Horarios: intervalos de hora factible hacia delante (espera máxima = holgura)
+        transitos = self.tiempos[origen, destino] + self.servicio[origen]
+        inicio, fin = self.inicio_ventana[caminos], self.fin_ventana[caminos]
+        paradas = caminos.shape[1]
+        bajos, altos = np.empty_like(inicio), np.empty_like(inicio)
+        bajos[:, 0], altos[:, 0] = inicio[:, 0], fin[:, 0]
+        viola_ventana = np.zeros(len(rutas), dtype=bool)
+        for k in range(1, paradas):
+            bajos[:, k] = np.maximum(inicio[:, k], bajos[:, k - 1] + transitos[:, k - 1])
+            altos[:, k] = np.minimum(fin[:, k], altos[:, k - 1] + transitos[:, k - 1] + self.holgura)
+            viola_ventana |= bajos[:, k] > altos[:, k]
+            # Se sigue con el intervalo vacío convertido en un punto para contar el resto de la ruta
+            altos[:, k] = np.maximum(altos[:, k], bajos[:, k])
+
+        # Salida más tardía posible que mantiene la ruta factible (minimiza la duración)
+        salida = altos[:, -1]
+        for k in range(paradas - 2, -1, -1):
+            salida = np.minimum(altos[:, k], salida - transitos[:, k])
+
+        # Horario más temprano desde esa salida y reajuste hacia atrás para que sea consistente
+        horas = np.empty_like(inicio)
+        horas[:, 0] = salida
+        for k in range(1, paradas):
+            horas[:, k] = np.maximum(inicio[:, k], horas[:, k - 1] + transitos[:, k - 1])
+        for k in range(paradas - 2, -1, -1):
+            horas[:, k] = np.maximum(horas[:, k], horas[:, k + 1] - transitos[:, k] - self.holgura)
+
+        duracion = horas[:, -1] - horas[:, 0]
+        viola_jornada = duracion > self.jornada_max
+        return {
+            'factible': ~(viola_carga | viola_orden | viola_ventana | viola_jornada),
+            'CARGA': viola_carga, 'ORDEN': viola_orden, 'VENTANA': viola_ventana, 'JORNADA': viola_jornada,
+            'distancia': self.distancias[origen, destino].sum(axis=1),
+            'duracion': duracion,
+            'espera': duracion - transitos.sum(axis=1),
+            'carga_minima': carga_minima,
+            'horas': horas,
+            'cargas': cargas,
+        }
+
+    def puntuar(self, soluciones):
+        """Evalúa muchas soluciones (cada una, una lista de rutas por vehículo) en un solo lote.
+
+        Devuelve un diccionario de arrays, uno por solución: 'distancia', 'duracion', 'vehiculos',
+        'rutas_infactibles' y el número de rutas que violan cada motivo de MOTIVOS."""
+        rutas, vehiculos, solucion = [], [], []
+        for s, rutas_solucion in enumerate(soluciones):
+            for v, ruta in enumerate(rutas_solucion):
+                if len(ruta):
+                    rutas.append(ruta)
+                    vehiculos.append(v)
+                    solucion.append(s)
+        n = len(soluciones)
+        if not rutas:
+            return {clave: np.zeros(n, dtype=np.int64)
+                    for clave in ('distancia', 'duracion', 'vehiculos', 'rutas_infactibles') + MOTIVOS}
+        evaluacion = self.evaluar(rutas, vehiculos)
+        solucion = np.asarray(solucion)
+        resultado = {
+            'distancia': np.bincount(solucion, evaluacion['distancia'], n).astype(np.int64),
+            'duracion': np.bincount(solucion, evaluacion['duracion'], n).astype(np.int64),
+            'vehiculos': np.bincount(solucion, minlength=n),
+            'rutas_infactibles': np.bincount(solucion, ~evaluacion['factible'], n).astype(np.int64),
+        }
+        for motivo in MOTIVOS:
+            resultado[motivo] = np.bincount(solucion, evaluacion[motivo], n).astype(np.int64)
+        return resultado
+
+
+def validar_solucion(data, rutas, evaluador=None):
+    """Comprobación independiente de una solución completa (sin usar los cumuls del solver).
+
+    Devuelve la lista de problemas encontrados (vacía si la solución es válida): rutas que violan
+    capacidad, ventanas, jornada u orden entregas/recogidas, nodos visitados más de una vez, tiendas
+    servidas en más de una ventana y rutas que pasan por el depósito."""
+    evaluador = evaluador or EvaluadorVectorizado(data)
+    problemas = []
+    usadas = [(v, ruta) for v, ruta in enumerate(rutas) if len(ruta)]
+    if usadas:
+        evaluacion = evaluador.evaluar([ruta for _, ruta in usadas], [v for v, _ in usadas])
+        for k, (v, _) in enumerate(usadas):
+            for motivo in MOTIVOS:
+                if evaluacion[motivo][k]:
+                    problemas.append(f"Vehículo {v}: {motivo}")
+
+    visitas = np.concatenate([np.asarray(ruta, dtype=np.int64) for _, ruta in usadas]) if usadas else np.zeros(0, np.int64)
+    nodos, veces = np.unique(visitas, return_counts=True)
+    for nodo in nodos[veces > 1]:
+        problemas.append(f"Nodo {nodo} ({data['visits_list'][nodo]['loc_id']}) visitado más de una vez")
+    if data["depot"] in nodos:
+        problemas.append("Alguna ruta pasa por el depósito")
+    tiendas = [data["visits_list"][n]["loc_id"] for n in nodos if data["visits_list"][n]["type"] == "client"]
+    vistas, repetidas = set(), set()
+    for tienda in tiendas:
+        (repetidas if tienda in vistas else vistas).add(tienda)
+    for tienda in sorted(repetidas):
+        problemas.append(f"Tienda {tienda} servida en más de una ventana")
+    return problemas
@@ -0,0 +1,305 @@
+"""Inserción incremental de pedidos tardíos en un plan ya calculado, sin relanzar el solver completo.
+
+Para cada ruta se precalculan, en cada parada, el intervalo de horas de servicio alcanzable desde el
+depósito (hacia delante) y el intervalo desde el que todavía se puede terminar la ruta (hacia atrás),
+con las mismas reglas que `evaluar_ruta` (ventanas y espera máxima `holgura_tiempo`). Con ellos la
+factibilidad horaria de insertar una visita entre dos paradas se comprueba en O(1) y todas las posiciones
+de todas las rutas se evalúan a la vez con NumPy. Si el pedido no cabe en ninguna posición, se reoptimiza
+solo un grupo pequeño de rutas cercanas con un límite de tiempo corto."""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import vrp_TFM
+import vrp_arranque
+from vrp_descomposicion import _resolver_subproblema
+from vrp_evaluacion import evaluar_ruta
+
+
+class PlanIncremental:
+    """Plan de rutas sobre el que se insertan, modifican o quitan visitas.
+
+    `rutas` son listas de nodos por vehículo (formato de `extraer_rutas`). El plan trabaja sobre una copia
+    de `data`, que se amplía si llegan tiendas que no estaban en las matrices del día."""
+
+    def __init__(self, data, rutas):
+        self.data = dict(data)
+        self.rutas = [list(r) for r in rutas] + [[] for _ in range(data["num_vehicles"] - len(rutas))]
+        self._preparar()
+
+    @classmethod
+    def desde_solucion(cls, data, manager, routing, solution):
+        return cls(data, vrp_TFM.extraer_rutas(data, manager, routing, solution))
+
+    # PRECÁLCULO DE HOLGURAS
+
+    def _preparar(self, matrices=True):
+        """Recalcula las holguras de todas las rutas (y las matrices NumPy si han cambiado)."""
+        if matrices:
+            self._distancias = np.asarray(self.data["distance_matrix"], dtype=float)
+            self._tiempos = np.asarray(self.data["time_matrix"], dtype=float)
+        self._servicio = np.asarray(self.data["service_times"], dtype=float)
+        ventanas = np.asarray(self.data["time_windows"], dtype=float)
+        ventanas[self.data["depot"]] = (0, self.data["horizonte"])
+        self._ventanas = ventanas
+        self._recogidas = set(self.data["pickup_nodes"])
+        self._por_ruta = [self._holguras_ruta(v) for v in range(len(self.rutas))]
+        self._posiciones = None
+
+    def _holguras_ruta(self, vehicle_id):
+        """Arrays de una ruta por posición de inserción k (entre camino[k] y camino[k+1])."""
+        depot, holgura = self.data["depot"], self.data["holgura_tiempo"]
+        camino = np.array([depot] + self.rutas[vehicle_id] + [depot])
+        transito = self._tiempos[camino[:-1], camino[1:]] + self._servicio[camino[:-1]]
+        inicio, fin = self._ventanas[camino, 0], self._ventanas[camino, 1]
+
+        # Hacia delante: horas alcanzables en cada parada desde el depósito
+        bajo, alto = np.empty(len(camino)), np.empty(len(camino))
+        bajo[0], alto[0] = 0, self.data["horizonte"]
+        for k in range(1, len(camino)):
+            bajo[k] = max(inicio[k], bajo[k - 1] + transito[k - 1])
+            alto[k] = min(fin[k], alto[k - 1] + transito[k - 1] + holgura)
+
+        # Hacia atrás: horas en cada parada desde las que se puede completar el resto de la ruta
+        bajo_atras, alto_atras = np.empty(len(camino)), np.empty(len(camino))
+        bajo_atras[-1], alto_atras[-1] = 0, self.data["horizonte"]
+        for k in range(len(camino) - 2, -1, -1):
+            bajo_atras[k] = max(inicio[k], bajo_atras[k + 1] - transito[k] - holgura)
+            alto_atras[k] = min(fin[k], alto_atras[k + 1] - transito[k])
+
+        es_recogida = np.array([n in self._recogidas for n in camino])
+        recogidas = np.flatnonzero(es_recogida)
+        entregas = np.flatnonzero(~es_recogida[1:-1]) + 1
+        return {
+            'camino': camino,
+            'bajo': bajo[:-1], 'alto': alto[:-1],
+            'bajo_atras': bajo_atras[1:], 'alto_atras': alto_atras[1:],
+            'carga': sum(abs(self.data["demands"][n]) for n in camino),
+            # Las entregas deben ir antes de la primera recogida y las recogidas después de la última entrega
+            'max_entrega': (recogidas[0] - 1) if len(recogidas) else len(camino) - 2,
+            'min_recogida': entregas[-1] if len(entregas) else 0,
+        }
+
+    def _todas_las_posiciones(self):
+        """Concatena las posiciones de inserción de todas las rutas (las vacías cuentan una sola vez)."""
+        if self._posiciones is None:
+            vehiculo, k, previo, siguiente = [], [], [], []
+            campos = {c: [] for c in ('bajo', 'alto', 'bajo_atras', 'alto_atras', 'max_entrega', 'min_recogida', 'carga')}
+            vacia_vista = False
+            for v, h in enumerate(self._por_ruta):
+                if len(h['camino']) == 2:
+                    if vacia_vista:
+                        continue
+                    vacia_vista = True
+                m = len(h['camino']) - 1
+                vehiculo += [v] * m
+                k += list(range(m))
+                previo += h['camino'][:-1].tolist()
+                siguiente += h['camino'][1:].tolist()
+                for c in ('bajo', 'alto', 'bajo_atras', 'alto_atras'):
+                    campos[c].append(h[c])
+                for c in ('max_entrega', 'min_recogida', 'carga'):
+                    campos[c].append(np.full(m, h[c]))
+            self._posiciones = {'vehiculo': np.array(vehiculo), 'k': np.array(k),
+                                'previo': np.array(previo), 'siguiente': np.array(siguiente),
+                                **{c: np.concatenate(valores) for c, valores in campos.items()}}
+        return self._posiciones
+
+    def _actualizar_ruta(self, vehicle_id):
+        self._por_ruta[vehicle_id] = self._holguras_ruta(vehicle_id)
+        self._posiciones = None
+
+    # INSERCIÓN
+
+    def candidatos(self, nodo):
+        """Posiciones factibles para `nodo`, ordenadas por aumento de distancia: [(vehículo, k, delta), ...].
+
+        La jornada máxima no se puede comprobar en O(1), así que se verifica con `evaluar_ruta` al insertar."""
+        p = self._todas_las_posiciones()
+        holgura = self.data["holgura_tiempo"]
+        capacidad = np.asarray(self.data["vehicle_capacities"], dtype=float)[p['vehiculo']]
+        inicio, fin = self._ventanas[nodo]
+
+        ida = self._tiempos[p['previo'], nodo] + self._servicio[p['previo']]
+        bajo = np.maximum(inicio, p['bajo'] + ida)
+        alto = np.minimum(fin, p['alto'] + ida + holgura)
+        vuelta = self._tiempos[nodo, p['siguiente']] + self._servicio[nodo]
+        bajo_sig = np.maximum(np.maximum(self._ventanas[p['siguiente'], 0], bajo + vuelta), p['bajo_atras'])
+        alto_sig = np.minimum(np.minimum(self._ventanas[p['siguiente'], 1], alto + vuelta + holgura), p['alto_atras'])
+
+        factible = (bajo <= alto) & (bajo_sig <= alto_sig)
+        factible &= p['carga'] + abs(self.data["demands"][nodo]) <= capacidad
+        if nodo in self._recogidas:
+            factible &= p['k'] >= p['min_recogida']
+        else:
+            factible &= p['k'] <= p['max_entrega']
+
+        delta = (self._distancias[p['previo'], nodo] + self._distancias[nodo, p['siguiente']]
+                 - self._distancias[p['previo'], p['siguiente']])
+        indices = np.flatnonzero(factible)
+        indices = indices[np.argsort(delta[indices], kind="stable")]
+        return [(int(p['vehiculo'][i]), int(p['k'][i]), float(delta[i])) for i in indices]
+
+    def insertar(self, nodos):
+        """Inserción más barata factible de una visita; `nodos` son las ventanas alternativas de la tienda.
+
+        Devuelve (vehículo, nodo insertado, delta de distancia) o None si no cabe en ninguna ruta."""
+        opciones = sorted(((delta, v, k, nodo) for nodo in nodos for v, k, delta in self.candidatos(nodo)))
+        for delta, v, k, nodo in opciones:
+            candidata = self.rutas[v][:k] + [nodo] + self.rutas[v][k:]
+            if evaluar_ruta(self.data, candidata, v)['factible']:
+                self.rutas[v] = candidata
+                self._actualizar_ruta(v)
+                return v, nodo, delta
+        return None
+
+    def quitar(self, loc_id):
+        """Quita de su ruta la tienda `loc_id` (si está servida). Devuelve el vehículo o None."""
+        for v, ruta in enumerate(self.rutas):
+            nueva = [n for n in ruta if self.data["visits_list"][n]["loc_id"] != loc_id]
+            if len(nueva) != len(ruta):
+                self.rutas[v] = nueva
+                self._actualizar_ruta(v)
+                return v
+        return None
+
+    # PEDIDOS NUEVOS O MODIFICADOS
+
+    def _nodos_de(self, loc_id):
+        return [i for i, v in enumerate(self.data["visits_list"]) if v["loc_id"] == loc_id and i != self.data["depot"]]
+
+    def _anadir_tienda(self, pedido):
+        """Amplía `data` con una tienda que no estaba en las matrices del día.
+
+        El pedido debe traer 'distancias' y 'tiempos' como (lista desde la tienda a cada nodo, lista desde
+        cada nodo a la tienda), en el orden de `visits_list`."""
+        data = self.data
+        nuevo = len(data["visits_list"])
+        (dist_ida, dist_vuelta), (tiempo_ida, tiempo_vuelta) = pedido['distancias'], pedido['tiempos']
+        data["distance_matrix"] = [fila + [d] for fila, d in zip(data["distance_matrix"], dist_vuelta)] + [list(dist_ida) + [0]]
+        data["time_matrix"] = [fila + [t] for fila, t in zip(data["time_matrix"], tiempo_vuelta)] + [list(tiempo_ida) + [0]]
+        visita = {'loc_id': pedido['loc_id'], 'start': pedido.get('start', 0), 'end': pedido.get('end', 1440),
+                  'type': 'client', 'proceso': pedido.get('proceso', 'TARDIO'), 'mce': pedido['mce'],
+                  'service_time': pedido.get('service_time', 0)}
+        data["visits_list"] = data["visits_list"] + [visita]
+        data["time_windows"] = data["time_windows"] + [(visita['start'], visita['end'])]
+        data["demands"] = data["demands"] + [-int(visita['mce'])]
+        data["service_times"] = data["service_times"] + [visita['service_time']]
+        data["delivery_nodes"] = data["delivery_nodes"] + [nuevo]
+        data["idx_to_node"] = {**data["idx_to_node"], nuevo: visita['loc_id']}
+        data["node_to_idx"] = {**data["node_to_idx"], visita['loc_id']: nuevo}
+        data["node_coords"] = {**data["node_coords"], nuevo: pedido.get('coords', data["node_coords"][data["depot"]])}
+        self._preparar()
+        return [nuevo]
+
+    def _actualizar_tienda(self, nodos, pedido):
+        """Aplica el nuevo MCE (y tiempo de descarga, si viene) a todas las ventanas de una tienda existente."""
+        data = self.data
+        data["demands"], data["service_times"] = list(data["demands"]), list(data["service_times"])
+        data["visits_list"] = list(data["visits_list"])
+        for n in nodos:
+            data["demands"][n] = -int(pedido['mce'])
+            data["service_times"][n] = pedido.get('service_time', data["service_times"][n])
+            data["visits_list"][n] = {**data["visits_list"][n], 'mce': pedido['mce'],
+                                      'service_time': data["service_times"][n]}
+        self._preparar(matrices=False)
+
+    def _reoptimizar_cerca(self, nodos, rutas_cercanas, segundos, reparar=None):
+        """Reoptimiza con OR-Tools las `rutas_cercanas` rutas más próximas a la tienda, más un camión libre.
+
+        `reparar` es un vehículo cuya ruta ha quedado infactible y entra siempre en el grupo; en ese caso
+        el resultado se acepta aunque el coste no baje."""
+        usadas = [v for v, ruta in enumerate(self.rutas) if ruta and v != reparar]
+        cercania = {v: self._distancias[np.ix_(self.rutas[v], nodos)].min() for v in usadas}
+        elegidas = ([reparar] if reparar is not None else []) + sorted(usadas, key=cercania.get)[:rutas_cercanas]
+        elegidas += [v for v, ruta in enumerate(self.rutas) if not ruta and v != reparar][:1]
+        if not elegidas:
+            return None
+
+        antes = vrp_TFM.coste_rutas(self.data, self.rutas)
+        sub = vrp_TFM.crear_subproblema(self.data, [n for v in elegidas for n in self.rutas[v]] + nodos, len(elegidas))
+        iniciales = vrp_TFM.rutas_a_locales(sub, [self.rutas[v] for v in elegidas])
+        nuevas = _resolver_subproblema(sub, segundos, iniciales)
+
+        candidata = [list(r) for r in self.rutas]
+        for v in elegidas:
+            candidata[v] = []
+        for v, ruta in zip(elegidas, nuevas):
+            candidata[v] = ruta
+        if reparar is None and vrp_TFM.coste_rutas(self.data, candidata) >= antes:
+            return None
+        self.rutas = candidata
+        for v in elegidas:
+            self._actualizar_ruta(v)
+        return next((v for v in elegidas if set(nodos) & set(self.rutas[v])), None)
+
+    def aplicar_pedidos(self, pedidos, rutas_cercanas=3, segundos_reoptimizacion=1):
+        """Incorpora pedidos nuevos o modificados: dicts con 'loc_id' y 'mce' (y opcionalmente 'start', 'end',
+        'service_time', 'coords' y, para tiendas que no están en las matrices del día, 'distancias' y 'tiempos').
+
+        Una tienda ya planificada que sigue cabiendo en su ruta se queda donde está; si no, se saca y se
+        reinserta. Devuelve una lista de dicts con loc_id, resultado, vehículo y segundos."""
+        resultados = []
+        for pedido in pedidos:
+            inicio = time.time()
+            loc_id = pedido['loc_id']
+            nodos = self._nodos_de(loc_id)
+            if nodos:
+                self._actualizar_tienda(nodos, pedido)
+            else:
+                nodos = self._anadir_tienda(pedido)
+
+            # ¿Sigue siendo factible su ruta actual?
+            vehiculo = next((v for v, ruta in enumerate(self.rutas) if set(ruta) & set(nodos)), None)
+            if vehiculo is not None and evaluar_ruta(self.data, self.rutas[vehiculo], vehiculo)['factible']:
+                resultado = "sin cambios"
+            else:
+                origen = self.quitar(loc_id) if vehiculo is not None else None
+                # Quitar una parada puede dejar en su ruta una espera mayor que la holgura
+                if origen is not None and not evaluar_ruta(self.data, self.rutas[origen], origen)['factible']:
+                    insercion, reparar = None, origen
+                else:
+                    insercion, reparar = self.insertar(nodos), None
+                if insercion is not None:
+                    vehiculo, resultado = insercion[0], "insertado"
+                else:
+                    vehiculo = self._reoptimizar_cerca(nodos, rutas_cercanas, segundos_reoptimizacion, reparar)
+                    resultado = "reoptimizado" if vehiculo is not None else "sin servir"
+            resultados.append({'loc_id': loc_id, 'resultado': resultado, 'vehiculo': vehiculo,
+                               'segundos': round(time.time() - inicio, 3)})
+            print(f"📦 {loc_id} ({pedido['mce']} MCE): {resultado}"
+                  + (f" en vehículo {vehiculo}" if vehiculo is not None else "")
+                  + f" ({resultados[-1]['segundos']}s)")
+        return resultados
+
+
+def main(fichero_pedidos, dia=vrp_TFM.DIA_PLANIFICACION):
+    """Aplica los pedidos de un JSON al plan guardado del día y rehace los informes."""
+    fecha = vrp_arranque._fecha(dia)
+    data = vrp_TFM.cargar_instancia(os.path.join(vrp_TFM.CARPETA_INSTANCIAS, f"instancia_{fecha}.pkl"))
+    rutas = vrp_arranque.cargar_rutas_dia(data)
+    with open(fichero_pedidos, encoding="utf-8") as f:
+        pedidos = json.load(f)
+
+    plan = PlanIncremental(data, rutas)
+    plan.aplicar_pedidos(pedidos)
+
+    manager, routing = vrp_TFM.crear_modelo(plan.data)
+    solution = vrp_TFM.solucion_desde_rutas(manager, routing, plan.rutas, vrp_TFM.crear_parametros_busqueda())
+    if solution:
+        vrp_arranque.guardar_rutas_dia(plan.data, plan.rutas)
+        vrp_TFM.reportar_solucion(plan.data, manager, routing, solution)
+    else:
+        print("\n El plan actualizado no es válido para el modelo.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inserción de pedidos tardíos en el plan guardado del día.")
+    parser.add_argument("pedidos", help="JSON con una lista de pedidos ({'loc_id': ..., 'mce': ...}).")
+    parser.add_argument("--dia", default=vrp_TFM.DIA_PLANIFICACION, help="Día del plan (DD/MM/YYYY).")
+    args = parser.parse_args()
+    main(args.pedidos, args.dia)
@@ -0,0 +1,110 @@
+"""Modelo de islas: varias búsquedas en paralelo que intercambian la mejor solución tras cada época."""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ortools.constraint_solver import routing_enums_pb2
+
+import vrp_TFM
+
+# Cada isla usa una metaheurística distinta para diversificar la búsqueda
+METAHEURISTICAS_ISLAS = [
+    routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+    routing_enums_pb2.LocalSearchMetaheuristic.SIMULATED_ANNEALING,
+    routing_enums_pb2.LocalSearchMetaheuristic.TABU_SEARCH,
+    routing_enums_pb2.LocalSearchMetaheuristic.GENERIC_TABU_SEARCH,
+]
+
+# Estrategias de primera solución para la primera época (antes de haber un mejor global)
+ESTRATEGIAS_ISLAS = [
+    routing_enums_pb2.FirstSolutionStrategy.PATH_MOST_CONSTRAINED_ARC,
+    routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
+    routing_enums_pb2.FirstSolutionStrategy.LOCAL_CHEAPEST_INSERTION,
+    routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC,
+]
+
+# Modelo construido una sola vez por proceso trabajador: (data, manager, routing)
+_MODELO_ISLA = None
+
+
+def _iniciar_isla(data):
+    """Inicializador de cada proceso: construye el modelo de rutas una única vez."""
+    global _MODELO_ISLA
+    manager, routing = vrp_TFM.crear_modelo(data)
+    _MODELO_ISLA = (data, manager, routing)
+
+
+def _ejecutar_epoca(isla, rutas_iniciales, segundos):
+    """Ejecuta una época de búsqueda de una isla. Devuelve (isla, objetivo, rutas)."""
+    data, manager, routing = _MODELO_ISLA
+    search_parameters = vrp_TFM.crear_parametros_busqueda(
+        tiempo_limite=segundos,
+        primera_solucion=ESTRATEGIAS_ISLAS[isla % len(ESTRATEGIAS_ISLAS)],
+        metaheuristica=METAHEURISTICAS_ISLAS[isla % len(METAHEURISTICAS_ISLAS)],
+    )
+    solution = vrp_TFM.resolver(data, manager, routing, search_parameters, rutas_iniciales)
+    if solution is None:
+        return isla, None, None
+    return isla, solution.ObjectiveValue(), vrp_TFM.extraer_rutas(data, manager, routing, solution)
+
+
+def resolver_islas(data, num_islas=4, duracion_epoca=15, num_epocas=5, procesos=None):
+    """Búsqueda cooperativa por islas.
+
+    En cada época las islas buscan en paralelo durante `duracion_epoca` segundos; al terminar,
+    la mejor solución global se difunde y todas reinician desde ella en la época siguiente.
+    Devuelve (objetivo, rutas) de la mejor solución encontrada, o (None, None)."""
+    mejor_objetivo, mejores_rutas = None, None
+
+    with ProcessPoolExecutor(max_workers=procesos or num_islas, initializer=_iniciar_isla, initargs=(data,)) as pool:
+        for epoca in range(num_epocas):
+            inicio_epoca = time.time()
+            futuros = [pool.submit(_ejecutar_epoca, isla, mejores_rutas, duracion_epoca) for isla in range(num_islas)]
+
+            isla_ganadora = None
+            for futuro in futuros:
+                isla, objetivo, rutas = futuro.result()
+                if objetivo is not None and (mejor_objetivo is None or objetivo < mejor_objetivo):
+                    mejor_objetivo, mejores_rutas, isla_ganadora = objetivo, rutas, isla
+
+            origen = f"isla {isla_ganadora}" if isla_ganadora is not None else "sin mejora"
+            print(f"🏝️ Época {epoca + 1}/{num_epocas}: mejor objetivo {mejor_objetivo} ({origen}) "
+                  f"en {time.time() - inicio_epoca:.1f}s")
+
+    return mejor_objetivo, mejores_rutas
+
+
+def main(num_islas=4, duracion_epoca=15, num_epocas=5, procesos=None):
+    print("\n" + "="*20)
+    print("CARGANDO (MODELO DE ISLAS)...")
+    print("="*20)
+
+    start_time_total = time.time()
+    data = vrp_TFM.create_data_model()
+
+    objetivo, rutas = resolver_islas(data, num_islas, duracion_epoca, num_epocas, procesos)
+
+    # Reconstruimos la solución en el modelo completo para reutilizar los informes
+    solution = None
+    if rutas:
+        manager, routing = vrp_TFM.crear_modelo(data)
+        solution = vrp_TFM.solucion_desde_rutas(manager, routing, rutas, vrp_TFM.crear_parametros_busqueda())
+    end_time_total = time.time()
+
+    if solution:
+        print("SOLUCIÓN ENCONTRADA")
+        print(f" Tiempo Total Proceso: {end_time_total - start_time_total:.2f}s")
+        vrp_TFM.reportar_solucion(data, manager, routing, solution)
+    else:
+        print("\n No se encontró una solución viable en el tiempo establecido.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VRP TFM con búsqueda cooperativa por islas.")
+    parser.add_argument("--islas", type=int, default=4, help="Número de islas (búsquedas en paralelo).")
+    parser.add_argument("--epoca", type=int, default=15, help="Duración de cada época en segundos.")
+    parser.add_argument("--epocas", type=int, default=5, help="Número de épocas.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores (por defecto, uno por isla).")
+    args = parser.parse_args()
+    main(args.islas, args.epoca, args.epocas, args.procesos)
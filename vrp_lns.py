@@ -0,0 +1,200 @@
+"""Búsqueda de gran vecindario adaptativa (destruir y reconstruir) alrededor del modelo de rutas.
+
+En cada iteración se destruyen varios grupos disjuntos de rutas relacionadas (por cercanía, por horario
+o al azar) y cada grupo, junto con las visitas sin servir cercanas, se reoptimiza en paralelo como un
+modelo pequeño de OR-Tools con el resto de rutas fijas. Las mejoras se incorporan a la solución actual."""
+
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import vrp_TFM
+import vrp_arranque
+from vrp_descomposicion import MOTORES_SUBPROBLEMA
+
+# Puntos que recibe un operador de destrucción según el resultado de su subproblema
+PUNTOS_MEJORA_GRANDE = 5   # Mejora de más del 1 % del coste total
+PUNTOS_MEJORA = 2
+PUNTOS_SIN_MEJORA = 0.1
+REACCION = 0.2  # Peso de lo observado frente al histórico al actualizar los pesos
+
+
+# OPERADORES DE DESTRUCCIÓN: eligen las rutas a reoptimizar a partir de una visita semilla
+
+def _centro(data, nodos):
+    coords = np.array([data["node_coords"][n] for n in nodos], dtype=float)
+    return coords.mean(axis=0)
+
+
+def destruir_geografico(data, rutas, candidatas, semilla, tamano, rng):
+    """Rutas cuyo centro está más cerca de la visita semilla."""
+    origen = np.asarray(data["node_coords"][semilla], dtype=float)
+    return sorted(candidatas, key=lambda r: np.linalg.norm(_centro(data, rutas[r]) - origen))[:tamano]
+
+
+def destruir_horario(data, rutas, candidatas, semilla, tamano, rng):
+    """Rutas cuyas ventanas horarias se parecen más a la de la visita semilla."""
+    inicio = data["time_windows"][semilla][0]
+    return sorted(candidatas, key=lambda r: abs(np.mean([data["time_windows"][n][0] for n in rutas[r]]) - inicio))[:tamano]
+
+
+def destruir_aleatorio(data, rutas, candidatas, semilla, tamano, rng):
+    """Rutas al azar."""
+    return rng.sample(candidatas, min(tamano, len(candidatas)))
+
+
+OPERADORES_DESTRUCCION = {"geografico": destruir_geografico, "horario": destruir_horario,
+                          "aleatorio": destruir_aleatorio}
+
+
+def _sin_servir_cercanas(data, rutas_elegidas, pendientes, maximo):
+    """Visitas sin servir más cercanas a las rutas elegidas (todas las ventanas de una misma tienda juntas)."""
+    if not pendientes:
+        return []
+    nodos = [n for ruta in rutas_elegidas for n in ruta]
+    distancias = np.asarray(data["distance_matrix"])
+    por_loc = {}
+    for n in pendientes:
+        por_loc.setdefault(data["visits_list"][n]["loc_id"], []).append(n)
+    cercania = {loc: distancias[np.ix_(nodos, grupo)].min() if nodos else 0 for loc, grupo in por_loc.items()}
+    return [n for loc in sorted(por_loc, key=cercania.get)[:maximo] for n in por_loc[loc]]
+
+
+def _elegir(pesos, rng):
+    """Ruleta proporcional a los pesos de los operadores."""
+    nombres = list(pesos)
+    return rng.choices(nombres, weights=[pesos[n] for n in nombres])[0]
+
+
+def resolver_lns(data, rutas, tiempo_total=120, paralelos=4, rutas_por_grupo=4, segundos_subproblema=5,
+                 max_sin_servir=10, procesos=None, semilla=0, motor="ortools", punto_control=None):
+    """Mejora unas rutas (índices del problema completo, una lista por vehículo) durante `tiempo_total` segundos.
+
+    En cada iteración se forman `paralelos` grupos disjuntos de `rutas_por_grupo` rutas, se reoptimizan en
+    paralelo partiendo de las rutas actuales (el subproblema nunca empeora) y se aceptan los que mejoran.
+    Los pesos de los operadores se adaptan según las mejoras que consiguen. `motor` elige cómo se reoptimiza
+    cada grupo ("ortools" o "cpsat", exacto para grupos pequeños). Si se indica el fichero `punto_control`,
+    la solución se guarda en él tras cada iteración que mejora.
+    Devuelve (coste, rutas) de la mejor solución."""
+    resolver_subproblema = MOTORES_SUBPROBLEMA[motor]
+    rng = random.Random(semilla)
+    rutas = [list(r) for r in rutas] + [[] for _ in range(data["num_vehicles"] - len(rutas))]
+    coste = vrp_TFM.coste_rutas(data, rutas)
+    pesos = {nombre: 1.0 for nombre in OPERADORES_DESTRUCCION}
+    clientes_y_recogidas = [i for i in range(len(data["visits_list"])) if i != data["depot"]]
+    print(f"🔨 LNS: coste inicial {coste}")
+
+    inicio, iteracion = time.time(), 0
+    with ProcessPoolExecutor(max_workers=procesos or paralelos) as pool:
+        while time.time() - inicio < tiempo_total:
+            iteracion += 1
+            # Pendientes por loc_id: una tienda servida en una de sus ventanas no está pendiente
+            servidos = {data["visits_list"][n]["loc_id"] for ruta in rutas for n in ruta}
+            pendientes = [n for n in clientes_y_recogidas if data["visits_list"][n]["loc_id"] not in servidos]
+            libres = [v for v, ruta in enumerate(rutas) if not ruta]
+            candidatas = [v for v, ruta in enumerate(rutas) if ruta]
+
+            # 1. Destrucción: grupos disjuntos de rutas relacionadas
+            grupos = []
+            for _ in range(paralelos):
+                if not candidatas:
+                    break
+                operador = _elegir(pesos, rng)
+                semilla_visita = rng.choice([n for v in candidatas for n in rutas[v]])
+                elegidas = OPERADORES_DESTRUCCION[operador](data, rutas, candidatas, semilla_visita,
+                                                             rutas_por_grupo, rng)
+                candidatas = [v for v in candidatas if v not in elegidas]
+                grupos.append((operador, elegidas))
+
+            # 2. Reconstrucción en paralelo: cada grupo con sus visitas pendientes cercanas y algún camión libre
+            futuros = []
+            for k, (operador, elegidas) in enumerate(grupos):
+                extra = _sin_servir_cercanas(data, [rutas[v] for v in elegidas], pendientes, max_sin_servir)
+                pendientes = [n for n in pendientes if n not in extra]
+                vehiculos_libres = libres[k::len(grupos)][:1]
+                vehiculos = list(elegidas) + vehiculos_libres
+                nodos = [n for v in elegidas for n in rutas[v]] + extra
+                sub = vrp_TFM.crear_subproblema(data, nodos, len(vehiculos))
+                iniciales = vrp_TFM.rutas_a_locales(sub, [rutas[v] for v in vehiculos])
+                futuros.append((operador, vehiculos,
+                                pool.submit(resolver_subproblema, sub, segundos_subproblema, iniciales)))
+
+            # 3. Aceptación: los grupos son disjuntos, así que cada mejora se aplica por separado
+            mejoras = 0
+            for operador, vehiculos, futuro in futuros:
+                nuevas = futuro.result()
+                candidata = [list(r) for r in rutas]
+                for v in vehiculos:
+                    candidata[v] = []
+                for v, ruta in zip(vehiculos, nuevas):
+                    candidata[v] = ruta
+                coste_candidata = vrp_TFM.coste_rutas(data, candidata)
+                if coste_candidata < coste:
+                    puntos = PUNTOS_MEJORA_GRANDE if coste - coste_candidata > 0.01 * coste else PUNTOS_MEJORA
+                    rutas, coste = candidata, coste_candidata
+                    mejoras += 1
+                else:
+                    puntos = PUNTOS_SIN_MEJORA
+                pesos[operador] = (1 - REACCION) * pesos[operador] + REACCION * puntos
+
+            print(f"   Iteración {iteracion}: {len(grupos)} grupos, {mejoras} mejoras, coste {coste} "
+                  f"({time.time() - inicio:.1f}s)")
+            if mejoras and punto_control:
+                vrp_arranque.guardar_punto_control(punto_control, data, rutas, coste)
+
+    print(f"✅ LNS terminado: coste {coste}, pesos " + ", ".join(f"{n} {p:.2f}" for n, p in pesos.items()))
+    return coste, rutas
+
+
+def main(tiempo_inicial=30, tiempo_total=120, paralelos=4, rutas_por_grupo=4, segundos_subproblema=5, procesos=None,
+         motor="ortools", reanudar=False):
+    print("\n" + "="*20)
+    print("CARGANDO (LNS DESTRUIR Y RECONSTRUIR)...")
+    print("="*20)
+
+    start_time_total = time.time()
+    data = vrp_TFM.create_data_model()
+    fichero_control = vrp_arranque.fichero_punto_control(data["dia"], "lns")
+
+    # Solución de partida: el último punto de control o una resolución global corta
+    rutas = vrp_arranque.cargar_punto_control(data, fichero_control) if reanudar else None
+    if rutas is None:
+        manager, routing = vrp_TFM.crear_modelo(data)
+        solution = vrp_TFM.resolver(data, manager, routing, vrp_TFM.crear_parametros_busqueda(tiempo_inicial))
+        if solution is None:
+            print("\n No se encontró una solución inicial viable.")
+            return
+        rutas = vrp_TFM.extraer_rutas(data, manager, routing, solution)
+
+    _, rutas = resolver_lns(data, rutas, tiempo_total, paralelos, rutas_por_grupo, segundos_subproblema,
+                            procesos=procesos, motor=motor, punto_control=fichero_control)
+
+    # Reconstruimos la solución en el modelo completo para reutilizar los informes
+    manager, routing = vrp_TFM.crear_modelo(data)
+    solution = vrp_TFM.solucion_desde_rutas(manager, routing, rutas, vrp_TFM.crear_parametros_busqueda())
+    end_time_total = time.time()
+
+    if solution:
+        print("SOLUCIÓN ENCONTRADA")
+        print(f" Tiempo Total Proceso: {end_time_total - start_time_total:.2f}s")
+        vrp_TFM.reportar_solucion(data, manager, routing, solution)
+    else:
+        print("\n No se pudieron reconstruir las rutas del LNS en el modelo completo.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VRP TFM con LNS adaptativa de destruir y reconstruir.")
+    parser.add_argument("--tiempo-inicial", type=int, default=30, help="Segundos de la resolución global inicial.")
+    parser.add_argument("--tiempo", type=int, default=120, help="Segundos totales de LNS.")
+    parser.add_argument("--paralelos", type=int, default=4, help="Subproblemas por iteración.")
+    parser.add_argument("--rutas-grupo", type=int, default=4, help="Rutas destruidas por subproblema.")
+    parser.add_argument("--tiempo-subproblema", type=int, default=5, help="Segundos por subproblema.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores.")
+    parser.add_argument("--motor", choices=sorted(MOTORES_SUBPROBLEMA), default="ortools", help="Motor de los subproblemas.")
+    parser.add_argument("--resume", action="store_true", help="Continuar desde el último punto de control del día.")
+    args = parser.parse_args()
+    main(args.tiempo_inicial, args.tiempo, args.paralelos, args.rutas_grupo, args.tiempo_subproblema, args.procesos,
+         args.motor, args.resume)
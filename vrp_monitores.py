@@ -0,0 +1,293 @@
+"""Monitores de búsqueda que se enganchan al solver mediante callbacks de solución.
+
+Todos siguen el mismo protocolo para que `vrp_TFM.resolver` los gestione:
+`iniciar(routing, manager)` antes de resolver y `detener()` al terminar."""
+
+import json
+import threading
+import time
+
+import pandas as pd
+
+import vrp_arranque
+import vrp_cache
+
+
+class MonitorMeseta:
+    """Detiene la búsqueda cuando el objetivo se estanca e indica el motivo de la parada.
+
+    - `sin_mejora`: segundos seguidos sin mejorar el objetivo.
+    - `ganancia_minima`: mejora relativa mínima exigida en los últimos `ventana_ganancia` segundos
+      (por defecto la misma ventana que `sin_mejora`, o 15 s).
+    Cualquiera de los dos criterios puede desactivarse con None."""
+
+    def __init__(self, sin_mejora=15, ganancia_minima=None, ventana_ganancia=None, intervalo=0.5):
+        self.sin_mejora = sin_mejora
+        self.ganancia_minima = ganancia_minima
+        self.ventana_ganancia = ventana_ganancia or sin_mejora or 15
+        self.intervalo = intervalo
+        self.routing = None
+
+    def iniciar(self, routing, manager=None):
+        if routing is not self.routing:
+            self.routing = routing
+            routing.AddAtSolutionCallback(self)
+        self.inicio = time.time()
+        self.mejoras = []  # (segundo, objetivo) de cada mejora
+        self.motivo = None
+        self._fin = threading.Event()
+        self._vigilante = threading.Thread(target=self._vigilar, daemon=True)
+        self._vigilante.start()
+
+    def __call__(self):
+        objetivo = self.routing.CostVar().Value()
+        if not self.mejoras or objetivo < self.mejoras[-1][1]:
+            self.mejoras.append((time.time() - self.inicio, objetivo))
+
+    def _comprobar(self):
+        """Devuelve el motivo de parada o None si la búsqueda debe continuar."""
+        if not self.mejoras:
+            return None
+        ahora = time.time() - self.inicio
+        t_ultima, mejor = self.mejoras[-1]
+
+        if self.sin_mejora is not None and ahora - t_ultima >= self.sin_mejora:
+            return f"SIN MEJORA: {ahora - t_ultima:.1f}s sin mejorar el objetivo ({mejor})"
+
+        if self.ganancia_minima is not None and ahora >= self.ventana_ganancia:
+            # Mejor objetivo conocido al principio de la ventana
+            anteriores = [obj for t, obj in self.mejoras if t <= ahora - self.ventana_ganancia]
+            if anteriores:
+                ganancia = (anteriores[-1] - mejor) / max(abs(anteriores[-1]), 1)
+                if ganancia < self.ganancia_minima:
+                    return (f"GANANCIA: {ganancia:.2%} en los últimos {self.ventana_ganancia}s "
+                            f"(mínimo {self.ganancia_minima:.2%})")
+        return None
+
+    def _vigilar(self):
+        # El callback solo se ejecuta cuando hay solución nueva, así que la comprobación es periódica
+        while not self._fin.wait(self.intervalo):
+            motivo = self._comprobar()
+            if motivo:
+                self.motivo = motivo
+                self.routing.CancelSearch()
+                return
+
+    def detener(self):
+        self._fin.set()
+        self._vigilante.join()
+        duracion = time.time() - self.inicio
+        motivo = self.motivo or "LÍMITE DE TIEMPO / FIN DE LA BÚSQUEDA"
+        print(f"⏹️ Búsqueda detenida a los {duracion:.1f}s. Motivo: {motivo}")
+
+
+class MonitorMejoras:
+    """Entrega las rutas de cada solución que mejora el objetivo mientras el solver sigue buscando.
+
+    `al_mejorar(mejora)` recibe un diccionario con 'segundo', 'objetivo' y 'rutas' (nodos por vehículo,
+    formato de `vrp_TFM.extraer_rutas`). Se llama como mucho una vez cada `intervalo` segundos: una mejora
+    que llega antes se guarda y se entrega al cumplirse el intervalo o al terminar la búsqueda, así que la
+    última mejora siempre se entrega. La llamada se hace desde el hilo del solver o desde un hilo vigilante
+    y bloquea la búsqueda mientras dura, así que debe ser rápida (p. ej. meter la mejora en una cola)."""
+
+    def __init__(self, al_mejorar, intervalo=1.0):
+        self.al_mejorar = al_mejorar
+        self.intervalo = intervalo
+        self.routing = None
+
+    def iniciar(self, routing, manager=None):
+        if routing is not self.routing:
+            self.routing = routing
+            routing.AddAtSolutionCallback(self)
+        self.manager = manager
+        self.inicio = time.time()
+        self.mejor = None
+        self.pendiente = None
+        self.ultima_entrega = None
+        self._cerrojo = threading.Lock()
+        self._fin = threading.Event()
+        self._vigilante = threading.Thread(target=self._vigilar, daemon=True)
+        self._vigilante.start()
+
+    def __call__(self):
+        routing = self.routing
+        objetivo = routing.CostVar().Value()
+        if self.mejor is not None and objetivo >= self.mejor:
+            return
+        self.mejor = objetivo
+
+        # Las variables solo están ligadas dentro del callback: las rutas se copian ahora
+        rutas = []
+        for vehicle_id in range(routing.vehicles()):
+            ruta = []
+            index = routing.NextVar(routing.Start(vehicle_id)).Value()
+            while not routing.IsEnd(index):
+                ruta.append(self.manager.IndexToNode(index))
+                index = routing.NextVar(index).Value()
+            rutas.append(ruta)
+        with self._cerrojo:
+            self.pendiente = {'segundo': round(time.time() - self.inicio, 3), 'objetivo': objetivo, 'rutas': rutas}
+            self._entregar_si_toca()
+
+    def _entregar_si_toca(self):
+        if self.pendiente is not None and (self.ultima_entrega is None
+                                           or time.time() - self.ultima_entrega >= self.intervalo):
+            self._entregar()
+
+    def _entregar(self):
+        mejora, self.pendiente = self.pendiente, None
+        self.ultima_entrega = time.time()
+        self.al_mejorar(mejora)
+
+    def _vigilar(self):
+        # Entrega la mejora retenida aunque el solver tarde en encontrar la siguiente
+        while not self._fin.wait(min(self.intervalo, 0.5)):
+            with self._cerrojo:
+                self._entregar_si_toca()
+
+    def detener(self):
+        self._fin.set()
+        self._vigilante.join()
+        with self._cerrojo:
+            if self.pendiente is not None:
+                self._entregar()
+
+
+class PuntoControl(MonitorMejoras):
+    """Guarda en disco las rutas de la mejor solución como mucho cada `intervalo` segundos (y al terminar).
+
+    `data` es el del día, antes de cambiar la flota: el punto de control sirve para cualquier número de
+    vehículos. Se reanuda con `vrp_arranque.cargar_punto_control`."""
+
+    def __init__(self, data, fichero, intervalo=10):
+        super().__init__(self._guardar, intervalo)
+        self.data = data
+        self.fichero = fichero
+        self.huella = vrp_cache.huella_datos(data)
+
+    def _guardar(self, mejora):
+        vrp_arranque.guardar_punto_control(self.fichero, self.data, mejora['rutas'], mejora['objetivo'], self.huella)
+
+
+def calcular_gaps(cotas, objetivo, distancia, descartadas):
+    """(gap del objetivo, gap de la distancia) respecto a las cotas de `vrp_TFM.cotas_inferiores`.
+
+    El gap del objetivo descuenta de ambos lados las penalizaciones inevitables (visitas imposibles de
+    servir), que ninguna solución puede evitar. El de la distancia compara con la cota de servir todas las
+    visitas servibles, así que solo existe (si no, None) cuando la solución las sirve todas: `descartadas`
+    (tiendas o recogidas sin servir) no pasa de las imposibles."""
+    evitable = objetivo - cotas['inevitable']
+    gap_objetivo = round((objetivo - cotas['objetivo']) / evitable, 4) if evitable > 0 else 0.0
+    gap_distancia = None
+    if cotas['distancia'] is not None and descartadas <= cotas['imposibles'] and distancia:
+        gap_distancia = round((distancia - cotas['distancia']) / distancia, 4)
+    return gap_objetivo, gap_distancia
+
+
+class TrazaBusqueda:
+    """Registra cada solución que mejora el objetivo: instante, objetivo, vehículos usados,
+    visitas descartadas (tiendas o recogidas sin servir) y distancia total.
+
+    La traza se acumula entre resoluciones sucesivas (p. ej. las iteraciones de la flota adaptativa);
+    el campo 'resolucion' indica a cuál pertenece cada fila. Con `informar=False` no se imprime
+    el resumen al terminar (útil en procesos trabajadores). Con `cotas` (de `vrp_TFM.cotas_inferiores`)
+    cada fila lleva también los gaps del objetivo y de la distancia (ver `calcular_gaps`)."""
+
+    def __init__(self, informar=True, cotas=None):
+        self.informar = informar
+        self.cotas = cotas
+        self.routing = None
+        self.filas = []
+        self.resolucion = 0
+        self.inicio_global = None
+
+    def iniciar(self, routing, manager=None):
+        if routing is not self.routing:
+            self.routing = routing
+            routing.AddAtSolutionCallback(self)
+            # Cada disyunción es una tienda (o una recogida) que se puede dejar sin servir
+            self.disyunciones = [[] for _ in range(routing.GetNumberOfDisjunctions())]
+            for index in range(routing.Size()):
+                for disyuncion in routing.GetDisjunctionIndices(index):
+                    self.disyunciones[disyuncion].append(index)
+        if self.inicio_global is None:
+            self.inicio_global = time.time()
+        self.resolucion += 1
+        self.mejor = None
+
+    def __call__(self):
+        routing = self.routing
+        objetivo = routing.CostVar().Value()
+        if self.mejor is not None and objetivo >= self.mejor:
+            return
+        self.mejor = objetivo
+
+        vehiculos, distancia = 0, 0
+        for vehicle_id in range(routing.vehicles()):
+            index = routing.Start(vehicle_id)
+            siguiente = routing.NextVar(index).Value()
+            if routing.IsEnd(siguiente):
+                continue
+            vehiculos += 1
+            while not routing.IsEnd(index):
+                siguiente = routing.NextVar(index).Value()
+                distancia += routing.GetArcCostForVehicle(index, siguiente, vehicle_id)
+                index = siguiente
+        descartadas = sum(1 for indices in self.disyunciones
+                          if not any(routing.ActiveVar(i).Value() for i in indices))
+
+        gap, gap_distancia = calcular_gaps(self.cotas, objetivo, distancia, descartadas) if self.cotas else (None, None)
+        ahora = time.time()
+        self.filas.append({
+            'resolucion': self.resolucion,
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ahora)),
+            'segundo': round(ahora - self.inicio_global, 3),
+            'objetivo': objetivo,
+            'vehiculos': vehiculos,
+            'visitas_descartadas': descartadas,
+            'distancia': distancia,
+            'gap': gap,
+            'gap_distancia': gap_distancia,
+        })
+
+    def detener(self):
+        if self.informar and self.filas:
+            ultima = self.filas[-1]
+            gap = f", gap {ultima['gap']:.1%}" if ultima['gap'] is not None else ""
+            if ultima['gap_distancia'] is not None:
+                gap += f", gap de distancia {ultima['gap_distancia']:.1%}"
+            print(f"📈 Traza: {len(self.filas)} mejoras, última a los {ultima['segundo']:.1f}s (objetivo {ultima['objetivo']}{gap})")
+
+    def guardar(self, nombre="traza_busqueda"):
+        """Escribe la traza en `<nombre>.json` y `<nombre>.csv` (junto a mapa_rutas.html)."""
+        with open(f"{nombre}.json", "w", encoding="utf-8") as f:
+            json.dump(self.filas, f, ensure_ascii=False, indent=1)
+        pd.DataFrame(self.filas, columns=['resolucion', 'timestamp', 'segundo', 'objetivo', 'vehiculos',
+                                          'visitas_descartadas', 'distancia', 'gap', 'gap_distancia']).to_csv(f"{nombre}.csv", index=False)
+        print(f"✅ Traza de búsqueda guardada en {nombre}.json / {nombre}.csv")
+
+    def graficar(self, nombre="traza_busqueda"):
+        """Gráfica de convergencia (objetivo frente a tiempo) en `<nombre>.png`. Requiere matplotlib."""
+        try:
+            import matplotlib
+            matplotlib.use("Agg")
+            import matplotlib.pyplot as plt
+        except ImportError:
+            print("⚠️ matplotlib no está instalado: no se genera la gráfica de convergencia.")
+            return
+        fig, ax = plt.subplots(figsize=(8, 4))
+        for resolucion in sorted({fila['resolucion'] for fila in self.filas}):
+            filas = [fila for fila in self.filas if fila['resolucion'] == resolucion]
+            ax.step([fila['segundo'] for fila in filas], [fila['objetivo'] for fila in filas],
+                    where="post", label=f"Resolución {resolucion}")
+        if self.cotas:
+            ax.axhline(self.cotas['objetivo'], color="grey", linestyle="--", label="Cota inferior")
+        ax.set_xlabel("Segundos")
+        ax.set_ylabel("Objetivo")
+        ax.set_yscale("log")
+        ax.set_title("Convergencia de la búsqueda")
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(f"{nombre}.png", dpi=120)
+        plt.close(fig)
+        print(f"✅ Gráfica de convergencia guardada en {nombre}.png")
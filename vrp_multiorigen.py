@@ -0,0 +1,231 @@
+"""Planificación con varios orígenes (depósitos): reparto de las visitas y un modelo por origen en paralelo.
+
+Cada origen se carga con sus propios tiempos de descarga (LOC_ORIGEN_ID). Las tiendas y recogidas se asignan
+a un origen con un mapeo fijo (CSV loc_id,origen) o, si no aparecen en él, al origen más cercano (ida y
+vuelta). Los modelos de cada origen se resuelven en paralelo con una parte de la flota proporcional a su
+carga. Opcionalmente, un modelo conjunto con un depósito de salida y llegada por vehículo parte de esos
+planes y deja que las tiendas frontera cambien de origen."""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import vrp_TFM
+from vrp_descomposicion import MOTORES_SUBPROBLEMA, _reparto_vehiculos
+from vrp_escenarios import indicadores
+
+# Distancia entre orígenes en el modelo conjunto (ningún vehículo pasa de un depósito a otro)
+ARCO_PROHIBIDO = 5000000
+
+
+def _clave_visita(v):
+    return (v["loc_id"], v["start"], v["end"])
+
+
+def cargar_origenes(origenes, num_vehicles=vrp_TFM.NUM_VEHICULOS):
+    """`data` de cada origen (mismas tiendas, depósito y tiempos de descarga propios)."""
+    return {origen: vrp_TFM.create_data_model(num_vehicles, origen, [o for o in origenes if o != origen])
+            for origen in origenes}
+
+
+def cargar_mapeo(fichero):
+    """Mapeo fijo tienda -> origen desde un CSV con columnas loc_id,origen."""
+    tabla = pd.read_csv(fichero, dtype=str)
+    return dict(zip(tabla["loc_id"], tabla["origen"]))
+
+
+def asignar_origenes(datos, mapeo=None):
+    """Origen de cada loc_id: el del mapeo fijo o, si no está, el de menor distancia de ida y vuelta."""
+    mapeo = mapeo or {}
+    asignacion = {}
+    for origen, data in datos.items():
+        distancias = data["distance_matrix"]
+        for i, v in enumerate(data["visits_list"]):
+            if i == data["depot"]:
+                continue
+            ida_vuelta = distancias[data["depot"]][i] + distancias[i][data["depot"]]
+            actual = asignacion.get(v["loc_id"])
+            if actual is None or ida_vuelta < actual[1]:
+                asignacion[v["loc_id"]] = (origen, ida_vuelta)
+    return {loc_id: mapeo.get(loc_id, origen) for loc_id, (origen, _) in asignacion.items()}
+
+
+def repartir_flota(datos, asignacion, num_vehicles):
+    """Camiones de cada origen, proporcionales a los MCE que tiene asignados (al menos uno, sin pasar de
+    `num_vehicles` en total)."""
+    mce = {origen: 0 for origen in datos}
+    for origen, data in datos.items():
+        vistos = set()
+        for i in data["delivery_nodes"]:
+            loc_id = data["visits_list"][i]["loc_id"]
+            if asignacion.get(loc_id) == origen and loc_id not in vistos:
+                mce[origen] += abs(data["demands"][i])
+                vistos.add(loc_id)
+    return dict(zip(mce, _reparto_vehiculos(list(mce.values()), num_vehicles)))
+
+
+def resolver_origenes(datos, asignacion, flotas, segundos=60, procesos=None, motor="ortools"):
+    """Resuelve en paralelo el modelo de cada origen con sus visitas asignadas.
+
+    Devuelve {origen: (subproblema, rutas en índices del `data` de ese origen, una lista por vehículo)}."""
+    resolver_subproblema = MOTORES_SUBPROBLEMA[motor]
+    subproblemas = {}
+    for origen, data in datos.items():
+        nodos = [i for i, v in enumerate(data["visits_list"])
+                 if i != data["depot"] and asignacion.get(v["loc_id"]) == origen]
+        subproblemas[origen] = vrp_TFM.crear_subproblema(data, nodos, flotas[origen])
+
+    resultados = {}
+    with ProcessPoolExecutor(max_workers=procesos or len(datos)) as pool:
+        futuros = {origen: pool.submit(resolver_subproblema, sub, segundos) for origen, sub in subproblemas.items()}
+        for origen, futuro in futuros.items():
+            rutas = futuro.result()
+            rutas += [[] for _ in range(flotas[origen] - len(rutas))]
+            resultados[origen] = (subproblemas[origen], rutas)
+    return resultados
+
+
+# MODELO CONJUNTO
+
+def datos_conjuntos(datos, flotas):
+    """`data` con todos los orígenes como depósitos y una flota por origen.
+
+    Los nodos son los del primer origen (su depósito en el índice 0) más los demás orígenes al final; las
+    filas y columnas de cada depósito y su perfil de descarga salen del `data` de ese origen. Todos los
+    orígenes deben tener las mismas visitas (si no, se lanza ValueError). Devuelve
+    (data conjunto, {origen: índice de cada nodo del conjunto en el `data` del origen})."""
+    origenes = list(datos)
+    base = datos[origenes[0]]
+    visitas_base = {_clave_visita(v) for i, v in enumerate(base["visits_list"]) if i != base["depot"]}
+    for origen in origenes[1:]:
+        visitas = {_clave_visita(v) for i, v in enumerate(datos[origen]["visits_list"]) if i != datos[origen]["depot"]}
+        if visitas != visitas_base:
+            distintas = sorted(visitas ^ visitas_base)
+            raise ValueError(f"Las visitas de {origen} y {origenes[0]} no coinciden ({len(distintas)} distintas, "
+                             f"p. ej. {distintas[:3]}); el modelo conjunto perdería visitas.")
+    n_base = len(base["visits_list"])
+    n = n_base + len(origenes) - 1
+    depositos = [base["depot"]] + list(range(n_base, n))
+
+    correspondencia = {}
+    for origen in origenes:
+        posicion = {_clave_visita(v): i for i, v in enumerate(datos[origen]["visits_list"])}
+        indices = [posicion.get(_clave_visita(v)) for v in base["visits_list"]]
+        indices[base["depot"]] = None
+        indices += [None] * (n - n_base)
+        indices[depositos[origenes.index(origen)]] = datos[origen]["depot"]
+        correspondencia[origen] = indices
+
+    distancias = [fila + [ARCO_PROHIBIDO] * (n - n_base) for fila in base["distance_matrix"]]
+    tiempos = [fila + [ARCO_PROHIBIDO] * (n - n_base) for fila in base["time_matrix"]]
+    distancias += [[ARCO_PROHIBIDO] * n for _ in range(n - n_base)]
+    tiempos += [[ARCO_PROHIBIDO] * n for _ in range(n - n_base)]
+    for k, origen in enumerate(origenes[1:], 1):
+        data, d = datos[origen], depositos[k]
+        for i in range(n_base):
+            j = correspondencia[origen][i]
+            if j is not None and i != base["depot"]:
+                distancias[d][i], distancias[i][d] = data["distance_matrix"][data["depot"]][j], data["distance_matrix"][j][data["depot"]]
+                tiempos[d][i], tiempos[i][d] = data["time_matrix"][data["depot"]][j], data["time_matrix"][j][data["depot"]]
+        distancias[d][d] = tiempos[d][d] = 0
+
+    perfiles = []
+    for origen in origenes:
+        servicio = datos[origen]["service_times"]
+        perfiles.append([servicio[j] if j is not None else 0 for j in correspondencia[origen]])
+
+    conjunto = dict(base)
+    conjunto["distance_matrix"], conjunto["time_matrix"] = distancias, tiempos
+    conjunto["visits_list"] = base["visits_list"] + [datos[o]["visits_list"][datos[o]["depot"]] for o in origenes[1:]]
+    conjunto["idx_to_node"] = {i: v["loc_id"] for i, v in enumerate(conjunto["visits_list"])}
+    conjunto["node_to_idx"] = {v: k for k, v in conjunto["idx_to_node"].items()}
+    conjunto["node_coords"] = dict(base["node_coords"])
+    for k, origen in enumerate(origenes[1:], 1):
+        conjunto["node_coords"][depositos[k]] = datos[origen]["node_coords"][datos[origen]["depot"]]
+    for clave, relleno in (("demands", 0), ("service_times", 0), ("time_windows", (0, base["horizonte"]))):
+        conjunto[clave] = list(base[clave]) + [relleno] * (n - n_base)
+
+    conjunto["perfiles_servicio"] = perfiles
+    conjunto["starts"], conjunto["ends"], conjunto["perfil_vehiculo"] = [], [], []
+    for k, origen in enumerate(origenes):
+        conjunto["starts"] += [depositos[k]] * flotas[origen]
+        conjunto["ends"] += [depositos[k]] * flotas[origen]
+        conjunto["perfil_vehiculo"] += [k] * flotas[origen]
+    conjunto["num_vehicles"] = len(conjunto["starts"])
+    conjunto["vehicle_capacities"] = [base["vehicle_capacities"][0]] * conjunto["num_vehicles"]
+    return conjunto, correspondencia
+
+
+def resolver_conjunto(datos, resultados, flotas, segundos=60):
+    """Modelo conjunto multi-depósito partiendo de los planes de cada origen.
+
+    Devuelve (data conjunto, manager, routing, solution) o solution None si no hay solución."""
+    conjunto, correspondencia = datos_conjuntos(datos, flotas)
+    iniciales = []
+    for origen, (sub, rutas) in resultados.items():
+        # Índice del origen -> índice del conjunto (las visitas sin equivalente se dejan fuera)
+        al_conjunto = {j: i for i, j in enumerate(correspondencia[origen]) if j is not None}
+        for ruta in rutas:
+            iniciales.append([al_conjunto[n] for n in ruta if n in al_conjunto])
+    manager, routing = vrp_TFM.crear_modelo(conjunto)
+    solution = vrp_TFM.resolver(conjunto, manager, routing, vrp_TFM.crear_parametros_busqueda(segundos), iniciales)
+    return conjunto, manager, routing, solution
+
+
+def main(origenes, fichero_mapeo=None, num_vehicles=vrp_TFM.NUM_VEHICULOS, segundos=60, conjunto=False,
+         segundos_conjunto=60, procesos=None):
+    print("\n" + "="*20)
+    print("CARGANDO (VARIOS ORÍGENES)...")
+    print("="*20)
+
+    start_time_total = time.time()
+    datos = cargar_origenes(origenes, num_vehicles)
+    asignacion = asignar_origenes(datos, cargar_mapeo(fichero_mapeo) if fichero_mapeo else None)
+    flotas = repartir_flota(datos, asignacion, num_vehicles)
+    for origen in origenes:
+        visitas = sum(1 for o in asignacion.values() if o == origen)
+        print(f"🏭 Origen {origen}: {visitas} tiendas/recogidas, {flotas[origen]} camiones")
+
+    resultados = resolver_origenes(datos, asignacion, flotas, segundos, procesos)
+    filas = []
+    for origen, (sub, rutas) in resultados.items():
+        locales = vrp_TFM.rutas_a_locales(sub, rutas)
+        manager, routing = vrp_TFM.crear_modelo(sub)
+        solution = vrp_TFM.solucion_desde_rutas(manager, routing, locales, vrp_TFM.crear_parametros_busqueda())
+        print(f"\n🏭 PLAN DEL ORIGEN {origen}")
+        if solution:
+            vrp_TFM.print_solution(sub, manager, routing, solution)
+        filas.append(dict(origen=origen, **indicadores(sub, locales)))
+    print("\n" + pd.DataFrame(filas).to_string(index=False))
+
+    if conjunto:
+        print("\n🌐 Modelo conjunto con todos los orígenes...")
+        data, manager, routing, solution = resolver_conjunto(datos, resultados, flotas, segundos_conjunto)
+        if solution:
+            # Tiendas que el modelo conjunto sirve desde otro origen
+            rutas = vrp_TFM.extraer_rutas(data, manager, routing, solution)
+            cambios = 0
+            for vehicle_id, ruta in enumerate(rutas):
+                origen = data["idx_to_node"][data["starts"][vehicle_id]]
+                cambios += sum(1 for n in ruta if asignacion.get(data["visits_list"][n]["loc_id"]) != origen)
+            print(f"🌐 Modelo conjunto: objetivo {solution.ObjectiveValue()}, {cambios} tiendas frontera cambian de origen")
+            vrp_TFM.print_solution(data, manager, routing, solution)
+        else:
+            print("\n No se encontró solución para el modelo conjunto.")
+
+    print(f"\n Tiempo Total Proceso: {time.time() - start_time_total:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VRP TFM con varios orígenes en paralelo.")
+    parser.add_argument("origenes", nargs="+", help="loc_id de los orígenes, p. ej. A00010 A00020.")
+    parser.add_argument("--mapeo", default=None, help="CSV loc_id,origen con asignaciones fijas (el resto, por cercanía).")
+    parser.add_argument("--vehiculos", type=int, default=vrp_TFM.NUM_VEHICULOS, help="Camiones en total.")
+    parser.add_argument("--tiempo", type=int, default=60, help="Segundos del modelo de cada origen.")
+    parser.add_argument("--conjunto", action="store_true", help="Refinar con un modelo conjunto multi-depósito.")
+    parser.add_argument("--tiempo-conjunto", type=int, default=60, help="Segundos del modelo conjunto.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores.")
+    args = parser.parse_args()
+    main(args.origenes, args.mapeo, args.vehiculos, args.tiempo, args.conjunto, args.tiempo_conjunto, args.procesos)
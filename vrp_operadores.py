@@ -0,0 +1,163 @@
+"""Perfilado de los operadores de búsqueda local de OR-Tools sobre días de producción guardados.
+
+Para cada operador se hacen dos experimentos sobre cada instancia:
+- en solitario (solo ese operador activo): vecinos explorados, movimientos aceptados y mejora
+  del objetivo respecto a la primera solución (informativo);
+- contra la configuración por defecto: si viene activo, cuánto empeora el objetivo final al quitarlo;
+  si no, cuánto mejora al añadirlo a los de por defecto.
+Con ello se escribe el conjunto recomendado que carga `vrp_TFM.main`: un operador por defecto solo se
+desactiva si quitarlo no empeora, y uno que no viene activo solo se activa si mejora el objetivo final
+de la configuración por defecto más que el umbral de significación."""
+
+import argparse
+import glob
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from ortools.constraint_solver import pywrapcp
+from ortools.util import optional_boolean_pb2
+
+import vrp_TFM
+import vrp_monitores
+
+# Operadores configurables y los que OR-Tools activa por defecto
+_POR_DEFECTO = pywrapcp.DefaultRoutingSearchParameters().local_search_operators
+OPERADORES = [campo.name for campo in _POR_DEFECTO.DESCRIPTOR.fields]
+OPERADORES_POR_DEFECTO = [op for op in OPERADORES if getattr(_POR_DEFECTO, op) == optional_boolean_pb2.BOOL_TRUE]
+
+# Mejora relativa mínima del objetivo final para activar un operador que no viene por defecto
+UMBRAL_MEJORA = 0.005
+
+# Ejecuciones de la configuración por defecto por instancia; se compara con la mejor de ellas
+REPETICIONES_BASE = 3
+
+# Instancias cargadas en cada proceso trabajador
+_INSTANCIAS = {}
+
+
+def leer_perfil(perfil):
+    """Extrae la tabla de operadores de `Solver.LocalSearchProfile()`.
+
+    Devuelve una lista de diccionarios con operador, vecinos, filtrados, aceptados y tiempo."""
+    filas = []
+    en_tabla = False
+    for linea in perfil.splitlines():
+        if linea.startswith("Local search operator statistics"):
+            en_tabla = True
+            continue
+        if en_tabla:
+            # La tabla termina en la primera línea sin columnas (la cabecera de los filtros)
+            if "|" not in linea:
+                break
+            columnas = [c.strip() for c in linea.split("|")]
+            if columnas[1] == "Neighbors":
+                continue
+            filas.append({'operador': columnas[0], 'vecinos': int(columnas[1]), 'filtrados': int(columnas[2]),
+                          'aceptados': int(columnas[3]), 'tiempo': float(columnas[4])})
+    return filas
+
+
+def _ejecutar(fichero, operadores, segundos):
+    """Resuelve una instancia guardada con un conjunto de operadores y devuelve sus estadísticas."""
+    if fichero not in _INSTANCIAS:
+        _INSTANCIAS[fichero] = vrp_TFM.cargar_instancia(fichero)
+    data = _INSTANCIAS[fichero]
+
+    parametros_modelo = pywrapcp.DefaultRoutingModelParameters()
+    parametros_modelo.solver_parameters.profile_local_search = True
+    manager, routing = vrp_TFM.crear_modelo(data, parametros_modelo)
+    search_parameters = vrp_TFM.crear_parametros_busqueda(segundos, operadores=operadores)
+
+    traza = vrp_monitores.TrazaBusqueda(informar=False)
+    solution = vrp_TFM.resolver(data, manager, routing, search_parameters, monitores=[traza])
+    if solution is None or not traza.filas:
+        return None
+
+    total = next((f for f in leer_perfil(routing.solver().LocalSearchProfile()) if f['operador'] == "Total"),
+                 {'vecinos': 0, 'filtrados': 0, 'aceptados': 0})
+    return {
+        'objetivo_inicial': traza.filas[0]['objetivo'],
+        'objetivo_final': solution.ObjectiveValue(),
+        'vecinos': total['vecinos'],
+        'filtrados': total['filtrados'],
+        'aceptados': total['aceptados'],
+    }
+
+
+def perfilar_operadores(ficheros, segundos=10, procesos=None, umbral=UMBRAL_MEJORA, repeticiones=REPETICIONES_BASE):
+    """Ejecuta los experimentos en paralelo y devuelve un DataFrame con una fila por operador.
+
+    Con límite de tiempo el resultado de una ejecución varía, así que la referencia es el mejor objetivo
+    final de `repeticiones` ejecuciones por defecto: un cambio solo cuenta si la supera."""
+    solo = {op: {**{o: False for o in OPERADORES}, op: True} for op in OPERADORES}
+    # Frente a la configuración por defecto: quitar los que vienen activos y añadir los que no
+    contra_base = {op: {op: op not in OPERADORES_POR_DEFECTO} for op in OPERADORES}
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        base = {f: [pool.submit(_ejecutar, f, None, segundos) for _ in range(repeticiones)] for f in ficheros}
+        futuros_solo = {(op, f): pool.submit(_ejecutar, f, ops, segundos) for op, ops in solo.items() for f in ficheros}
+        futuros_base = {(op, f): pool.submit(_ejecutar, f, ops, segundos)
+                        for op, ops in contra_base.items() for f in ficheros}
+        base = {f: min((r['objetivo_final'] for r in (futuro.result() for futuro in futuros) if r is not None), default=None)
+                for f, futuros in base.items()}
+
+        filas = []
+        for op in OPERADORES:
+            fila = {'operador': op, 'por_defecto': op in OPERADORES_POR_DEFECTO,
+                    'vecinos': 0, 'aceptados': 0, 'ganancia_solo': 0.0, 'efecto_base': None}
+            efectos = []
+            for f in ficheros:
+                r = futuros_solo[(op, f)].result()
+                if r is not None:
+                    fila['vecinos'] += r['vecinos']
+                    fila['aceptados'] += r['aceptados']
+                    # Mejora relativa respecto a la primera solución, promediada entre días
+                    fila['ganancia_solo'] += (r['objetivo_inicial'] - r['objetivo_final']) / max(r['objetivo_inicial'], 1) / len(ficheros)
+                r = futuros_base[(op, f)].result()
+                if r is not None and base[f] is not None:
+                    # Positivo: el operador aporta (quitarlo empeora o añadirlo mejora el objetivo final)
+                    cambio = (r['objetivo_final'] - base[f]) / max(base[f], 1)
+                    efectos.append(cambio if fila['por_defecto'] else -cambio)
+            if efectos:
+                fila['efecto_base'] = sum(efectos) / len(efectos)
+            filas.append(fila)
+
+    perfil = pd.DataFrame(filas)
+    # Por defecto: se quita solo si quitarlo no empeora. El resto: se añade solo si mejora más que el umbral
+    # y acepta movimientos (si no, la mejora es ruido de la búsqueda, no mérito del operador).
+    perfil['recomendado'] = [(pd.isna(e) or e > 0) if por_defecto else (aceptados > 0 and pd.notna(e) and e > umbral)
+                             for por_defecto, aceptados, e in zip(perfil['por_defecto'], perfil['aceptados'],
+                                                                   perfil['efecto_base'])]
+    return perfil.sort_values(['recomendado', 'aceptados'], ascending=False).reset_index(drop=True)
+
+
+def guardar_recomendacion(perfil, fichero=vrp_TFM.FICHERO_OPERADORES):
+    """Escribe el conjunto de operadores recomendado en el formato que lee `vrp_TFM.cargar_operadores`."""
+    operadores = {fila['operador']: bool(fila['recomendado']) for _, fila in perfil.iterrows()}
+    with open(fichero, "w", encoding="utf-8") as f:
+        json.dump({'generado': time.strftime("%Y-%m-%d %H:%M:%S"), 'operadores': operadores}, f, indent=1)
+    print(f"✅ Operadores recomendados guardados en {fichero}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perfilado de operadores de búsqueda local sobre días guardados.")
+    parser.add_argument("instancias", nargs="*", help="Ficheros de instancia (por defecto, todos los de instancias/).")
+    parser.add_argument("--tiempo", type=int, default=10, help="Segundos por ejecución.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores.")
+    parser.add_argument("--umbral", type=float, default=UMBRAL_MEJORA,
+                        help="Mejora relativa mínima del objetivo final para activar un operador no incluido por defecto.")
+    parser.add_argument("--salida", default=vrp_TFM.FICHERO_OPERADORES, help="Fichero de operadores recomendados.")
+    args = parser.parse_args()
+
+    ficheros = args.instancias or sorted(glob.glob(f"{vrp_TFM.CARPETA_INSTANCIAS}/instancia_*.pkl"))
+    if not ficheros:
+        raise SystemExit(f"No hay instancias guardadas en {vrp_TFM.CARPETA_INSTANCIAS}/ (ejecuta antes vrp_TFM.py).")
+
+    inicio = time.time()
+    perfil = perfilar_operadores(ficheros, args.tiempo, args.procesos, args.umbral)
+    perfil.to_csv("perfil_operadores.csv", index=False)
+    print(perfil.to_string(index=False))
+    print(f"\n Perfilado de {len(ficheros)} días en {time.time() - inicio:.1f}s (detalle en perfil_operadores.csv)")
+    guardar_recomendacion(perfil, args.salida)
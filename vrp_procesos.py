@@ -0,0 +1,132 @@
+"""Planificación en paralelo por proceso logístico (PMG, Seco, Congelado).
+
+En vez de tratar como PMG toda la carga del día, se monta un modelo por proceso con su carga, sus ventanas
+de RMG_FACT_SLA_REDUX y su propia flota, y los modelos se resuelven a la vez en un pool de procesos. Las
+recogidas van solo en el modelo de un proceso (por defecto el primero). Los planes se juntan en un único
+informe y un mapa con una capa por proceso."""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import vrp_TFM
+from vrp_descomposicion import MOTORES_SUBPROBLEMA
+from vrp_escenarios import indicadores
+
+PROCESOS = ("PMG", "SECO", "CONGELADO")
+FICHERO_MAPA_PROCESOS = "mapa_procesos.html"
+
+
+def cargar_procesos(procesos=PROCESOS, num_vehicles=vrp_TFM.NUM_VEHICULOS):
+    """`data` de cada proceso (carga y ventanas propias, mismo depósito)."""
+    return {proceso: vrp_TFM.create_data_model(num_vehicles, proceso=proceso) for proceso in procesos}
+
+
+def _mce(data):
+    """MCE a entregar en el día: cada tienda cuenta una vez aunque tenga varias ventanas (varios nodos)."""
+    mce, vistos = 0, set()
+    for i in data["delivery_nodes"]:
+        loc_id = data["visits_list"][i]["loc_id"]
+        if loc_id not in vistos:
+            mce += abs(data["demands"][i])
+            vistos.add(loc_id)
+    return mce
+
+
+def repartir_flota(datos, num_vehicles, flotas=None):
+    """Camiones de cada proceso: los fijados en `flotas` y el resto en proporción a los MCE (al menos uno)."""
+    flotas = dict(flotas or {})
+    libres = [p for p in datos if p not in flotas]
+    if not libres:
+        return flotas
+    mce = {p: _mce(datos[p]) for p in libres}
+    disponibles = max(len(libres), num_vehicles - sum(flotas.values()))
+    total = sum(mce.values()) or 1
+    for p in libres:
+        flotas[p] = max(1, round(disponibles * mce[p] / total))
+    # Ajuste del redondeo sobre el proceso con más carga
+    mayor = max(libres, key=mce.get)
+    flotas[mayor] = max(1, flotas[mayor] + disponibles - sum(flotas[p] for p in libres))
+    return flotas
+
+
+def resolver_procesos(datos, flotas, segundos=60, procesos=None, recogidas=None, motor="ortools"):
+    """Resuelve en paralelo el modelo de cada proceso; solo el de `recogidas` incluye las recogidas.
+
+    Devuelve {proceso: (subproblema, rutas en índices del `data` de ese proceso, una lista por vehículo)}."""
+    recogidas = recogidas or next(iter(datos))
+    resolver_subproblema = MOTORES_SUBPROBLEMA[motor]
+    subproblemas = {}
+    for proceso, data in datos.items():
+        nodos = data["delivery_nodes"] + (data["pickup_nodes"] if proceso == recogidas else [])
+        subproblemas[proceso] = vrp_TFM.crear_subproblema(data, nodos, flotas[proceso])
+
+    resultados = {}
+    with ProcessPoolExecutor(max_workers=procesos or len(datos)) as pool:
+        futuros = {proceso: pool.submit(resolver_subproblema, sub, segundos) for proceso, sub in subproblemas.items()}
+        for proceso, futuro in futuros.items():
+            rutas = futuro.result()
+            rutas += [[] for _ in range(flotas[proceso] - len(rutas))]
+            resultados[proceso] = (subproblemas[proceso], rutas)
+    return resultados
+
+
+def informe_procesos(resultados, fichero_mapa=FICHERO_MAPA_PROCESOS):
+    """Imprime el plan de cada proceso, la tabla de indicadores con el total y el mapa con una capa por proceso."""
+    filas, mapa, leyenda = [], None, ""
+    for proceso, (sub, rutas) in resultados.items():
+        locales = vrp_TFM.rutas_a_locales(sub, rutas)
+        manager, routing = vrp_TFM.crear_modelo(sub)
+        solution = vrp_TFM.solucion_desde_rutas(manager, routing, locales, vrp_TFM.crear_parametros_busqueda())
+        print(f"\n📦 PLAN DEL PROCESO {proceso}")
+        if solution is None:
+            print(" Las rutas del proceso no son factibles en su modelo.")
+            continue
+        vrp_TFM.print_solution(sub, manager, routing, solution)
+        filas.append(dict(proceso=proceso, **indicadores(sub, locales)))
+        if mapa is None:
+            mapa = vrp_TFM.crear_mapa(sub["node_coords"][sub["depot"]])
+        leyenda += vrp_TFM.dibujar_rutas(mapa, sub, manager, routing, solution, capa=proceso)
+
+    tabla = pd.DataFrame(filas)
+    if not tabla.empty:
+        total = dict(proceso="TOTAL", **{c: tabla[c].sum() for c in tabla.columns if c != "proceso"})
+        tabla = pd.concat([tabla, pd.DataFrame([total])], ignore_index=True)
+        print("\n" + tabla.to_string(index=False))
+    if mapa is not None:
+        vrp_TFM.cerrar_mapa(mapa, leyenda, fichero_mapa)
+        print(f"🗺️ Mapa por procesos guardado en {fichero_mapa}")
+    return tabla
+
+
+def main(procesos=PROCESOS, num_vehicles=vrp_TFM.NUM_VEHICULOS, flotas=None, segundos=60, recogidas=None,
+         num_procesos=None):
+    print("\n" + "="*20)
+    print("CARGANDO (POR PROCESO LOGÍSTICO)...")
+    print("="*20)
+
+    start_time_total = time.time()
+    datos = cargar_procesos(procesos, num_vehicles)
+    flotas = repartir_flota(datos, num_vehicles, flotas)
+    for proceso, data in datos.items():
+        print(f"📦 {proceso}: {len(data['delivery_nodes'])} visitas, {_mce(data)} MCE, {flotas[proceso]} camiones")
+
+    resultados = resolver_procesos(datos, flotas, segundos, num_procesos, recogidas)
+    informe_procesos(resultados)
+    print(f"\n Tiempo Total Proceso: {time.time() - start_time_total:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VRP TFM con un modelo por proceso logístico en paralelo.")
+    parser.add_argument("--procesos-logisticos", nargs="+", default=list(PROCESOS), help="PROCESO_ID a planificar.")
+    parser.add_argument("--vehiculos", type=int, default=vrp_TFM.NUM_VEHICULOS, help="Camiones en total.")
+    parser.add_argument("--flota", nargs="+", default=[],
+                        help="Camiones fijos por proceso, p. ej. PMG=80 SECO=40 (el resto, por MCE).")
+    parser.add_argument("--recogidas", default=None, help="Proceso cuyo modelo incluye las recogidas (por defecto, el primero).")
+    parser.add_argument("--tiempo", type=int, default=60, help="Segundos del modelo de cada proceso.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores.")
+    args = parser.parse_args()
+    flotas = {p: int(n) for p, n in (f.split("=") for f in args.flota)}
+    main(args.procesos_logisticos, args.vehiculos, flotas, args.tiempo, args.recogidas, args.procesos)
@@ -0,0 +1,214 @@
+"""Pulido de rutas tras el solver: se reordena cada ruta por separado sin mover paradas entre camiones.
+
+Las rutas cortas (hasta MAX_PARADAS_EXACTO paradas) se resuelven de forma exacta con programación dinámica
+de Held-Karp con ventanas horarias; las largas con 2-opt y or-opt vectorizados. Toda ruta nueva se comprueba
+con `evaluar_ruta`, así que sigue siendo factible para el modelo."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from vrp_evaluacion import evaluar_ruta
+
+MAX_PARADAS_EXACTO = 12
+
+# `data` y matriz de distancias de cada proceso trabajador
+_DATOS_PULIDO = None
+
+
+def _distancia(distancias, depot, ruta):
+    camino = [depot] + list(ruta) + [depot]
+    return float(distancias[camino[:-1], camino[1:]].sum())
+
+
+# SECUENCIA EXACTA (HELD-KARP)
+
+def _held_karp(data, distancias, ruta, vehicle_id):
+    """Orden de menor distancia de las paradas de una ruta, o None si no encuentra uno factible.
+
+    Cada estado (paradas visitadas, última parada) guarda etiquetas no dominadas con la distancia, el
+    intervalo de horas de servicio posibles en la última parada (misma propagación que `evaluar_ruta`) y
+    el tiempo mínimo transcurrido desde la salida más tardía factible. Servir la última parada a la hora t
+    deja una jornada consumida de max(transito, t - salida), con `transito` la suma de tránsitos y `salida`
+    la salida más tardía del depósito; una etiqueta domina a otra si es más corta, su intervalo contiene
+    al de la otra y no consume más jornada a ninguna hora de ese intervalo. La carga no depende del orden (el camión sale
+    lleno y solo descarga) y no se admiten entregas después de una recogida."""
+    depot = data["depot"]
+    n = len(ruta)
+    tiempos = data["time_matrix"]
+    servicio = data["service_times"]
+    holgura, horizonte, jornada = data["holgura_tiempo"], data["horizonte"], data["jornada_max"]
+    ventanas = [data["time_windows"][nodo] for nodo in ruta]
+    recogida = [nodo in set(data["pickup_nodes"]) for nodo in ruta]
+    mascara_recogidas = sum(1 << k for k in range(n) if recogida[k])
+
+    def domina(e, f):
+        # Jornada consumida a la hora t: max(transito, t - salida), creciente en t
+        return (e[0] <= f[0] and e[1] <= f[1] and e[2] >= f[2] and e[3] <= max(f[3], f[1] - f[4])
+                and (e[4] >= f[4] or f[2] - e[4] <= f[3]))
+
+    # etiquetas[(mascara, ultima)] = [(distancia, bajo, alto, transito, salida, etiqueta_padre, ultima), ...]
+    etiquetas = {}
+    for k, nodo in enumerate(ruta):
+        transito = tiempos[depot][nodo] + servicio[depot]
+        bajo = max(ventanas[k][0], transito)
+        alto = min(ventanas[k][1], horizonte + transito + holgura)
+        if bajo <= alto and transito <= jornada:
+            etiquetas[(1 << k, k)] = [(distancias[depot, nodo], bajo, alto, transito, horizonte, None, k)]
+
+    for mascara in range(1, 1 << n):
+        for ultima in range(n):
+            for etiqueta in etiquetas.get((mascara, ultima), ()):
+                distancia, bajo, alto, transitos, salida = etiqueta[:5]
+                for k in range(n):
+                    if mascara & (1 << k) or (mascara & mascara_recogidas and not recogida[k]):
+                        continue
+                    transito = tiempos[ruta[ultima]][ruta[k]] + servicio[ruta[ultima]]
+                    nuevo_bajo = max(ventanas[k][0], bajo + transito)
+                    nuevo_alto = min(ventanas[k][1], alto + transito + holgura)
+                    # Salida más tardía para servir k a la hora t: min(nueva_salida, t - nuevos_transitos)
+                    nuevos_transitos = transitos + transito
+                    nueva_salida = min(salida, alto - transitos)
+                    if nuevo_bajo > nuevo_alto or max(nuevos_transitos, nuevo_bajo - nueva_salida) > jornada:
+                        continue
+                    nueva = (distancia + distancias[ruta[ultima], ruta[k]], nuevo_bajo, nuevo_alto,
+                             nuevos_transitos, nueva_salida, etiqueta, k)
+                    lista = etiquetas.setdefault((mascara | (1 << k), k), [])
+                    if any(domina(e, nueva) for e in lista):
+                        continue
+                    lista[:] = [e for e in lista if not domina(nueva, e)]
+                    lista.append(nueva)
+
+    # Órdenes completos de menor a mayor distancia; el primero factible (vuelta al depósito incluida) es el óptimo
+    completos = []
+    todas = (1 << n) - 1
+    for ultima in range(n):
+        for etiqueta in etiquetas.get((todas, ultima), ()):
+            completos.append((etiqueta[0] + distancias[ruta[ultima], depot], etiqueta))
+    for _, etiqueta in sorted(completos, key=lambda c: c[0]):
+        orden = []
+        while etiqueta is not None:
+            orden.append(etiqueta[6])
+            etiqueta = etiqueta[5]
+        candidata = [ruta[k] for k in reversed(orden)]
+        if evaluar_ruta(data, candidata, vehicle_id)['factible']:
+            return candidata
+    return None
+
+
+# BÚSQUEDA LOCAL (2-OPT Y OR-OPT)
+
+def _mejor_2opt(data, distancias, ruta, vehicle_id):
+    """Primer movimiento 2-opt factible que acorta la ruta (se prueban de mayor a menor ganancia)."""
+    camino = np.array([data["depot"]] + ruta + [data["depot"]])
+    ida = distancias[camino[:-1], camino[1:]]          # coste de cada arco en su sentido
+    vuelta = distancias[camino[1:], camino[:-1]]       # coste del mismo arco recorrido al revés
+    acum_ida, acum_vuelta = np.r_[0, np.cumsum(ida)], np.r_[0, np.cumsum(vuelta)]
+
+    # Invertir camino[i+1..j]: se quitan los arcos i y j, se añaden (i, j) y (i+1, j+1) y el tramo cambia de sentido
+    i, j = np.triu_indices(len(camino) - 1, k=2)
+    tramo = (acum_vuelta[j] - acum_vuelta[i + 1]) - (acum_ida[j] - acum_ida[i + 1])
+    delta = (distancias[camino[i], camino[j]] + distancias[camino[i + 1], camino[j + 1]]
+             - ida[i] - ida[j] + tramo)
+    for k in np.flatnonzero(delta < -1e-9)[np.argsort(delta[delta < -1e-9], kind="stable")]:
+        # Posiciones en `ruta` (sin el depósito inicial)
+        a, b = i[k], j[k]
+        candidata = ruta[:a] + ruta[a:b][::-1] + ruta[b:]
+        if evaluar_ruta(data, candidata, vehicle_id)['factible']:
+            return candidata
+    return None
+
+
+def _mejor_or_opt(data, distancias, ruta, vehicle_id, max_tramo=3):
+    """Primer movimiento or-opt factible (mover un tramo de 1 a `max_tramo` paradas) que acorta la ruta."""
+    camino = np.array([data["depot"]] + ruta + [data["depot"]])
+    n = len(ruta)
+    movimientos, deltas = [], []
+    for largo in range(1, min(max_tramo, n - 1) + 1):
+        inicios = np.arange(n - largo + 1)              # tramo ruta[s:s+largo] = camino[s+1:s+largo+1]
+        primero, ultimo = camino[inicios + 1], camino[inicios + largo]
+        antes, despues = camino[inicios], camino[inicios + largo + 1]
+        quitar = distancias[antes, primero] + distancias[ultimo, despues] - distancias[antes, despues]
+
+        # Insertar entre camino[p] y camino[p+1] (arcos del camino sin el tramo: se excluyen los adyacentes)
+        p = np.arange(n + 1)
+        poner = (distancias[camino[p][None, :], primero[:, None]] + distancias[ultimo[:, None], camino[p + 1][None, :]]
+                 - distancias[camino[p][None, :], camino[p + 1][None, :]])
+        delta = poner - quitar[:, None]
+        adyacente = (p[None, :] >= inicios[:, None]) & (p[None, :] <= inicios[:, None] + largo)
+        delta[adyacente] = np.inf
+        s, q = np.nonzero(delta < -1e-9)
+        movimientos += [(int(a), largo, int(b)) for a, b in zip(inicios[s], p[q])]
+        deltas += delta[s, q].tolist()
+
+    for k in np.argsort(deltas, kind="stable"):
+        s, largo, p = movimientos[k]
+        tramo = ruta[s:s + largo]
+        resto = ruta[:s] + ruta[s + largo:]
+        destino = p if p < s else p - largo
+        candidata = resto[:destino] + tramo + resto[destino:]
+        if evaluar_ruta(data, candidata, vehicle_id)['factible']:
+            return candidata
+    return None
+
+
+def _busqueda_local(data, distancias, ruta, vehicle_id, max_iteraciones=1000):
+    """2-opt y or-opt alternados hasta que ninguno mejora."""
+    for _ in range(max_iteraciones):
+        nueva = _mejor_2opt(data, distancias, ruta, vehicle_id) or _mejor_or_opt(data, distancias, ruta, vehicle_id)
+        if nueva is None:
+            break
+        ruta = nueva
+    return ruta
+
+
+def pulir_ruta(data, ruta, vehicle_id=0, max_exacto=MAX_PARADAS_EXACTO, distancias=None):
+    """Reordena una ruta. Devuelve (ruta, distancia antes, distancia después, método)."""
+    if distancias is None:
+        distancias = np.asarray(data["distance_matrix"], dtype=float)
+    antes = _distancia(distancias, data["depot"], ruta)
+    if len(ruta) < 2:
+        return list(ruta), antes, antes, "-"
+
+    if len(ruta) <= max_exacto:
+        nueva, metodo = _held_karp(data, distancias, list(ruta), vehicle_id), "held-karp"
+    else:
+        nueva, metodo = _busqueda_local(data, distancias, list(ruta), vehicle_id), "2opt/oropt"
+    despues = _distancia(distancias, data["depot"], nueva) if nueva is not None else antes
+    if nueva is None or despues >= antes:
+        return list(ruta), antes, antes, metodo
+    return nueva, antes, despues, metodo
+
+
+def _iniciar_pulido(data):
+    """Inicializador de cada proceso: recibe `data` una sola vez."""
+    global _DATOS_PULIDO
+    _DATOS_PULIDO = (data, np.asarray(data["distance_matrix"], dtype=float))
+
+
+def _pulir_en_proceso(vehicle_id, ruta, max_exacto):
+    data, distancias = _DATOS_PULIDO
+    return pulir_ruta(data, ruta, vehicle_id, max_exacto, distancias)
+
+
+def pulir_rutas(data, rutas, max_exacto=MAX_PARADAS_EXACTO, procesos=None):
+    """Pule todas las rutas en paralelo e informa de la distancia ganada en cada una.
+
+    Devuelve (rutas pulidas, ganancia total de distancia)."""
+    usadas = [v for v, ruta in enumerate(rutas) if len(ruta) > 1]
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_pulido, initargs=(data,)) as pool:
+        futuros = {v: pool.submit(_pulir_en_proceso, v, rutas[v], max_exacto) for v in usadas}
+        resultados = {v: futuro.result() for v, futuro in futuros.items()}
+
+    print("\n" + "="*30)
+    print("PULIDO DE RUTAS")
+    print("="*30)
+    pulidas, ganancia_total = [list(ruta) for ruta in rutas], 0
+    for v, (ruta, antes, despues, metodo) in resultados.items():
+        pulidas[v] = ruta
+        ganancia_total += antes - despues
+        if despues < antes:
+            print(f"✨ Vehículo {v} ({len(ruta)} paradas, {metodo}): {antes:.0f} -> {despues:.0f} (-{antes - despues:.0f})")
+    mejoradas = sum(1 for _, antes, despues, _ in resultados.values() if despues < antes)
+    print(f"Rutas mejoradas: {mejoradas}/{len(resultados)} | Distancia ganada: {ganancia_total:.0f}")
+    return pulidas, ganancia_total
@@ -0,0 +1,64 @@
+"""Segunda fase del modo en dos fases: las recogidas (Axxx) se enganchan a la cola de las rutas de reparto.
+
+Con las rutas de entregas ya resueltas, cada recogida se inserta por inserción más barata entre la última
+entrega de una ruta y su vuelta al depósito (o en un camión vacío), de modo que se cumple por construcción
+que no hay entregas después de una recogida. Cada inserción se comprueba con `evaluar_ruta`; solo se
+recalculan los candidatos de la ruta que acaba de cambiar."""
+
+from vrp_evaluacion import evaluar_ruta
+
+
+def _mejor_posicion(data, ruta, vehicle_id, recogida):
+    """(incremento de distancia, ruta nueva) de la mejor posición factible en la cola, o None."""
+    dist = data["distance_matrix"]
+    depot = data["depot"]
+    pickup_set = set(data["pickup_nodes"])
+    # La cola empieza tras la última entrega
+    inicio = max((k + 1 for k, n in enumerate(ruta) if n not in pickup_set), default=0)
+    candidatos = []
+    for pos in range(inicio, len(ruta) + 1):
+        anterior = ruta[pos - 1] if pos > 0 else depot
+        siguiente = ruta[pos] if pos < len(ruta) else depot
+        incremento = dist[anterior][recogida] + dist[recogida][siguiente] - dist[anterior][siguiente]
+        candidatos.append((incremento, pos))
+    for incremento, pos in sorted(candidatos):
+        nueva = ruta[:pos] + [recogida] + ruta[pos:]
+        if evaluar_ruta(data, nueva, vehicle_id)['factible']:
+            return incremento, nueva
+    return None
+
+
+def anadir_recogidas(data, rutas, recogidas=None):
+    """Inserta las recogidas en la cola de las rutas (una lista de nodos por vehículo, sin recogidas).
+
+    Devuelve (rutas con recogidas, recogidas que no caben en ninguna ruta)."""
+    rutas = [list(ruta) for ruta in rutas]
+    pendientes = set(data["pickup_nodes"] if recogidas is None else recogidas)
+    # Mejor inserción de cada recogida en cada ruta; los camiones vacíos son equivalentes, basta uno
+    candidatos = {}
+
+    def recalcular(vehicle_id):
+        for recogida in pendientes:
+            candidatos[(recogida, vehicle_id)] = _mejor_posicion(data, rutas[vehicle_id], vehicle_id, recogida)
+
+    vacio = next((v for v, ruta in enumerate(rutas) if not ruta), None)
+    for vehicle_id, ruta in enumerate(rutas):
+        if ruta or vehicle_id == vacio:
+            recalcular(vehicle_id)
+
+    while pendientes:
+        opciones = [(c[0], recogida, v) for (recogida, v), c in candidatos.items() if c is not None and recogida in pendientes]
+        if not opciones:
+            break
+        _, recogida, vehicle_id = min(opciones)
+        rutas[vehicle_id] = candidatos[(recogida, vehicle_id)][1]
+        pendientes.discard(recogida)
+        for v in {k[1] for k in candidatos}:
+            candidatos.pop((recogida, v), None)
+        recalcular(vehicle_id)
+        if vehicle_id == vacio:
+            # El camión vacío ya no lo está: se busca otro
+            vacio = next((v for v, ruta in enumerate(rutas) if not ruta), None)
+            if vacio is not None:
+                recalcular(vacio)
+    return rutas, sorted(pendientes)
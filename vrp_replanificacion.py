@@ -0,0 +1,263 @@
+"""Replanificación durante la ejecución: se fija lo ya hecho por cada camión y se reoptimiza solo lo pendiente.
+
+Los camiones informan de su avance en un fichero de eventos (una línea JSON por evento, sustituto local de
+una cola de mensajes) con la hora en minutos del día:
+
+    {"hora": 480, "vehiculo": 3, "tipo": "salida"}                      sale del depósito
+    {"hora": 512, "vehiculo": 3, "tipo": "visita", "loc_id": "T101"}    termina una visita
+    {"hora": 540, "vehiculo": 3, "tipo": "fallo", "loc_id": "T102"}     no ha podido servir la tienda
+    {"hora": 575, "vehiculo": 3, "tipo": "posicion", "carga": 12}       sigue en la última parada (retraso) con esa carga
+    {"hora": 700, "vehiculo": 3, "tipo": "fin"}                         ha vuelto al depósito y no sale más
+
+`vehiculo` es la posición de la ruta en el plan del día. El prefijo ya recorrido de cada ruta se bloquea en
+el modelo (ApplyLocksToAllVehicles) y se convierte en un tramo sin duración que termina en la última parada
+a la hora real, con la carga que le queda al camión; el solver solo decide el orden y el reparto de las
+visitas pendientes, partiendo del plan vigente recortado a lo que todavía es factible."""
+
+import argparse
+import json
+import os
+import time
+
+import vrp_TFM
+import vrp_arranque
+from vrp_evaluacion import evaluar_ruta
+
+
+class LectorEventos:
+    """Lee un fichero de eventos de forma incremental: cada llamada a `nuevos` devuelve solo las líneas añadidas."""
+
+    def __init__(self, fichero):
+        self.fichero = fichero
+        self._posicion = 0
+
+    def nuevos(self):
+        if not os.path.exists(self.fichero):
+            return []
+        with open(self.fichero, encoding="utf-8") as f:
+            f.seek(self._posicion)
+            lineas = f.readlines()
+            self._posicion = f.tell()
+        return [json.loads(linea) for linea in lineas if linea.strip()]
+
+
+def estado_flota(data, rutas, eventos):
+    """Estado de cada camión a partir de los eventos recibidos hasta ahora.
+
+    Devuelve, por vehículo, un diccionario con 'hechas' (nodos ya recorridos, en orden), 'fallidas'
+    (nodos de ese prefijo que no se sirvieron), 'hora' (hora a la que queda libre en la última parada),
+    'salida' (hora real de salida del depósito), 'carga' (carga que le queda) y 'terminado'."""
+    nodo_en_plan = {data["visits_list"][n]["loc_id"]: n for ruta in rutas for n in ruta}
+    primer_nodo = {}
+    for i, v in enumerate(data["visits_list"]):
+        if i != data["depot"]:
+            primer_nodo.setdefault(v["loc_id"], i)
+
+    estados = [{'hechas': [], 'fallidas': set(), 'hora': None, 'salida': None, 'carga': None, 'terminado': False}
+               for _ in range(data["num_vehicles"])]
+    for evento in sorted(eventos, key=lambda e: e["hora"]):
+        estado = estados[evento["vehiculo"]]
+        tipo = evento["tipo"]
+        if tipo in ("visita", "fallo"):
+            nodo = nodo_en_plan.get(evento["loc_id"], primer_nodo.get(evento["loc_id"]))
+            if nodo is None:
+                print(f"⚠️ Evento de una tienda que no está en el día: {evento['loc_id']}")
+                continue
+            if estado['salida'] is None and not estado['hechas']:
+                # Sin evento de salida: la más tardía que permite llegar a la primera parada
+                estado['salida'] = max(0, evento["hora"] - data["service_times"][nodo]
+                                       - data["time_matrix"][data["depot"]][nodo])
+            estado['hechas'].append(nodo)
+            if tipo == "fallo":
+                estado['fallidas'].add(nodo)
+        elif tipo == "salida":
+            estado['salida'] = evento["hora"]
+        if "carga" in evento:
+            estado['carga'] = evento["carga"]
+        estado['terminado'] = estado['terminado'] or tipo == "fin"
+        estado['hora'] = evento["hora"]
+    return estados
+
+
+def datos_residuales(data, estados):
+    """Copia de `data` en la que el prefijo hecho de cada camión no consume tiempo ni carga.
+
+    Las paradas hechas quedan sin ventana, sin tiempo de servicio y sin tiempo de viaje entre ellas (son
+    exclusivas del camión que las hizo, así que a nadie más le afecta); solo la última conserva los tiempos
+    de salida. Su demanda se ajusta para que el camión salga de ella con la carga que le queda."""
+    residual = dict(data)
+    residual["time_matrix"] = [list(fila) for fila in data["time_matrix"]]
+    residual["service_times"] = list(data["service_times"])
+    residual["time_windows"] = list(data["time_windows"])
+    residual["demands"] = list(data["demands"])
+    tiempos = residual["time_matrix"]
+
+    for vehicle_id, estado in enumerate(estados):
+        hechas = estado['hechas']
+        if not hechas:
+            continue
+        carga = estado['carga']
+        if carga is None:
+            carga = data["vehicle_capacities"][vehicle_id] + sum(
+                data["demands"][n] for n in hechas if n not in estado['fallidas'])
+        for nodo in hechas:
+            residual["service_times"][nodo] = 0
+            residual["time_windows"][nodo] = (0, data["horizonte"])
+            residual["demands"][nodo] = 0
+            for fila in tiempos:
+                fila[nodo] = 0
+            if nodo != hechas[-1]:
+                tiempos[nodo] = [0] * len(tiempos)
+        residual["demands"][hechas[-1]] = carga - data["vehicle_capacities"][vehicle_id]
+    return residual
+
+
+def _fin_jornada(data, estado):
+    """Hora límite de vuelta al depósito de un camión que ya ha salido."""
+    return min(data["horizonte"], (estado['salida'] or 0) + data["jornada_max"])
+
+
+def _recortar_sufijo(residual, vehicle_id, estado, sufijo, ahora):
+    """Parte del plan pendiente de un camión que todavía es factible (se saltan las paradas que ya no caben)."""
+    if estado['terminado']:
+        return []
+    if not estado['hechas']:
+        # Camión en el depósito: su ruta tiene que poder salir a partir de ahora
+        ruta = []
+        for nodo in sufijo:
+            evaluacion = evaluar_ruta(residual, ruta + [nodo], vehicle_id)
+            if evaluacion['factible'] and evaluacion['horas'][0] >= ahora:
+                ruta.append(nodo)
+        return ruta
+
+    # Camión en ruta: intervalo de horas de servicio desde la última parada, con la hora real fijada
+    depot, holgura = residual["depot"], residual["holgura_tiempo"]
+    tiempos, servicio = residual["time_matrix"], residual["service_times"]
+    fin = _fin_jornada(residual, estado)
+    anterior = estado['hechas'][-1]
+    bajo = alto = estado['hora']
+    carga = residual["vehicle_capacities"][vehicle_id] + residual["demands"][anterior]
+    recogidas = set(residual["pickup_nodes"])
+    recogida_vista = any(n in recogidas for n in estado['hechas'])
+    ruta = []
+    for nodo in sufijo:
+        inicio, final = residual["time_windows"][nodo]
+        transito = tiempos[anterior][nodo] + servicio[anterior]
+        nuevo_bajo = max(inicio, bajo + transito)
+        nuevo_alto = min(final, alto + transito + holgura)
+        nueva_carga = carga + residual["demands"][nodo]
+        if (nuevo_bajo > nuevo_alto or not 0 <= nueva_carga <= residual["vehicle_capacities"][vehicle_id]
+                or (recogida_vista and nodo not in recogidas)
+                or nuevo_bajo + servicio[nodo] + tiempos[nodo][depot] > fin):
+            continue
+        ruta.append(nodo)
+        anterior, bajo, alto, carga = nodo, nuevo_bajo, nuevo_alto, nueva_carga
+        recogida_vista = recogida_vista or nodo in recogidas
+    return ruta
+
+
+def replanificar(data, rutas, eventos, ahora=None, segundos=5):
+    """Reoptimiza lo pendiente del día a partir del plan vigente y los eventos recibidos.
+
+    `ahora` es la hora actual en minutos (por defecto, la del último evento). Devuelve (rutas completas por
+    vehículo con el prefijo hecho delante, tiendas fallidas)."""
+    inicio = time.time()
+    rutas = [list(r) for r in rutas] + [[] for _ in range(data["num_vehicles"] - len(rutas))]
+    estados = estado_flota(data, rutas, eventos)
+    if ahora is None:
+        ahora = max((e["hora"] for e in eventos), default=0)
+    residual = datos_residuales(data, estados)
+
+    # Plan de partida: lo hecho más lo que queda del plan vigente y todavía es factible
+    hechos = {n for estado in estados for n in estado['hechas']}
+    hechas_loc = {data["visits_list"][n]["loc_id"] for n in hechos}
+    iniciales = []
+    for vehicle_id, (ruta, estado) in enumerate(zip(rutas, estados)):
+        sufijo = [n for n in ruta if data["visits_list"][n]["loc_id"] not in hechas_loc]
+        iniciales.append(estado['hechas'] + _recortar_sufijo(residual, vehicle_id, estado, sufijo, ahora))
+
+    manager, routing = vrp_TFM.crear_modelo(residual)
+    search_parameters = vrp_TFM.crear_parametros_busqueda(segundos)
+    vrp_TFM.cerrar_modelo(routing, search_parameters)
+    time_dimension = routing.GetDimensionOrDie("Time")
+    routing.ApplyLocksToAllVehicles([[manager.NodeToIndex(n) for n in estado['hechas']] for estado in estados],
+                                    False)
+    for vehicle_id, estado in enumerate(estados):
+        if estado['hechas']:
+            ultimo = manager.NodeToIndex(estado['hechas'][-1])
+            time_dimension.CumulVar(ultimo).SetValue(estado['hora'])
+        else:
+            ultimo = routing.Start(vehicle_id)
+            time_dimension.CumulVar(ultimo).SetMin(ahora)
+        if estado['salida'] is not None:
+            # La jornada se cuenta desde la salida real, aunque todavía no haya visitado nada
+            time_dimension.CumulVar(routing.End(vehicle_id)).SetMax(_fin_jornada(data, estado))
+        if estado['terminado']:
+            routing.NextVar(ultimo).SetValue(routing.End(vehicle_id))
+
+    # Como `vrp_TFM.resolver`, pero sobre el modelo ya cerrado con los bloqueos
+    inicial = routing.solver().Assignment()
+    rutas_indices = [[manager.NodeToIndex(n) for n in ruta] for ruta in iniciales]
+    solution = None
+    if routing.RoutesToAssignment(rutas_indices, True, True, inicial):
+        solution = routing.SolveFromAssignmentWithParameters(inicial, search_parameters)
+    if solution is None:
+        solution = routing.SolveWithParameters(search_parameters)
+    if solution is None:
+        print("⚠️ Sin solución para lo pendiente, se mantiene el plan recortado.")
+        nuevas = iniciales
+    else:
+        nuevas = vrp_TFM.extraer_rutas(residual, manager, routing, solution)
+
+    fallidas = {data["visits_list"][n]["loc_id"] for estado in estados for n in estado['fallidas']}
+    pendientes = sum(len(ruta) - len(estado['hechas']) for ruta, estado in zip(nuevas, estados))
+    sin_servir = vrp_TFM.tiendas_sin_servir(data, nuevas) | fallidas
+    en_ruta = sum(1 for estado in estados if estado['hechas'] and not estado['terminado'])
+    print(f"🔁 Replanificación a las {ahora // 60:02d}:{ahora % 60:02d}: {len(hechos)} paradas hechas "
+          f"({len(fallidas)} fallidas), {en_ruta} camiones en ruta, {pendientes} paradas pendientes, "
+          f"{len(sin_servir)} tiendas sin servir ({time.time() - inicio:.1f}s)")
+    return nuevas, fallidas
+
+
+def resumen_pendiente(data, rutas, eventos):
+    """Imprime, por camión, la siguiente parada y cuántas le quedan."""
+    estados = estado_flota(data, rutas, eventos)
+    for vehicle_id, (ruta, estado) in enumerate(zip(rutas, estados)):
+        pendiente = ruta[len(estado['hechas']):]
+        if pendiente:
+            siguiente = data['idx_to_node'][pendiente[0]]
+            print(f"🚚 Vehículo {vehicle_id}: {len(estado['hechas'])} hechas, siguiente {siguiente}, "
+                  f"{len(pendiente)} pendientes")
+
+
+def main(fichero_eventos, dia=vrp_TFM.DIA_PLANIFICACION, segundos=5, ahora=None, vigilar=False, intervalo=30):
+    """Replanifica el plan guardado del día con los eventos del fichero.
+
+    Con `vigilar` se queda leyendo el fichero y replanifica cada vez que llegan eventos nuevos."""
+    fecha = vrp_arranque._fecha(dia)
+    data = vrp_TFM.cargar_instancia(os.path.join(vrp_TFM.CARPETA_INSTANCIAS, f"instancia_{fecha}.pkl"))
+    rutas = vrp_arranque.cargar_rutas_dia(data)
+
+    lector, eventos = LectorEventos(fichero_eventos), []
+    while True:
+        nuevos = lector.nuevos()
+        if nuevos:
+            eventos += nuevos
+            rutas, _ = replanificar(data, rutas, eventos, ahora, segundos)
+            vrp_arranque.guardar_rutas_dia(data, rutas)
+            resumen_pendiente(data, rutas, eventos)
+        if not vigilar:
+            break
+        time.sleep(intervalo)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replanificación de lo pendiente del día a partir de eventos de los camiones.")
+    parser.add_argument("eventos", help="Fichero JSONL con los eventos de los camiones.")
+    parser.add_argument("--dia", default=vrp_TFM.DIA_PLANIFICACION, help="Día del plan (DD/MM/YYYY).")
+    parser.add_argument("--tiempo", type=int, default=5, help="Segundos de reoptimización.")
+    parser.add_argument("--ahora", type=int, default=None, help="Hora actual en minutos (por defecto, la del último evento).")
+    parser.add_argument("--vigilar", action="store_true", help="Seguir leyendo el fichero y replanificar con cada evento nuevo.")
+    parser.add_argument("--intervalo", type=int, default=30, help="Segundos entre lecturas con --vigilar.")
+    args = parser.parse_args()
+    main(args.eventos, args.dia, args.tiempo, args.ahora, args.vigilar, args.intervalo)
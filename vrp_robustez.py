@@ -0,0 +1,219 @@
+"""Simulación de Monte Carlo de la robustez de un plan frente a tráfico y descargas peores que la media.
+
+El plan se calcula con tiempos medios (TIEMPO_MIN y MIN_CLIENTE_AVG). Aquí las secuencias de cada camión
+se mantienen fijas y, en cada escenario, los tiempos de viaje y de descarga se multiplican por factores
+aleatorios de media 1: un factor común del día (día de tráfico malo) por el factor de cada arco, y un
+factor por cliente para la descarga. Cada camión sale lo antes posible sin pasar de la espera máxima ni,
+en el plan, de la jornada (así el margen de las ventanas queda para absorber retrasos), espera si llega
+antes de la ventana, y llega tarde si empieza el servicio después del fin de la ventana. Todo se calcula
+con NumPy por bloques de escenarios (escenarios x rutas a la vez, parada a parada). Se obtiene la
+probabilidad de incumplir la ventana en cada visita y el riesgo de exceder la jornada en cada ruta."""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import vrp_TFM
+import vrp_arranque
+from vrp_evaluacion import EvaluadorVectorizado
+
+# Distribuciones de los factores (media 1, coeficiente de variación `cv`). Se pueden sustituir por arco
+# ("A00010-C00012") o por cliente ("C00012") en las secciones 'arcos' y 'clientes' del fichero de configuración.
+DISTRIBUCIONES = ("lognormal", "gamma", "normal")
+PERTURBACION_POR_DEFECTO = {
+    "comun": {"distribucion": "lognormal", "cv": 0.1},
+    "viaje": {"distribucion": "lognormal", "cv": 0.2},
+    "servicio": {"distribucion": "lognormal", "cv": 0.3},
+    "arcos": {},
+    "clientes": {},
+}
+FICHERO_ROBUSTEZ_VISITAS = "robustez_visitas.csv"
+FICHERO_ROBUSTEZ_RUTAS = "robustez_rutas.csv"
+
+
+def cargar_perturbacion(fichero=None):
+    """Configuración de las perturbaciones: la por defecto con lo que indique el JSON `fichero`."""
+    perturbacion = {clave: dict(valor) for clave, valor in PERTURBACION_POR_DEFECTO.items()}
+    if fichero:
+        with open(fichero, encoding="utf-8") as f:
+            for clave, valor in json.load(f).items():
+                perturbacion[clave].update(valor)
+    return perturbacion
+
+
+def _factores(rng, forma, distribucion, cv):
+    """Factores aleatorios de media 1. `distribucion` (índices de DISTRIBUCIONES) y `cv` son arrays que se
+    difunden sobre las últimas dimensiones de `forma`."""
+    distribucion = np.broadcast_to(distribucion, forma)
+    cv = np.broadcast_to(np.asarray(cv, dtype=float), forma)
+    factores = np.ones(forma)
+    for codigo, nombre in enumerate(DISTRIBUCIONES):
+        mascara = (distribucion == codigo) & (cv > 0)
+        if not mascara.any():
+            continue
+        c = cv[mascara]
+        if nombre == "lognormal":
+            sigma = np.sqrt(np.log1p(c ** 2))
+            factores[mascara] = np.exp(sigma * rng.standard_normal(c.shape) - sigma ** 2 / 2)
+        elif nombre == "gamma":
+            forma_gamma = 1 / c ** 2
+            factores[mascara] = rng.gamma(forma_gamma, 1 / forma_gamma)
+        else:
+            factores[mascara] = np.maximum(0, 1 + c * rng.standard_normal(c.shape))
+    return factores
+
+
+def _parametros(base, especificos, claves):
+    """(código de distribución, cv) de cada posición: el de `especificos[clave]` si existe, si no el de `base`."""
+    codigos = np.empty(claves.shape, dtype=np.int64)
+    cvs = np.empty(claves.shape)
+    for posicion, clave in np.ndenumerate(claves):
+        parametro = {**base, **especificos.get(clave, {})}
+        codigos[posicion] = DISTRIBUCIONES.index(parametro["distribucion"])
+        cvs[posicion] = parametro["cv"]
+    return codigos, cvs
+
+
+def _salidas(evaluador, caminos, plan):
+    """Hora de salida de cada ruta: la más temprana factible, retrasada lo justo para que la duración del plan
+    no supere la jornada.
+
+    `plan` (de `EvaluadorVectorizado.evaluar`) sale a la hora más tardía, que minimiza la duración pero
+    deja alguna parada justo al final de su ventana, sin margen para ningún retraso."""
+    origen, destino = caminos[:, :-1], caminos[:, 1:]
+    transitos = evaluador.tiempos[origen, destino] + evaluador.servicio[origen]
+    inicio = evaluador.inicio_ventana[caminos]
+    # Hora más temprana de servicio en cada parada y, hacia atrás, la mínima para no esperar más de la holgura
+    bajos = np.empty_like(inicio)
+    bajos[:, 0] = inicio[:, 0]
+    for k in range(1, caminos.shape[1]):
+        bajos[:, k] = np.maximum(inicio[:, k], bajos[:, k - 1] + transitos[:, k - 1])
+    temprana = bajos[:, -1]
+    for k in range(caminos.shape[1] - 2, -1, -1):
+        temprana = np.maximum(bajos[:, k], temprana - transitos[:, k] - evaluador.holgura)
+    # Salir antes alarga la ruta como mucho lo mismo que se adelanta la salida
+    tardia = plan['horas'][:, 0]
+    return np.minimum(tardia, np.maximum(temprana, tardia - (evaluador.jornada_max - plan['duracion'])))
+
+
+def _horario(evaluador, caminos, salida):
+    """Horas de servicio saliendo a `salida` con los tiempos medios (esperando a que abra cada ventana)."""
+    origen, destino = caminos[:, :-1], caminos[:, 1:]
+    transitos = evaluador.tiempos[origen, destino] + evaluador.servicio[origen]
+    horas = np.empty(caminos.shape, dtype=np.int64)
+    horas[:, 0] = salida
+    for k in range(1, caminos.shape[1]):
+        horas[:, k] = np.maximum(evaluador.inicio_ventana[caminos[:, k]], horas[:, k - 1] + transitos[:, k - 1])
+    return horas
+
+
+def simular(data, rutas, escenarios=2000, perturbacion=None, semilla=0, bloque=250):
+    """Simula el plan en `escenarios` escenarios. Devuelve (DataFrame por visita, DataFrame por ruta).
+
+    Por visita: probabilidad de llegar tarde a la ventana y retraso medio (minutos) cuando llega tarde.
+    Por ruta: probabilidad de superar la jornada máxima, duración planificada, media y P95."""
+    perturbacion = perturbacion or PERTURBACION_POR_DEFECTO
+    evaluador = EvaluadorVectorizado(data)
+    usadas = [(v, list(ruta)) for v, ruta in enumerate(rutas) if len(ruta)]
+    caminos = evaluador.caminos([ruta for _, ruta in usadas])
+    origen, destino = caminos[:, :-1], caminos[:, 1:]
+    plan = evaluador.evaluar([ruta for _, ruta in usadas], [v for v, _ in usadas])
+    salida = _salidas(evaluador, caminos, plan)
+    horas_plan = _horario(evaluador, caminos, salida)
+
+    # Parámetros de las perturbaciones por arco recorrido y por parada
+    loc = np.array([v["loc_id"] for v in data["visits_list"]], dtype=object)
+    arcos = np.frompyfunc(lambda a, b: f"{a}-{b}", 2, 1)(loc[origen], loc[destino])
+    codigo_viaje, cv_viaje = _parametros(perturbacion["viaje"], perturbacion["arcos"], arcos)
+    codigo_servicio, cv_servicio = _parametros(perturbacion["servicio"], perturbacion["clientes"], loc[origen])
+    comun = perturbacion["comun"]
+
+    viaje = evaluador.tiempos[origen, destino].astype(float)
+    servicio = evaluador.servicio[origen].astype(float)
+    fin_ventana = evaluador.fin_ventana[destino]
+    inicio_ventana = evaluador.inicio_ventana[destino]
+    # Solo cuentan las paradas reales (no el relleno tras volver al depósito)
+    largos = np.array([len(ruta) for _, ruta in usadas])
+    es_visita = np.arange(destino.shape[1])[None, :] < largos[:, None]
+
+    rng = np.random.default_rng(semilla)
+    tarde = np.zeros(destino.shape)
+    retraso_total = np.zeros(destino.shape)
+    algun_retraso = np.zeros(len(usadas))
+    duraciones = []
+    for inicio_bloque in range(0, escenarios, bloque):
+        s = min(bloque, escenarios - inicio_bloque)
+        forma = (s,) + viaje.shape
+        factor_dia = _factores(rng, (s, 1, 1), DISTRIBUCIONES.index(comun["distribucion"]), comun["cv"])
+        tiempos_viaje = viaje * factor_dia * _factores(rng, forma, codigo_viaje, cv_viaje)
+        tiempos_servicio = servicio * _factores(rng, forma, codigo_servicio, cv_servicio)
+
+        hora = np.broadcast_to(salida.astype(float), (s, len(usadas))).copy()
+        retraso = np.zeros(forma)
+        for k in range(destino.shape[1]):
+            llegada = hora + tiempos_servicio[:, :, k] + tiempos_viaje[:, :, k]
+            hora = np.maximum(llegada, inicio_ventana[:, k])
+            retraso[:, :, k] = np.maximum(0, hora - fin_ventana[:, k])
+        tarde += (retraso > 0).sum(axis=0)
+        retraso_total += retraso.sum(axis=0)
+        algun_retraso += ((retraso > 0) & es_visita[None]).any(axis=2).sum(axis=0)
+        duraciones.append(hora - salida)
+    duraciones = np.concatenate(duraciones)
+
+    filas_visitas = []
+    for r, (vehicle_id, ruta) in enumerate(usadas):
+        for k, nodo in enumerate(ruta):
+            ventana = data["time_windows"][nodo]
+            filas_visitas.append({
+                'vehiculo': vehicle_id, 'parada': k + 1, 'loc_id': data["visits_list"][nodo]["loc_id"],
+                'ventana': f"{ventana[0] // 60:02d}:{ventana[0] % 60:02d}-{ventana[1] // 60:02d}:{ventana[1] % 60:02d}",
+                'hora_plan': int(horas_plan[r, k + 1]),
+                'prob_tarde': round(tarde[r, k] / escenarios, 4),
+                'retraso_medio': round(retraso_total[r, k] / tarde[r, k], 1) if tarde[r, k] else 0.0,
+            })
+    visitas = pd.DataFrame(filas_visitas)
+    tabla_rutas = pd.DataFrame({
+        'vehiculo': [v for v, _ in usadas],
+        'paradas': largos,
+        'duracion_plan': horas_plan[:, -1] - salida,
+        'duracion_media': np.round(duraciones.mean(axis=0), 1),
+        'duracion_p95': np.round(np.percentile(duraciones, 95, axis=0), 1),
+        'prob_horas_extra': np.round((duraciones > data["jornada_max"]).mean(axis=0), 4),
+        'prob_algun_retraso': np.round(algun_retraso / escenarios, 4),
+    })
+    return visitas, tabla_rutas
+
+
+def main(dia=vrp_TFM.DIA_PLANIFICACION, escenarios=2000, fichero_perturbacion=None, semilla=0, mostrar=10):
+    """Simula el plan guardado del día y guarda los riesgos por visita y por ruta."""
+    fecha = vrp_arranque._fecha(dia)
+    data = vrp_TFM.cargar_instancia(os.path.join(vrp_TFM.CARPETA_INSTANCIAS, f"instancia_{fecha}.pkl"))
+    rutas = vrp_arranque.cargar_rutas_dia(data)
+
+    inicio = time.time()
+    visitas, tabla_rutas = simular(data, rutas, escenarios, cargar_perturbacion(fichero_perturbacion), semilla)
+    print(f"🎲 {escenarios} escenarios de {len(tabla_rutas)} rutas simulados en {time.time() - inicio:.2f}s")
+
+    visitas.to_csv(FICHERO_ROBUSTEZ_VISITAS, index=False)
+    tabla_rutas.to_csv(FICHERO_ROBUSTEZ_RUTAS, index=False)
+    print("\n⚠️ Visitas con más riesgo de llegar tarde:")
+    print(visitas.sort_values("prob_tarde", ascending=False).head(mostrar).to_string(index=False))
+    print(f"\n⚠️ Rutas con más riesgo de horas extra (jornada {data['jornada_max']} min):")
+    print(tabla_rutas.sort_values("prob_horas_extra", ascending=False).head(mostrar).to_string(index=False))
+    print(f"\n✅ Detalle en {FICHERO_ROBUSTEZ_VISITAS} y {FICHERO_ROBUSTEZ_RUTAS}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulación de Monte Carlo de la robustez del plan guardado del día.")
+    parser.add_argument("--dia", default=vrp_TFM.DIA_PLANIFICACION, help="Día del plan (DD/MM/YYYY).")
+    parser.add_argument("--escenarios", type=int, default=2000, help="Número de escenarios simulados.")
+    parser.add_argument("--perturbacion", default=None,
+                        help="JSON con las distribuciones ('comun', 'viaje', 'servicio', 'arcos', 'clientes').")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla aleatoria.")
+    parser.add_argument("--mostrar", type=int, default=10, help="Visitas y rutas de más riesgo a mostrar.")
+    args = parser.parse_args()
+    main(args.dia, args.escenarios, args.perturbacion, args.semilla, args.mostrar)
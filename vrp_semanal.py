@@ -0,0 +1,211 @@
+"""Planificación periódica semanal: qué días se sirve cada tienda y las rutas de cada día.
+
+Fase 1 (asignación, CP-SAT, unos segundos): cada tienda elige un patrón de días con su frecuencia semanal
+entre sus días permitidos (solo los patrones mejor espaciados). El objetivo equilibra los MCE de cada día
+y la compacidad geográfica: cada día tiene asociado un sector del barrido angular alrededor del depósito
+y se penaliza la distancia de la tienda al centro del sector de los días que se le asignan.
+Fase 2: los siete VRP diarios se resuelven en paralelo sobre las mismas matrices, compartidas en memoria
+entre los procesos. Las recogidas se visitan todos los días."""
+
+import argparse
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from ortools.sat.python import cp_model
+
+import vrp_TFM
+from vrp_descomposicion import particion_barrido
+from vrp_escenarios import CLAVES_MATRICES, compartir_matrices, enganchar_matrices, indicadores
+
+DIAS_SEMANA = "LMXJVSD"
+PESO_EQUILIBRIO = 50  # km equivalentes por MCE de diferencia entre el día más cargado y el menos cargado
+FICHERO_CALENDARIO = "calendario_semanal.csv"
+FICHERO_PLAN_SEMANAL = "plan_semanal.json"
+
+# `data` del día tipo en cada proceso trabajador, con las matrices leídas de memoria compartida
+_DATOS_SEMANA = None
+
+
+def cargar_frecuencias(fichero):
+    """Frecuencia semanal y días permitidos por tienda desde un CSV loc_id,frecuencia[,dias] (dias p. ej. 'LXV')."""
+    tabla = pd.read_csv(fichero, dtype=str).fillna("")
+    frecuencias = {}
+    for _, fila in tabla.iterrows():
+        dias = fila.get("dias", "") or DIAS_SEMANA
+        frecuencias[fila["loc_id"]] = (int(fila["frecuencia"]), dias)
+    return frecuencias
+
+
+def patrones(frecuencia, dias_permitidos, dias=DIAS_SEMANA):
+    """Combinaciones de días (índices) con la frecuencia dada, quedándose con las mejor espaciadas en la semana.
+
+    Lista vacía si ninguno de los días permitidos está entre los planificados."""
+    permitidos = [dias.index(d) for d in dias_permitidos if d in dias]
+    if not permitidos:
+        return []
+    frecuencia = max(1, min(frecuencia, len(permitidos)))
+    candidatos = list(itertools.combinations(permitidos, frecuencia))
+
+    def separacion(patron):
+        # Menor hueco entre visitas consecutivas, contando el paso de una semana a la siguiente
+        return min(np.diff(list(patron) + [patron[0] + len(dias)])) if len(patron) > 1 else len(dias)
+
+    mejor = max(separacion(p) for p in candidatos)
+    return [p for p in candidatos if separacion(p) == mejor]
+
+
+# FASE 1: ASIGNACIÓN DE DÍAS
+
+def asignar_dias(data, frecuencias=None, dias=DIAS_SEMANA, peso_equilibrio=PESO_EQUILIBRIO, segundos=5):
+    """Días de servicio de cada tienda: {loc_id: tupla de índices de día}.
+
+    `frecuencias` es {loc_id: (frecuencia, días permitidos)}; las tiendas que no aparecen se sirven una vez
+    a la semana cualquier día de `dias`. Las que no tienen ningún día permitido entre `dias` se quedan
+    fuera del calendario (con un aviso)."""
+    frecuencias = frecuencias or {}
+    grupos, coords, etiquetas = particion_barrido(data, len(dias))
+    tiendas = [k for k, g in enumerate(grupos) if data["visits_list"][g[0]]["type"] == "client"]
+    centros = np.array([coords[etiquetas == d].mean(axis=0) if np.any(etiquetas == d) else coords.mean(axis=0)
+                        for d in range(len(dias))])
+    # Distancia (km aproximados) de cada tienda al centro del sector de cada día
+    coste = np.rint(np.sqrt(((coords[:, None, :] - centros[None, :, :]) ** 2).sum(axis=-1)) * 111).astype(int)
+
+    model = cp_model.CpModel()
+    eleccion, carga_dia = {}, [[] for _ in dias]
+    objetivo, total = [], 0
+    for k in tiendas:
+        loc_id = data["visits_list"][grupos[k][0]]["loc_id"]
+        mce = abs(data["demands"][grupos[k][0]])
+        frecuencia, permitidos = frecuencias.get(loc_id, (1, dias))
+        opciones = patrones(frecuencia, permitidos, dias)
+        if not opciones:
+            print(f"⚠️ {loc_id}: ninguno de sus días ({permitidos}) se planifica ({dias}); se deja fuera")
+            continue
+        variables = [model.NewBoolVar(f"y_{k}_{p}") for p in range(len(opciones))]
+        model.AddExactlyOne(variables)
+        # Pista: el patrón más cercano a los sectores de sus días
+        cercano = int(np.argmin([coste[k, list(p)].sum() for p in opciones]))
+        for p, (patron, var) in enumerate(zip(opciones, variables)):
+            model.AddHint(var, p == cercano)
+            objetivo.append(int(coste[k, list(patron)].sum()) * var)
+            for d in patron:
+                carga_dia[d].append(mce * var)
+        eleccion[loc_id] = (opciones, variables)
+        total += mce * len(opciones[0])
+
+    cargas = [model.NewIntVar(0, total, f"carga_{d}") for d in range(len(dias))]
+    for d in range(len(dias)):
+        model.Add(cargas[d] == sum(carga_dia[d]))
+    # El equilibrio solo tiene sentido entre los días a los que se puede asignar alguna tienda
+    posibles = [cargas[d] for d in range(len(dias)) if carga_dia[d]] or cargas
+    carga_max, carga_min = model.NewIntVar(0, total, "carga_max"), model.NewIntVar(0, total, "carga_min")
+    model.AddMaxEquality(carga_max, posibles)
+    model.AddMinEquality(carga_min, posibles)
+    model.Minimize(sum(objetivo) + peso_equilibrio * (carga_max - carga_min))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = segundos
+    solver.parameters.num_workers = 8
+    estado = solver.Solve(model)
+    if estado not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        raise RuntimeError(f"La asignación de días no encontró solución ({solver.StatusName(estado)}).")
+
+    asignacion = {loc_id: next(p for p, var in zip(opciones, variables) if solver.BooleanValue(var))
+                  for loc_id, (opciones, variables) in eleccion.items()}
+    print(f"📅 Asignación de días ({solver.StatusName(estado)}, {solver.WallTime():.1f}s): MCE por día "
+          + ", ".join(f"{dias[d]}={solver.Value(cargas[d])}" for d in range(len(dias))))
+    return asignacion
+
+
+def nodos_del_dia(data, asignacion, dia):
+    """Nodos del `data` que se visitan el día `dia` (índice): las tiendas asignadas a él y todas las recogidas."""
+    return [i for i, v in enumerate(data["visits_list"])
+            if i != data["depot"] and (v["type"] == "pickup" or dia in asignacion.get(v["loc_id"], ()))]
+
+
+# FASE 2: RUTAS DE CADA DÍA EN PARALELO
+
+def _iniciar_semana(data_sin_matrices, descriptor):
+    """Inicializador de cada proceso: se engancha a las matrices compartidas una única vez."""
+    global _DATOS_SEMANA
+    _DATOS_SEMANA = enganchar_matrices(data_sin_matrices, descriptor)
+
+
+def _resolver_dia(nodos, segundos):
+    """Resuelve el VRP de un día. Devuelve (rutas en índices del día tipo, objetivo, indicadores)."""
+    sub = vrp_TFM.crear_subproblema(_DATOS_SEMANA, nodos, _DATOS_SEMANA["num_vehicles"])
+    manager, routing = vrp_TFM.crear_modelo(sub)
+    solution = vrp_TFM.resolver(sub, manager, routing, vrp_TFM.crear_parametros_busqueda(segundos))
+    if solution is None:
+        return None, None, {}
+    rutas = vrp_TFM.extraer_rutas(sub, manager, routing, solution)
+    return vrp_TFM.rutas_a_globales(sub, rutas), solution.ObjectiveValue(), indicadores(sub, rutas)
+
+
+def resolver_semana(data, asignacion, dias=DIAS_SEMANA, segundos=60, procesos=None):
+    """Resuelve los VRP de todos los días en paralelo. Devuelve ({día: rutas}, DataFrame de indicadores)."""
+    data_sin_matrices = {clave: valor for clave, valor in data.items() if clave not in CLAVES_MATRICES}
+    bloques, descriptor = compartir_matrices(data)
+    planes, filas = {}, []
+    try:
+        with ProcessPoolExecutor(max_workers=procesos or len(dias), initializer=_iniciar_semana,
+                                 initargs=(data_sin_matrices, descriptor)) as pool:
+            futuros = {dia: pool.submit(_resolver_dia, nodos_del_dia(data, asignacion, d), segundos)
+                       for d, dia in enumerate(dias)}
+            for dia, futuro in futuros.items():
+                rutas, objetivo, fila = futuro.result()
+                planes[dia] = rutas
+                filas.append(dict(dia=dia, objetivo=objetivo, **fila))
+                print(f"🗓️ Día {dia}: {fila.get('vehiculos', '-')} camiones, {fila.get('km', '-')} km, "
+                      f"{fila.get('mce_sin_servir', '-')} MCE sin servir")
+    finally:
+        for bloque in bloques:
+            bloque.close()
+            bloque.unlink()
+    return planes, pd.DataFrame(filas)
+
+
+def guardar_plan_semanal(data, asignacion, planes, dias=DIAS_SEMANA, fichero_calendario=FICHERO_CALENDARIO,
+                         fichero_plan=FICHERO_PLAN_SEMANAL):
+    """Guarda el calendario (días de cada tienda) y las rutas de cada día por loc_id."""
+    pd.DataFrame([{'loc_id': loc_id, 'frecuencia': len(patron), 'dias': "".join(dias[d] for d in patron)}
+                  for loc_id, patron in sorted(asignacion.items())]).to_csv(fichero_calendario, index=False)
+    plan = {dia: [[data["visits_list"][n]["loc_id"] for n in ruta] for ruta in rutas if ruta]
+            for dia, rutas in planes.items() if rutas is not None}
+    with open(fichero_plan, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=1)
+
+
+def main(fichero_frecuencias=None, dias=DIAS_SEMANA, segundos_asignacion=5, segundos_dia=60, procesos=None,
+         instancia=None):
+    print("\n" + "="*20)
+    print("CARGANDO (PLAN SEMANAL)...")
+    print("="*20)
+
+    start_time_total = time.time()
+    data = vrp_TFM.cargar_instancia(instancia) if instancia else vrp_TFM.create_data_model()
+    frecuencias = cargar_frecuencias(fichero_frecuencias) if fichero_frecuencias else None
+    asignacion = asignar_dias(data, frecuencias, dias, segundos=segundos_asignacion)
+    planes, tabla = resolver_semana(data, asignacion, dias, segundos_dia, procesos)
+    guardar_plan_semanal(data, asignacion, planes, dias)
+
+    print("\n" + tabla.to_string(index=False))
+    print(f"✅ Calendario en {FICHERO_CALENDARIO} y rutas de la semana en {FICHERO_PLAN_SEMANAL}")
+    print(f"\n Tiempo Total Proceso: {time.time() - start_time_total:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan semanal: días de servicio de cada tienda y rutas de cada día.")
+    parser.add_argument("--frecuencias", default=None,
+                        help="CSV loc_id,frecuencia[,dias] (por defecto, una vez por semana cualquier día).")
+    parser.add_argument("--dias", default=DIAS_SEMANA, help="Días a planificar, p. ej. LMXJVS.")
+    parser.add_argument("--tiempo-asignacion", type=int, default=5, help="Segundos de la asignación de días.")
+    parser.add_argument("--tiempo", type=int, default=60, help="Segundos del VRP de cada día.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos trabajadores (por defecto, uno por día).")
+    parser.add_argument("--instancia", default=None, help="Instancia guardada del día tipo (por defecto, Oracle).")
+    args = parser.parse_args()
+    main(args.frecuencias, args.dias, args.tiempo_asignacion, args.tiempo, args.procesos, args.instancia)